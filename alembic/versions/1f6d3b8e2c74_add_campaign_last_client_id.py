@@ -0,0 +1,33 @@
+"""Add last_client_id to whatsapp_campaigns
+
+Revision ID: 1f6d3b8e2c74
+Revises: 5e2a8c9f1d47
+Create Date: 2026-10-18 10:12:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f6d3b8e2c74'
+down_revision: Union[str, None] = '5e2a8c9f1d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('whatsapp_campaigns', sa.Column('last_client_id', sa.Integer(), server_default='0', nullable=False))
+    # Campanhas interrompidas antes desta coluna não têm posição confiável: retomá-las reenviaria mensagens
+    op.execute(
+        "UPDATE whatsapp_campaigns SET status = 'failed', error = 'Interrompida antes do registro da posição; crie outra campanha.' "
+        "WHERE status = 'enqueuing'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('whatsapp_campaigns', 'last_client_id')
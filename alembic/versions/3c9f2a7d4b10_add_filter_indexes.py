@@ -0,0 +1,50 @@
+"""Add composite and partial indexes for list filters
+
+Revision ID: 3c9f2a7d4b10
+Revises: e11576a1aedf
+Create Date: 2026-10-17 09:12:44.281530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9f2a7d4b10'
+down_revision: Union[str, None] = 'e11576a1aedf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_client_id_order_date', 'orders', ['client_id', 'order_date'], unique=False)
+    op.create_index('ix_orders_status_order_date', 'orders', ['status', 'order_date'], unique=False)
+    op.create_index('ix_orders_order_date', 'orders', ['order_date'], unique=False)
+    op.create_index('ix_orders_total_value', 'orders', ['total_value'], unique=False)
+    op.create_index('ix_order_products_product_id', 'order_products', ['product_id'], unique=False)
+    op.create_index('ix_products_section_sale_value', 'products', ['section', 'sale_value'], unique=False)
+    op.create_index('ix_products_sale_value', 'products', ['sale_value'], unique=False)
+    op.create_index(
+        'ix_products_in_stock', 'products', ['id'], unique=False,
+        postgresql_where=sa.text('current_stock > 0'),
+        sqlite_where=sa.text('current_stock > 0'),
+    )
+    op.create_index('ix_whatsapp_logs_phone_number', 'whatsapp_logs', ['phone_number'], unique=False)
+    op.create_index('ix_whatsapp_logs_status_sent_at', 'whatsapp_logs', ['status', 'sent_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_whatsapp_logs_status_sent_at', table_name='whatsapp_logs')
+    op.drop_index('ix_whatsapp_logs_phone_number', table_name='whatsapp_logs')
+    op.drop_index('ix_products_in_stock', table_name='products')
+    op.drop_index('ix_products_sale_value', table_name='products')
+    op.drop_index('ix_products_section_sale_value', table_name='products')
+    op.drop_index('ix_order_products_product_id', table_name='order_products')
+    op.drop_index('ix_orders_total_value', table_name='orders')
+    op.drop_index('ix_orders_order_date', table_name='orders')
+    op.drop_index('ix_orders_status_order_date', table_name='orders')
+    op.drop_index('ix_orders_client_id_order_date', table_name='orders')
@@ -0,0 +1,32 @@
+"""Add outbox columns to whatsapp_logs
+
+Revision ID: 7a41c0e9d2b3
+Revises: 3c9f2a7d4b10
+Create Date: 2026-10-17 10:05:12.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a41c0e9d2b3'
+down_revision: Union[str, None] = '3c9f2a7d4b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('whatsapp_logs', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('whatsapp_logs', sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_whatsapp_logs_status_next_attempt_at', 'whatsapp_logs', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_whatsapp_logs_status_next_attempt_at', table_name='whatsapp_logs')
+    op.drop_column('whatsapp_logs', 'next_attempt_at')
+    op.drop_column('whatsapp_logs', 'attempts')
@@ -0,0 +1,105 @@
+"""Add daily sales rollup tables and change queue
+
+Revision ID: 9d4c1b7e5f30
+Revises: b7d3e8f41a29
+Create Date: 2026-10-17 21:32:47.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4c1b7e5f30'
+down_revision: Union[str, None] = 'b7d3e8f41a29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_SOLD_LINES = (
+    "FROM orders o JOIN order_products l ON l.order_id = o.id "
+    "WHERE o.status != 'cancelled'"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sales_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('change_id', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('items_sold', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('sales_daily_sections',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('section', sa.String(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('items_sold', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'section')
+    )
+    op.create_table('sales_daily_products',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('items_sold', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    op.create_table('sales_monthly_products',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('items_sold', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('month', 'product_id')
+    )
+    # Carga inicial, como em app.sales_rollup.rebuild_sales_rollups
+    op.execute(
+        "INSERT INTO sales_daily (day, order_count, items_sold, revenue) "
+        "SELECT date(o.order_date), COUNT(DISTINCT o.id), SUM(l.quantity), SUM(l.quantity * l.price_at_order) "
+        f"{_SOLD_LINES} GROUP BY date(o.order_date)"
+    )
+    op.execute(
+        "INSERT INTO sales_daily_sections (day, section, order_count, items_sold, revenue) "
+        "SELECT date(o.order_date), p.section, COUNT(DISTINCT o.id), SUM(l.quantity), SUM(l.quantity * l.price_at_order) "
+        "FROM orders o JOIN order_products l ON l.order_id = o.id JOIN products p ON p.id = l.product_id "
+        "WHERE o.status != 'cancelled' GROUP BY date(o.order_date), p.section"
+    )
+    op.execute(
+        "INSERT INTO sales_daily_products (day, product_id, order_count, items_sold, revenue) "
+        "SELECT date(o.order_date), l.product_id, COUNT(DISTINCT o.id), SUM(l.quantity), SUM(l.quantity * l.price_at_order) "
+        f"{_SOLD_LINES} GROUP BY date(o.order_date), l.product_id"
+    )
+    op.execute(
+        "INSERT INTO sales_monthly_products (month, product_id, order_count, items_sold, revenue) "
+        "SELECT date_trunc('month', day)::date, product_id, SUM(order_count), SUM(items_sold), SUM(revenue) "
+        "FROM sales_daily_products GROUP BY date_trunc('month', day)::date, product_id"
+    )
+    op.execute("INSERT INTO rollup_watermarks (name, change_id, refreshed_at) VALUES ('sales', 0, now())")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sales_monthly_products')
+    op.drop_table('sales_daily_products')
+    op.drop_table('sales_daily_sections')
+    op.drop_table('sales_daily')
+    op.drop_table('rollup_watermarks')
+    op.drop_table('sales_changes')
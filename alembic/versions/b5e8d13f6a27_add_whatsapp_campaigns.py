@@ -0,0 +1,48 @@
+"""Add whatsapp_campaigns and whatsapp_logs.campaign_id
+
+Revision ID: b5e8d13f6a27
+Revises: 7a41c0e9d2b3
+Create Date: 2026-10-17 11:02:37.915422
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e8d13f6a27'
+down_revision: Union[str, None] = '7a41c0e9d2b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('whatsapp_campaigns',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message_template', sa.Text(), nullable=False),
+    sa.Column('filters', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('enqueued', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_whatsapp_campaigns_id'), 'whatsapp_campaigns', ['id'], unique=False)
+    op.add_column('whatsapp_logs', sa.Column('campaign_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('whatsapp_logs_campaign_id_fkey', 'whatsapp_logs', 'whatsapp_campaigns', ['campaign_id'], ['id'])
+    op.create_index('ix_whatsapp_logs_campaign_id_status', 'whatsapp_logs', ['campaign_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_whatsapp_logs_campaign_id_status', table_name='whatsapp_logs')
+    op.drop_constraint('whatsapp_logs_campaign_id_fkey', 'whatsapp_logs', type_='foreignkey')
+    op.drop_column('whatsapp_logs', 'campaign_id')
+    op.drop_index(op.f('ix_whatsapp_campaigns_id'), table_name='whatsapp_campaigns')
+    op.drop_table('whatsapp_campaigns')
@@ -0,0 +1,48 @@
+"""Add client_order_stats aggregates table
+
+Revision ID: b7d3e8f41a29
+Revises: e4b9a7c2d615
+Create Date: 2026-10-17 20:14:09.471682
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e8f41a29'
+down_revision: Union[str, None] = 'e4b9a7c2d615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('client_order_stats',
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('lifetime_value', sa.Float(), server_default='0', nullable=False),
+    sa.Column('last_order_date', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('client_id')
+    )
+    op.create_index('ix_client_order_stats_last_order_date', 'client_order_stats', ['last_order_date', 'client_id'], unique=False)
+    op.create_index('ix_client_order_stats_lifetime_value', 'client_order_stats', ['lifetime_value', 'client_id'], unique=False)
+    op.create_index('ix_client_order_stats_order_count', 'client_order_stats', ['order_count', 'client_id'], unique=False)
+    # Carga inicial, como em app.client_stats.rebuild_client_stats
+    op.execute(
+        "INSERT INTO client_order_stats (client_id, order_count, lifetime_value, last_order_date) "
+        "SELECT c.id, COALESCE(t.order_count, 0), COALESCE(t.lifetime_value, 0), t.last_order_date FROM clients c "
+        "LEFT JOIN (SELECT client_id, COUNT(*) AS order_count, SUM(total_value) AS lifetime_value, MAX(order_date) AS last_order_date "
+        "FROM orders WHERE status != 'cancelled' GROUP BY client_id) t ON t.client_id = c.id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_client_order_stats_order_count', table_name='client_order_stats')
+    op.drop_index('ix_client_order_stats_lifetime_value', table_name='client_order_stats')
+    op.drop_index('ix_client_order_stats_last_order_date', table_name='client_order_stats')
+    op.drop_table('client_order_stats')
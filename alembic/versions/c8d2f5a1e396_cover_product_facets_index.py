@@ -0,0 +1,30 @@
+"""Extend the section/price index with current_stock to cover facet counts
+
+Revision ID: c8d2f5a1e396
+Revises: a6c1e4f08b52
+Create Date: 2026-10-17 17:48:12.930271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8d2f5a1e396'
+down_revision: Union[str, None] = 'a6c1e4f08b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_products_section_sale_value_stock', 'products', ['section', 'sale_value', 'current_stock'], unique=False)
+    op.drop_index('ix_products_section_sale_value', table_name='products')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_products_section_sale_value', 'products', ['section', 'sale_value'], unique=False)
+    op.drop_index('ix_products_section_sale_value_stock', table_name='products')
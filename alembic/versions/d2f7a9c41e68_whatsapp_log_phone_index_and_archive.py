@@ -0,0 +1,53 @@
+"""Normalize whatsapp_logs phone numbers, add retention indexes and archive table
+
+Revision ID: d2f7a9c41e68
+Revises: b5e8d13f6a27
+Create Date: 2026-10-17 12:20:03.118902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7a9c41e68'
+down_revision: Union[str, None] = 'b5e8d13f6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Telefones existentes para E.164 só com dígitos (mesma regra de app/phone.py para números brasileiros)
+    op.execute(r"UPDATE whatsapp_logs SET phone_number = regexp_replace(phone_number, '\D', '', 'g') WHERE phone_number ~ '\D'")
+    op.execute("UPDATE whatsapp_logs SET phone_number = ltrim(phone_number, '0') WHERE phone_number LIKE '0%'")
+    op.execute("UPDATE whatsapp_logs SET phone_number = '55' || phone_number WHERE length(phone_number) IN (10, 11)")
+
+    op.drop_index('ix_whatsapp_logs_phone_number', table_name='whatsapp_logs')
+    op.create_index('ix_whatsapp_logs_phone_number_id', 'whatsapp_logs', ['phone_number', 'id'], unique=False)
+    op.create_index(
+        'ix_whatsapp_logs_unarchived_sent_at', 'whatsapp_logs', ['sent_at'], unique=False,
+        postgresql_where=sa.text('response_data IS NOT NULL'),
+        sqlite_where=sa.text('response_data IS NOT NULL'),
+    )
+    op.create_table('whatsapp_log_archives',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('first_log_id', sa.Integer(), nullable=False),
+    sa.Column('last_log_id', sa.Integer(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_whatsapp_log_archives_id'), 'whatsapp_log_archives', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_whatsapp_log_archives_id'), table_name='whatsapp_log_archives')
+    op.drop_table('whatsapp_log_archives')
+    op.drop_index('ix_whatsapp_logs_unarchived_sent_at', table_name='whatsapp_logs')
+    op.drop_index('ix_whatsapp_logs_phone_number_id', table_name='whatsapp_logs')
+    op.create_index('ix_whatsapp_logs_phone_number', 'whatsapp_logs', ['phone_number'], unique=False)
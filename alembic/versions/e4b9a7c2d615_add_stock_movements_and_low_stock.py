@@ -0,0 +1,62 @@
+"""Add stock_movements ledger, low_stock_products set and expiration index
+
+Revision ID: e4b9a7c2d615
+Revises: c8d2f5a1e396
+Create Date: 2026-10-17 19:02:41.118530
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9a7c2d615'
+down_revision: Union[str, None] = 'c8d2f5a1e396'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_movements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('stock_after', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_movements_id'), 'stock_movements', ['id'], unique=False)
+    op.create_index('ix_stock_movements_product_id_id', 'stock_movements', ['product_id', 'id'], unique=False)
+    op.create_table('low_stock_products',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index('ix_products_expiration_date', 'products', ['expiration_date'], unique=False, postgresql_where=sa.text('expiration_date IS NOT NULL'))
+    # Estado inicial: o estoque atual de cada produto vira a primeira movimentação do razão
+    op.execute(
+        "INSERT INTO stock_movements (product_id, delta, stock_after, reason) "
+        "SELECT id, current_stock, current_stock, 'initial' FROM products"
+    )
+    # Mesmo limite da API (LOW_STOCK_THRESHOLD, padrão 5); lido do ambiente em que a migração roda
+    low_stock_threshold = int(os.getenv("LOW_STOCK_THRESHOLD", "5"))
+    op.execute(
+        sa.text("INSERT INTO low_stock_products (product_id) SELECT id FROM products WHERE current_stock <= :threshold")
+        .bindparams(threshold=low_stock_threshold)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_expiration_date', table_name='products', postgresql_where=sa.text('expiration_date IS NOT NULL'))
+    op.drop_table('low_stock_products')
+    op.drop_index('ix_stock_movements_product_id_id', table_name='stock_movements')
+    op.drop_index(op.f('ix_stock_movements_id'), table_name='stock_movements')
+    op.drop_table('stock_movements')
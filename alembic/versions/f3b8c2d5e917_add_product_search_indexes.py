@@ -0,0 +1,44 @@
+"""Add full-text and trigram search indexes on product descriptions
+
+Revision ID: f3b8c2d5e917
+Revises: d2f7a9c41e68
+Create Date: 2026-10-17 15:02:37.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8c2d5e917'
+down_revision: Union[str, None] = 'd2f7a9c41e68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+        "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+    )
+    op.execute(
+        "CREATE INDEX ix_products_description_tsv ON products "
+        "USING gin (to_tsvector('simple', immutable_unaccent(description)))"
+    )
+    op.execute(
+        "CREATE INDEX ix_products_description_trgm ON products "
+        "USING gin (immutable_unaccent(lower(description)) gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_description_trgm', table_name='products')
+    op.drop_index('ix_products_description_tsv', table_name='products')
+    op.execute("DROP FUNCTION IF EXISTS immutable_unaccent(text)")
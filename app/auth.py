@@ -5,7 +5,14 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta, UTC
 from passlib.context import CryptContext
 from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import math
 import os # Para acessar variáveis de ambiente
+import threading
+import time
+from app.metrics import register_collector
 
 # --- Configurações de Segurança do JWT ---
 # CRÍTICO: Carregue a SECRET_KEY de uma variável de ambiente em produção!
@@ -33,6 +40,102 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+# --- Executor dedicado para bcrypt ---
+# O bcrypt leva centenas de ms por hash. Rodá-lo em um pool próprio e limitado, aguardado
+# pelas rotas async def, evita que uma rajada de logins ocupe as threads compartilhadas do Starlette.
+# Quando há mais requisições do que workers + fila, a requisição é recusada (503).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "8"))
+
+
+class PasswordHashingBusy(Exception):
+    """
+    Raised when the password hashing executor queue is full.
+    """
+
+
+class PasswordHasherPool:
+    """
+    Size-limited executor for bcrypt operations with queue-depth admission
+    control and latency metrics.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0 # em execução + aguardando na fila
+        self._latencies_ms = deque(maxlen=1000)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """
+        Runs fn on the executor and awaits it without holding a request thread.
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHashingBusy()
+            self._pending += 1
+        submitted = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # A contagem acompanha o job, não a requisição: se o cliente desconecta (await cancelado),
+        # o bcrypt continua ocupando o executor e segue contando para o limite de admissão
+        future.add_done_callback(lambda f: self._job_done(f, submitted))
+        return await asyncio.wrap_future(future)
+
+    def _job_done(self, future, submitted: float) -> None:
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled(): # Ainda estava na fila quando o cliente desistiu: nem chegou a rodar
+                return
+            if future.exception() is not None:
+                self.failed += 1
+                return
+            self.completed += 1
+            self._latencies_ms.append((time.perf_counter() - submitted) * 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self._pending, self.workers),
+                "queue_depth": max(self._pending - self.workers, 0),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "latency_ms_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "latency_ms_p99": latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.99) - 1)] if latencies else 0.0,
+            }
+
+
+password_hasher = PasswordHasherPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+register_collector("password_hashing", password_hasher.stats)
+
+
+async def hash_password_bounded(password: str) -> str:
+    """
+    Hashes a password on the dedicated executor. Raises PasswordHashingBusy if the queue is full.
+    """
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def verify_password_bounded(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies a password on the dedicated executor. Raises PasswordHashingBusy if the queue is full.
+    """
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
 # --- Função para Criar Token ---
 def criar_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
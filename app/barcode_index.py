@@ -0,0 +1,168 @@
+# app/barcode_index.py
+
+# --- Busca por código de barras (GET /products/barcode/{code}) ---
+# Mapa em memória código de barras -> id do produto, carregado no startup e
+# atualizado pelos eventos de ORM de Product neste processo. O produto em si vem
+# do cache por id (app/product_cache.py), que já é invalidado pelas escritas de
+# todos os workers; o mapa é só uma dica: se o id apontado não existe mais ou o
+# código não confere (escrita feita em outro worker), a consulta cai no índice
+# único ix_products_barcode e o mapa é corrigido.
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.metrics import register_collector
+from app.models import Product as DBProduct
+from app.product_cache import product_cache
+from app.schemas import Product
+
+
+class BarcodeIndex:
+    """
+    In-process barcode -> product id map used as a lookup hint.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.corrections = 0
+
+    def warm(self, db: Session, chunk_size: int = 10_000) -> int:
+        """
+        Loads every (barcode, id) pair, streaming the rows. Returns the count.
+        """
+        ids = {}
+        rows = db.execute(
+            select(DBProduct.barcode, DBProduct.id).where(DBProduct.barcode.is_not(None)).execution_options(yield_per=chunk_size)
+        )
+        for barcode, product_id in rows:
+            ids[barcode] = product_id
+        with self._lock:
+            self._ids = ids
+        return len(ids)
+
+    def get(self, barcode: str) -> Optional[int]:
+        with self._lock:
+            product_id = self._ids.get(barcode)
+            if product_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return product_id
+
+    def set(self, barcode: Optional[str], product_id: int) -> None:
+        if barcode:
+            with self._lock:
+                self._ids[barcode] = product_id
+
+    def discard(self, barcode: Optional[str], product_id: Optional[int] = None) -> None:
+        """
+        Removes `barcode` if it still points at `product_id` (or at anything,
+        when no id is given).
+        """
+        with self._lock:
+            if barcode in self._ids and (product_id is None or self._ids[barcode] == product_id):
+                del self._ids[barcode]
+
+    def correct(self, barcode: str, product_id: int) -> None:
+        """
+        Drops a hint that turned out to be stale.
+        """
+        with self._lock:
+            if self._ids.get(barcode) == product_id:
+                del self._ids[barcode]
+            self.corrections += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._ids),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "corrections": self.corrections,
+            }
+
+
+barcode_index = BarcodeIndex()
+register_collector("barcode_index", barcode_index.stats)
+
+
+# Escritas via ORM neste processo mantêm o mapa em dia (inserts em lote via Core,
+# como a importação de CSV, entram no mapa na primeira consulta)
+@event.listens_for(DBProduct, "after_insert")
+def _index_inserted_product(mapper, connection, target):
+    barcode_index.set(target.barcode, target.id)
+
+
+@event.listens_for(DBProduct, "after_update")
+def _reindex_updated_product(mapper, connection, target):
+    for previous in inspect(target).attrs.barcode.history.deleted or ():
+        barcode_index.discard(previous, target.id)
+    barcode_index.set(target.barcode, target.id)
+
+
+@event.listens_for(DBProduct, "after_delete")
+def _unindex_deleted_product(mapper, connection, target):
+    barcode_index.discard(target.barcode, target.id)
+
+
+def _cached_products(db: Session, ids: Iterable[int], version: int) -> Dict[int, Product]:
+    """
+    Products by id from the product cache, loading the missing ones with a
+    single IN (...) query.
+    """
+    found, missing = {}, []
+    for product_id in ids:
+        cached = product_cache.get(("id", product_id))
+        if cached is None:
+            missing.append(product_id)
+        else:
+            found[product_id] = cached
+    if missing:
+        for row in db.query(DBProduct).filter(DBProduct.id.in_(missing)):
+            found[row.id] = Product.model_validate(row)
+            product_cache.put(("id", row.id), found[row.id], version)
+    return found
+
+
+def lookup_barcodes(db: Session, barcodes: List[str]) -> Tuple[Dict[str, Product], List[str]]:
+    """
+    Resolves barcodes to products: hinted ids through the product cache, the
+    rest with one query on the unique barcode index. Returns (found by
+    barcode, barcodes not found), both in request order.
+    """
+    codes = list(dict.fromkeys(barcodes))
+    version = product_cache.sync(db)
+    hinted = {code: barcode_index.get(code) for code in codes}
+    products = _cached_products(db, {pid for pid in hinted.values() if pid is not None}, version)
+
+    found: Dict[str, Product] = {}
+    unresolved = []
+    for code in codes:
+        product = products.get(hinted[code])
+        if product is not None and product.barcode == code:
+            found[code] = product
+            continue
+        if hinted[code] is not None: # Dica velha (produto apagado ou código alterado em outro worker)
+            barcode_index.correct(code, hinted[code])
+        unresolved.append(code)
+
+    if unresolved:
+        for row in db.query(DBProduct).filter(DBProduct.barcode.in_(unresolved)):
+            barcode_index.set(row.barcode, row.id)
+            found[row.barcode] = Product.model_validate(row)
+            product_cache.put(("id", row.id), found[row.barcode], version)
+
+    ordered = {code: found[code] for code in codes if code in found}
+    return ordered, [code for code in codes if code not in found]
@@ -0,0 +1,177 @@
+# app/client_stats.py
+
+# --- Agregados de pedidos por cliente (client_order_stats) ---
+# Quantidade de pedidos, valor total e data do último pedido de cada cliente,
+# contando só pedidos não cancelados. As rotas de pedidos atualizam a linha do
+# cliente na mesma transação em que criam um pedido (somando) ou o cancelam
+# (subtraindo; a exclusão de um pedido ativo passa pelo cancelamento), então
+# GET /clients/{id} e a ordenação de list_clients não agregam a tabela orders.
+# A reconciliação (python -m app.client_stats) compara tudo com os pedidos,
+# relata as divergências e reconstrói a tabela em lote.
+
+import logging
+import sys
+from typing import Iterable, List
+
+from sqlalchemy import and_, case, delete, func, select, text, update
+from sqlalchemy.orm import Session
+
+from app.models import Client as DBClient, ClientOrderStats, Order as DBOrder
+
+logger = logging.getLogger(__name__)
+
+_stats = ClientOrderStats.__table__
+_orders = DBOrder.__table__
+
+# Diferença de valor tolerada na reconciliação (somas e subtrações de float)
+VALUE_TOLERANCE = 0.005
+
+
+def _insert(db: Session):
+    # INSERT ... ON CONFLICT: mesmo construtor nos dois bancos suportados
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def ensure_client_stats(db: Session, client_id: int) -> None:
+    """
+    Creates the (empty) stats row of a new client. Does not commit.
+    """
+    db.execute(_insert(db)(_stats).values(client_id=client_id).on_conflict_do_nothing(index_elements=[_stats.c.client_id]))
+
+
+def add_orders(db: Session, order_ids: Iterable[int]) -> None:
+    """
+    Adds newly created orders to their clients' stats with one
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE (one row per client).
+    The orders must already be flushed. Does not commit.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    totals = (
+        select(_orders.c.client_id, func.count(), func.sum(_orders.c.total_value), func.max(_orders.c.order_date))
+        .where(_orders.c.id.in_(order_ids))
+        .group_by(_orders.c.client_id)
+    )
+    stmt = _insert(db)(_stats).from_select(["client_id", "order_count", "lifetime_value", "last_order_date"], totals)
+    excluded = stmt.excluded
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[_stats.c.client_id],
+        set_={
+            "order_count": _stats.c.order_count + excluded.order_count,
+            "lifetime_value": _stats.c.lifetime_value + excluded.lifetime_value,
+            "last_order_date": case(
+                (_stats.c.last_order_date.is_(None), excluded.last_order_date),
+                (excluded.last_order_date > _stats.c.last_order_date, excluded.last_order_date),
+                else_=_stats.c.last_order_date,
+            ),
+        },
+    ))
+
+
+def remove_order(db: Session, client_id: int, total_value: float) -> None:
+    """
+    Takes a just-cancelled order out of its client's stats. The last order
+    date is re-read from the client's remaining orders (index on
+    client_id, order_date). Does not commit.
+    """
+    last_order = (
+        select(func.max(_orders.c.order_date))
+        .where(_orders.c.client_id == client_id, _orders.c.status != "cancelled")
+        .scalar_subquery()
+    )
+    db.execute(
+        update(_stats)
+        .where(_stats.c.client_id == client_id)
+        .values(order_count=_stats.c.order_count - 1, lifetime_value=_stats.c.lifetime_value - total_value, last_order_date=last_order)
+    )
+
+
+def _aggregates():
+    # Agregado de referência: todos os clientes, com zeros para quem não tem pedidos ativos
+    totals = (
+        select(
+            _orders.c.client_id,
+            func.count().label("order_count"),
+            func.sum(_orders.c.total_value).label("lifetime_value"),
+            func.max(_orders.c.order_date).label("last_order_date"),
+        )
+        .where(_orders.c.status != "cancelled")
+        .group_by(_orders.c.client_id)
+        .subquery()
+    )
+    return select(
+        DBClient.id.label("client_id"),
+        func.coalesce(totals.c.order_count, 0).label("order_count"),
+        func.coalesce(totals.c.lifetime_value, 0.0).label("lifetime_value"),
+        totals.c.last_order_date,
+    ).outerjoin(totals, totals.c.client_id == DBClient.id)
+
+
+def find_drift(db: Session) -> List[dict]:
+    """
+    Compares every stored row with the aggregate over orders in one query.
+    Returns the clients whose row is missing or differs.
+    """
+    expected = _aggregates().subquery()
+    rows = db.execute(
+        select(
+            expected.c.client_id,
+            expected.c.order_count, _stats.c.order_count.label("stored_order_count"),
+            expected.c.lifetime_value, _stats.c.lifetime_value.label("stored_lifetime_value"),
+        )
+        .outerjoin(_stats, _stats.c.client_id == expected.c.client_id)
+        .where(
+            (_stats.c.client_id.is_(None))
+            | (_stats.c.order_count != expected.c.order_count)
+            | (func.abs(_stats.c.lifetime_value - expected.c.lifetime_value) > VALUE_TOLERANCE)
+            | ((_stats.c.last_order_date.is_(None)) != (expected.c.last_order_date.is_(None)))
+            | and_(_stats.c.last_order_date.is_not(None), _stats.c.last_order_date != expected.c.last_order_date)
+        )
+        .order_by(expected.c.client_id)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+def rebuild_client_stats(db: Session) -> int:
+    """
+    Rebuilds the whole table from orders with one DELETE and one
+    INSERT ... SELECT. Returns the number of clients. Commits.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Espera as transações que já mexeram na tabela e segura as próximas até o commit:
+        # o INSERT ... SELECT vê todo pedido que já atualizou os agregados, e os que
+        # ainda vão atualizar somam sobre a tabela reconstruída
+        db.execute(text("LOCK TABLE client_order_stats IN EXCLUSIVE MODE"))
+    db.execute(delete(_stats))
+    result = db.execute(_stats.insert().from_select(["client_id", "order_count", "lifetime_value", "last_order_date"], _aggregates()))
+    db.commit()
+    return result.rowcount
+
+
+def reconcile(db: Session, fix: bool = True) -> List[dict]:
+    """
+    Reports drift and, when there is any and `fix` is set, rebuilds the
+    table. Returns the drifted clients.
+    """
+    drift = find_drift(db)
+    db.rollback() # Encerra a leitura antes da reconstrução
+    if drift:
+        logger.warning("client_order_stats divergente para %d cliente(s): %s", len(drift), [row["client_id"] for row in drift[:20]])
+        if fix:
+            rebuild_client_stats(db)
+    return drift
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    check_only = "--check" in sys.argv[1:]
+    with SessionLocal() as session:
+        drifted = reconcile(session, fix=not check_only)
+    print(f"client_order_stats: {len(drifted)} cliente(s) divergente(s){'' if check_only or not drifted else ' (tabela reconstruída)'}")
+    sys.exit(1 if drifted and check_only else 0)
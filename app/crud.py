@@ -1,17 +1,19 @@
 # app/services/user_service.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from app.models import User as DBUser
 from app.schemas import UserCreate # Pode importar AdminCreate também se quiser uma função específica para admin
-from app.auth import get_password_hash # Importe de onde sua função de hash de senha está
+from app.auth import hash_password_bounded # Hash no executor dedicado (limitado) de bcrypt
 
-def create_user_in_db(db: Session, user: UserCreate) -> DBUser:
+async def create_user_in_db(db: AsyncSession, user: UserCreate) -> DBUser:
     """
     Cria um novo usuário no banco de dados.
     Esta função é agnóstica a ser admin ou não; o is_admin vem do user:UserCreate.
+    A senha é hasheada uma única vez, aqui.
     """
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password_bounded(user.password)
     db_user = DBUser(
         email=user.email,
         hashed_password=hashed_password,
@@ -19,16 +21,14 @@ def create_user_in_db(db: Session, user: UserCreate) -> DBUser:
         is_admin=user.is_admin
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 # Você pode adicionar outras funções CRUD aqui, como get_user_by_email, update_user, delete_user
-def get_user_by_email(db: Session, email: str) -> Optional[DBUser]:
-    return db.query(DBUser).filter(DBUser.email == email).first()
-
-def get_user_by_email(db: Session, email: str) -> Optional[DBUser]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[DBUser]:
     """
     Retorna um usuário pelo seu email.
     """
-    return db.query(DBUser).filter(DBUser.email == email).first()
\ No newline at end of file
+    result = await db.execute(select(DBUser).where(DBUser.email == email))
+    return result.scalars().first()
\ No newline at end of file
@@ -1,10 +1,17 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
+from app.db_pool import PoolStats, pool_options
+from app.metrics import register_collector
 
 DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///:memory:"
 
-engine = create_engine(DATABASE_URL)
+# Pool configurado por variáveis de ambiente (ver app/db_pool.py) e instrumentado para GET /metrics
+pool_stats = PoolStats()
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, pool_stats))
+pool_stats.attach(engine)
+register_collector("db_pool", pool_stats.snapshot)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -13,4 +20,39 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Caminho assíncrono (rotas async def) ---
+# Mesmo banco do DATABASE_URL, com driver assíncrono: aiosqlite localmente e asyncpg em produção.
+# ASYNC_DATABASE_URL permite sobrescrever a URL (ex.: parâmetros específicos do asyncpg).
+def to_async_url(url: str) -> str:
+    """
+    Maps a sync SQLAlchemy URL to its async-driver equivalent.
+    """
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+async_pool_stats = PoolStats()
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, async_pool_stats, is_async=True))
+async_pool_stats.attach(async_engine)
+register_collector("db_pool_async", async_pool_stats.snapshot)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """
+    Factory for short-lived async sessions, for dependencies that must not
+    hold a connection for the whole request (e.g. get_current_user).
+    """
+    return AsyncSessionLocal
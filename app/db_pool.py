@@ -0,0 +1,137 @@
+# app/db_pool.py
+
+# --- Configuração e telemetria do pool de conexões ---
+# As configurações vêm de variáveis de ambiente para que cada worker do uvicorn
+# possa ser dimensionado de acordo com o limite de conexões do Postgres:
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (segundos), DB_POOL_RECYCLE (segundos),
+#   DB_POOL_PRE_PING (1/0).
+
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+
+
+class PoolStats:
+    """
+    Counters fed by SQLAlchemy pool events plus checkout wait time measured
+    by the instrumented pool classes returned from pool_options().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pool = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.wait_count = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.timeouts = 0
+
+    def attach(self, engine) -> None:
+        self.pool = engine.pool
+        target = engine.sync_engine if hasattr(engine, "sync_engine") else engine
+        event.listen(target, "connect", self._on_connect)
+        event.listen(target, "checkout", self._on_checkout)
+        event.listen(target, "checkin", self._on_checkin)
+        event.listen(target, "invalidate", self._on_invalidate)
+        event.listen(target, "soft_invalidate", self._on_invalidate)
+
+    def record_wait(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "invalidations": self.invalidations,
+                "wait_ms_avg": self.wait_total_s / self.wait_count * 1000 if self.wait_count else 0.0,
+                "wait_ms_max": self.wait_max_s * 1000,
+                "timeouts": self.timeouts,
+            }
+        if isinstance(self.pool, QueuePool):
+            data.update(
+                pool_size=self.pool.size(),
+                overflow=self.pool.overflow(),
+                max_overflow=self.pool._max_overflow,
+                idle=self.pool.checkedin(),
+            )
+        return data
+
+
+def _timed_pool_class(base, stats: PoolStats):
+    """
+    Builds a subclass of `base` that measures how long each checkout waits for
+    a free connection. The stats object lives on the class so it survives
+    pool.recreate() (e.g. after engine.dispose()).
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = base._do_get(self)
+        except Exception:
+            stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        stats.record_wait(time.perf_counter() - start, timed_out=False)
+        return connection
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+def pool_options(url: str, stats: PoolStats, is_async: bool = False) -> Dict[str, Any]:
+    """
+    Returns create_engine()/create_async_engine() keyword arguments for the
+    configured pool. SQLite keeps its default pool (in-memory databases need a
+    single shared connection); only pre-ping and recycle apply there.
+    """
+    options: Dict[str, Any] = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if url.startswith("sqlite"):
+        return options
+    options.update(
+        poolclass=_timed_pool_class(AsyncAdaptedQueuePool if is_async else QueuePool, stats),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
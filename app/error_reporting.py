@@ -0,0 +1,84 @@
+# app/error_reporting.py
+
+# --- Envio de erros ao Sentry com deduplicação e amostragem ---
+# Em caminhos que podem falhar em massa (ex.: Z-API fora do ar), cada erro
+# repetido geraria um evento no Sentry. Aqui, a primeira ocorrência de cada tipo
+# de erro em uma janela de SENTRY_DEDUP_WINDOW_SECONDS é enviada; as repetições
+# dentro da janela são enviadas só com probabilidade SENTRY_REPEAT_SAMPLE_RATE e o
+# restante é contado e anexado ao próximo evento enviado.
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import sentry_sdk
+
+from app.metrics import register_collector
+
+SENTRY_DEDUP_WINDOW_SECONDS = float(os.getenv("SENTRY_DEDUP_WINDOW_SECONDS", "60"))
+SENTRY_REPEAT_SAMPLE_RATE = float(os.getenv("SENTRY_REPEAT_SAMPLE_RATE", "0.01"))
+_MAX_KEYS = 1000
+
+
+def fingerprint(exc: BaseException) -> str:
+    """
+    Groups errors by exception type plus HTTP status (URLs are left out: the
+    Z-API URL carries the instance token).
+    """
+    key = f"{type(exc).__module__}.{type(exc).__qualname__}"
+    if isinstance(exc, httpx.HTTPStatusError):
+        key += f":{exc.response.status_code}"
+    return key
+
+
+class ErrorReporter:
+    """
+    Deduplicating, sampling front for sentry_sdk.capture_exception.
+    """
+
+    def __init__(self, window_seconds: float = SENTRY_DEDUP_WINDOW_SECONDS, repeat_sample_rate: float = SENTRY_REPEAT_SAMPLE_RATE):
+        self.window_seconds = window_seconds
+        self.repeat_sample_rate = repeat_sample_rate
+        self._lock = threading.Lock()
+        self._windows: Dict[str, list] = {} # chave -> [início da janela, suprimidos desde o último envio]
+        self.reported = 0
+        self.suppressed = 0
+
+    def capture(self, exc: BaseException, key: Optional[str] = None) -> bool:
+        """
+        Reports `exc` unless it repeats an error already reported in the
+        current window. Returns True when an event was sent.
+        """
+        key = key or fingerprint(exc)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.window_seconds:
+                if window is None and len(self._windows) >= _MAX_KEYS:
+                    self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.window_seconds}
+                suppressed = window[1] if window else 0
+                self._windows[key] = [now, 0]
+            elif random.random() < self.repeat_sample_rate:
+                suppressed = window[1]
+                window[1] = 0
+            else:
+                window[1] += 1
+                self.suppressed += 1
+                return False
+            self.reported += 1
+        with sentry_sdk.new_scope() as scope:
+            scope.fingerprint = [key]
+            scope.set_extra("suppressed_since_last_event", suppressed)
+            sentry_sdk.capture_exception(exc)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"reported": self.reported, "suppressed": self.suppressed, "keys": len(self._windows)}
+
+
+error_reporter = ErrorReporter()
+register_collector("error_reporting", error_reporter.stats)
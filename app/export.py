@@ -0,0 +1,90 @@
+# app/export.py
+
+# --- Exportação em streaming (NDJSON / CSV) ---
+# As linhas são lidas com yield_per (cursor no servidor quando o driver suporta)
+# e escritas na resposta conforme chegam, então o uso de memória não depende do
+# número de linhas exportadas.
+
+import csv
+import io
+import json
+from enum import Enum
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Query, Session
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+def _iter_rows(db: Session, query: Query, schema: type[BaseModel]) -> Iterator[dict]:
+    try:
+        for obj in query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE):
+            yield schema.model_validate(obj).model_dump(mode="json")
+    finally:
+        # A resposta continua sendo enviada depois que a dependência get_db terminou,
+        # então a sessão é fechada aqui, quando o último registro foi lido.
+        db.close()
+
+
+def _ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _csv(rows: Iterable[dict], fieldnames: List[str], flatten: Optional[Callable[[dict], Iterable[dict]]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        for flat in (flatten(row) if flatten else (row,)):
+            writer.writerow(flat)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_export(
+    db: Session,
+    query: Query,
+    schema: type[BaseModel],
+    fmt: ExportFormat,
+    filename: str,
+    csv_fields: Optional[List[str]] = None,
+    csv_flatten: Optional[Callable[[dict], Iterable[dict]]] = None,
+) -> StreamingResponse:
+    """
+    Streams `query` as NDJSON (one `schema` object per line) or CSV.
+    For CSV, `csv_flatten` may expand one object into several rows (e.g. one per order line).
+    """
+    return stream_rows(_iter_rows(db, query, schema), schema, fmt, filename, csv_fields, csv_flatten)
+
+
+def stream_rows(
+    rows: Iterable[dict],
+    schema: type[BaseModel],
+    fmt: ExportFormat,
+    filename: str,
+    csv_fields: Optional[List[str]] = None,
+    csv_flatten: Optional[Callable[[dict], Iterable[dict]]] = None,
+) -> StreamingResponse:
+    """
+    Streams already serialized rows (dicts shaped like `schema`) as NDJSON or CSV.
+    """
+    if fmt == ExportFormat.csv:
+        fields = csv_fields or list(schema.model_fields)
+        body = _csv(rows, fields, csv_flatten)
+        media_type = "text/csv"
+    else:
+        body = _ndjson(rows)
+        media_type = "application/x-ndjson"
+    headers: Dict[str, str] = {"Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
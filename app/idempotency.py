@@ -0,0 +1,242 @@
+# app/idempotency.py
+
+# --- Idempotency-Key (POST /orders/ e POST /whatsapp/send) ---
+# Clientes móveis repetem a requisição quando ela estoura o timeout. Com o
+# header Idempotency-Key, a primeira requisição reivindica a chave (uma linha
+# "processing" em idempotency_keys, gravada e commitada antes do trabalho) e
+# grava a resposta na mesma transação do pedido ou da mensagem. Depois disso:
+#   - um retry com a mesma chave e o mesmo corpo recebe a resposta guardada
+#     (header Idempotent-Replayed), sem tocar em products nem na fila da Z-API;
+#   - um retry que chega enquanto a primeira ainda processa espera por ela
+#     (consultando a linha) até IDEMPOTENCY_WAIT_SECONDS e então responde 409;
+#   - a mesma chave com outro corpo é recusada (422).
+# Se a requisição falha, a chave é liberada e um retry executa de novo. Se o
+# processo morre no meio, o lease (IDEMPOTENCY_LEASE_SECONDS) expira e outra
+# requisição assume a chave; como a resposta só é gravada se o token ainda for
+# o dela, a requisição antiga, se ainda estiver viva, é desfeita em vez de
+# duplicar o pedido.
+#
+# As chaves valem IDEMPOTENCY_TTL_SECONDS (padrão 24 h); as expiradas são
+# apagadas em lotes de IDEMPOTENCY_SWEEP_BATCH (ex.: em um cron):
+#     python -m app.idempotency
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import IdempotencyKey
+from app.whatsapp_outbox import utcnow
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_SWEEP_BATCH = int(os.getenv("IDEMPOTENCY_SWEEP_BATCH", "5000"))
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+
+_keys = IdempotencyKey.__table__
+
+
+class IdempotencyClaim:
+    """
+    Outcome of claim_key: either this request owns the key (`token`) or the
+    stored response must be sent instead (`replay`).
+    """
+
+    def __init__(self, scope: str, key: str, token: Optional[str] = None, replay: Optional[JSONResponse] = None):
+        self.scope = scope
+        self.key = key
+        self.token = token
+        self.replay = replay
+
+
+def request_hash(payload: Any) -> str:
+    """
+    SHA-256 of the request body in canonical JSON (validated model or dict).
+    """
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _this_key(scope: str, key: str):
+    return and_(_keys.c.scope == scope, _keys.c.key == key)
+
+
+def _try_claim(db: Session, scope: str, key: str, body_hash: str) -> Tuple[Optional[str], Optional[Any]]:
+    """
+    One claim attempt. Returns (token, None) when this request now owns the
+    key, or (None, row) with the current row (None if it just disappeared).
+    Commits.
+    """
+    now = utcnow()
+    token = uuid.uuid4().hex
+    claim = {
+        "request_hash": body_hash,
+        "token": token,
+        "status": STATUS_PROCESSING,
+        "response_status": None,
+        "response_body": None,
+        "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+        "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    }
+    try:
+        db.execute(insert(_keys).values(scope=scope, key=key, **claim))
+        db.commit() # Visível para os retries antes de o trabalho começar
+        return token, None
+    except IntegrityError:
+        db.rollback()
+
+    # Chave existente: reaproveitada se expirou ou se quem a reivindicou abandonou o processamento.
+    # O UPDATE condicional garante um único vencedor entre requisições concorrentes.
+    taken = db.execute(
+        update(_keys)
+        .where(
+            _this_key(scope, key),
+            or_(_keys.c.expires_at < now, and_(_keys.c.status == STATUS_PROCESSING, _keys.c.locked_until < now)),
+        )
+        .values(**claim)
+    ).rowcount
+    db.commit()
+    if taken:
+        return token, None
+    row = db.execute(
+        select(_keys.c.request_hash, _keys.c.status, _keys.c.response_status, _keys.c.response_body).where(_this_key(scope, key))
+    ).first()
+    db.rollback() # Encerra a leitura: a próxima tentativa vê o estado mais recente
+    return None, row
+
+
+def _resolve(row, body_hash: str) -> Optional[JSONResponse]:
+    # Resposta guardada para reenviar, ou None enquanto a primeira requisição processa
+    if row is None:
+        return None
+    if row.request_hash != body_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key já usada com outro corpo de requisição.")
+    if row.status != STATUS_COMPLETED:
+        return None
+    return JSONResponse(status_code=row.response_status, content=json.loads(row.response_body), headers={REPLAYED_HEADER: "true"})
+
+
+def _still_processing() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Requisição com esta Idempotency-Key ainda em processamento. Tente novamente.",
+        headers={"Retry-After": "1"},
+    )
+
+
+def claim_key(db: Session, scope: str, key: str, body_hash: str) -> IdempotencyClaim:
+    """
+    Claims `key` for this request, or waits for the request that holds it
+    and returns its stored response. Raises 422 when the key was used with
+    another body and 409 when the first request is still running after
+    IDEMPOTENCY_WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        token, row = _try_claim(db, scope, key, body_hash)
+        if token:
+            return IdempotencyClaim(scope, key, token=token)
+        replay = _resolve(row, body_hash)
+        if replay is not None:
+            return IdempotencyClaim(scope, key, replay=replay)
+        if time.monotonic() >= deadline:
+            raise _still_processing()
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+async def claim_key_async(db: AsyncSession, scope: str, key: str, body_hash: str) -> IdempotencyClaim:
+    """
+    claim_key for async routes: the wait does not block the event loop.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        token, row = await db.run_sync(_try_claim, scope, key, body_hash)
+        if token:
+            return IdempotencyClaim(scope, key, token=token)
+        replay = _resolve(row, body_hash)
+        if replay is not None:
+            return IdempotencyClaim(scope, key, replay=replay)
+        if time.monotonic() >= deadline:
+            raise _still_processing()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def store_response(db: Session, claim: IdempotencyClaim, status_code: int, body: Any) -> None:
+    """
+    Records the response in the caller's transaction, so it commits together
+    with the order or message. If the key was taken over (expired lease),
+    rolls back and raises 409. Does not commit.
+    """
+    stored = db.execute(
+        update(_keys)
+        .where(_this_key(claim.scope, claim.key), _keys.c.token == claim.token, _keys.c.status == STATUS_PROCESSING)
+        .values(
+            status=STATUS_COMPLETED,
+            response_status=status_code,
+            response_body=json.dumps(jsonable_encoder(body)),
+            locked_until=None,
+        )
+    ).rowcount
+    if not stored:
+        db.rollback()
+        raise _still_processing()
+
+
+async def store_response_async(db: AsyncSession, claim: IdempotencyClaim, status_code: int, body: Any) -> None:
+    await db.run_sync(store_response, claim, status_code, body)
+
+
+def release_key(db: Session, claim: IdempotencyClaim) -> None:
+    """
+    Frees the key after a failed request so a retry runs again. Commits.
+    """
+    db.rollback() # Descarta o que a requisição deixou pela metade
+    db.execute(delete(_keys).where(_this_key(claim.scope, claim.key), _keys.c.token == claim.token, _keys.c.status == STATUS_PROCESSING))
+    db.commit()
+
+
+async def release_key_async(db: AsyncSession, claim: IdempotencyClaim) -> None:
+    await db.run_sync(release_key, claim)
+
+
+def sweep_expired(db: Session, now: Optional[datetime] = None, batch_size: int = IDEMPOTENCY_SWEEP_BATCH) -> int:
+    """
+    Deletes expired keys in batches (index on expires_at), one commit per
+    batch. Returns how many rows were deleted.
+    """
+    now = now or utcnow()
+    batch = select(_keys.c.id).where(_keys.c.expires_at < now).limit(batch_size)
+    total = 0
+    while True:
+        deleted = db.execute(delete(_keys).where(_keys.c.id.in_(batch.scalar_subquery()))).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"idempotency_keys: {sweep_expired(session)} chave(s) expirada(s) apagada(s)")
@@ -6,15 +6,61 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi import status
 import sentry_sdk # Para monitoramento de erros.
+from contextlib import asynccontextmanager
+import asyncio
 
 # Importe APENAS os roteadores, não os modelos ou funções internas de auth/users diretamente aqui.
-from app.routers import auth, products, clients, orders, whatsapp
+from app.routers import auth, products, clients, orders, whatsapp, metrics, analytics
+from app.auth import PasswordHashingBusy
+from app.zapi import ZAPIClient
+from app.whatsapp_outbox import outbox
+from app.sales_rollup import sales_rollup_job
+from app.whatsapp_campaigns import BROADCAST_RESUME_ON_STARTUP, resume_campaigns
+from app.database import AsyncSessionLocal, SessionLocal
+from app.barcode_index import barcode_index
+from app.product_cache import product_cache
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+from app.metrics import register_collector
 
 # Inicialização do Sentry SDK:
 sentry_sdk.init(dsn=None) # Altere 'None' pelo seu DSN real em produção.
 
+# Recursos compartilhados pelo processo: o cliente da Z-API é criado uma vez e
+# fechado no shutdown, para reaproveitar conexões entre requisições; os workers
+# da fila de WhatsApp (WHATSAPP_WORKERS) usam esse mesmo cliente. O mapa de códigos
+# de barras é carregado antes de aceitar requisições, e o job dos rollups de vendas
+# (SALES_ROLLUP_INTERVAL_SECONDS) roda em segundo plano. Campanhas de WhatsApp
+# interrompidas por um reinício são retomadas de onde pararam (BROADCAST_RESUME_ON_STARTUP).
+def _warm_barcode_index():
+    try:
+        with SessionLocal() as db:
+            barcode_index.warm(db)
+    except SQLAlchemyError as e: # Banco ainda sem tabelas: o mapa se preenche nas consultas
+        sentry_sdk.capture_exception(e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(_warm_barcode_index)
+    app.state.zapi = ZAPIClient()
+    register_collector("zapi", app.state.zapi.stats) # Estado do circuit breaker e limite de concorrência
+    outbox.start(AsyncSessionLocal, app.state.zapi)
+    sales_rollup_job.start(SessionLocal)
+    resume_task = asyncio.create_task(resume_campaigns(AsyncSessionLocal), name="campaign-resume") if BROADCAST_RESUME_ON_STARTUP else None
+    try:
+        yield
+    finally:
+        if resume_task is not None:
+            resume_task.cancel() # O bloco em andamento é desfeito; a posição salva vale para o próximo startup
+            await asyncio.gather(resume_task, return_exceptions=True)
+        await sales_rollup_job.stop()
+        await outbox.stop()
+        await app.state.zapi.aclose()
+        await run_in_threadpool(product_cache.flush) # Incremento coalescido pendente do cache de produtos
+
 # Instância da Aplicação FastAPI:
 app = FastAPI(
+    lifespan=lifespan,
         title="API de Gerenciamento de Clientes e Pedidos",
     description="API para gerenciar clientes, produtos e pedidos, com autenticação JWT.",
     version="1.0.0",
@@ -28,12 +74,23 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors(), "body": exc.body},
     )
 
+# Executor de bcrypt saturado: recusa rápido em vez de enfileirar sem limite
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Serviço de autenticação ocupado. Tente novamente em instantes."},
+        headers={"Retry-After": "1"},
+    )
+
 
 # A ordem geralmente não importa, mas faz sentido agrupar por funcionalidade.
 app.include_router(auth.router, prefix="/auth")
 app.include_router(clients.router, prefix="/clients")
 app.include_router(products.router, prefix="/products")
 app.include_router(orders.router, prefix="/orders")  
+app.include_router(metrics.router, prefix="/metrics")
+app.include_router(analytics.router, prefix="/analytics")
 app.include_router(whatsapp.router, prefix="/whatsapp")# O prefixo e tags já são definidos dentro de app/routers/orders.py # O prefixo e tags já são definidos dentro de app/routers/whatsapp.py
 
 
@@ -0,0 +1,23 @@
+# app/metrics.py
+
+# --- Registro de métricas em processo ---
+# Cada componente (caches, pools, executores...) registra uma função que
+# devolve um dicionário com seus contadores; GET /metrics junta todos.
+
+from typing import Any, Callable, Dict
+
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_collector(name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Registers (or replaces) a named metrics collector.
+    """
+    _collectors[name] = collector
+
+
+def collect() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns a snapshot of every registered collector.
+    """
+    return {name: collector() for name, collector in _collectors.items()}
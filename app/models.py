@@ -1,6 +1,6 @@
 # app/models.py
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Date, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Date, DateTime, Text, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func # Importe func
 from datetime import datetime # Mantenha para outros usos, mas não para defaults de Column
@@ -36,6 +36,7 @@ class Client(Base):
     created_by_user_id = Column(Integer, ForeignKey("users.id"))
     created_by_user = relationship("User", back_populates="clients")
     orders = relationship("Order", back_populates="client")
+    order_stats = relationship("ClientOrderStats", uselist=False, viewonly=True)
 
 class Product(Base):
     __tablename__ = "products"
@@ -55,6 +56,24 @@ class Product(Base):
 
     order_products = relationship("OrderProduct", back_populates="product")
 
+    # Índices para os filtros de list_products (categoria + preço, faixa de preço e disponibilidade);
+    # current_stock no fim torna o primeiro índice suficiente para as facetas (?facets=true)
+    __table_args__ = (
+        Index("ix_products_section_sale_value_stock", "section", "sale_value", "current_stock"),
+        Index("ix_products_sale_value", "sale_value"),
+        Index(
+            "ix_products_in_stock", "id",
+            postgresql_where=text("current_stock > 0"),
+            sqlite_where=text("current_stock > 0"),
+        ),
+        # Produtos perto do vencimento (GET /products/alerts): busca por faixa de datas
+        Index(
+            "ix_products_expiration_date", "expiration_date",
+            postgresql_where=text("expiration_date IS NOT NULL"),
+            sqlite_where=text("expiration_date IS NOT NULL"),
+        ),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
@@ -71,6 +90,14 @@ class Order(Base):
     client = relationship("Client", back_populates="orders")
     order_products = relationship("OrderProduct", back_populates="order")
 
+    # Índices para os filtros de list_orders (cliente, status, período e valor total)
+    __table_args__ = (
+        Index("ix_orders_client_id_order_date", "client_id", "order_date"),
+        Index("ix_orders_status_order_date", "status", "order_date"),
+        Index("ix_orders_order_date", "order_date"),
+        Index("ix_orders_total_value", "total_value"),
+    )
+
 class OrderProduct(Base):
     __tablename__ = "order_products"
     order_id = Column(Integer, ForeignKey("orders.id"), primary_key=True, nullable=False)
@@ -85,6 +112,97 @@ class OrderProduct(Base):
     order = relationship("Order", back_populates="order_products")
     product = relationship("Product", back_populates="order_products")
 
+    # A PK (order_id, product_id) já atende buscas por pedido; este índice atende buscas por produto
+    __table_args__ = (
+        Index("ix_order_products_product_id", "product_id"),
+    )
+
+class ClientOrderStats(Base):
+    __tablename__ = "client_order_stats"
+    # Agregados por cliente dos pedidos não cancelados, mantidos na mesma transação
+    # que cria, cancela ou apaga pedidos (ver app/client_stats.py)
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0, server_default="0")
+    lifetime_value = Column(Float, nullable=False, default=0.0, server_default="0")
+    last_order_date = Column(DateTime(timezone=True), nullable=True)
+
+    # Ordenação de list_clients (sort_by), com client_id como desempate do cursor
+    __table_args__ = (
+        Index("ix_client_order_stats_order_count", "order_count", "client_id"),
+        Index("ix_client_order_stats_lifetime_value", "lifetime_value", "client_id"),
+        Index("ix_client_order_stats_last_order_date", "last_order_date", "client_id"),
+    )
+
+class StockMovement(Base):
+    __tablename__ = "stock_movements"
+    # Razão do estoque (app/stock_ledger.py): uma linha por variação de current_stock
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    delta = Column(Integer, nullable=False)
+    stock_after = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False) # initial, order, order_cancel, adjustment
+    order_id = Column(Integer, nullable=True) # Sem FK: o histórico sobrevive à exclusão do pedido
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_stock_movements_product_id_id", "product_id", "id"),
+    )
+
+class LowStockProduct(Base):
+    __tablename__ = "low_stock_products"
+    # Conjunto de produtos com current_stock <= LOW_STOCK_THRESHOLD, mantido a cada movimentação
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+
+class SalesChange(Base):
+    __tablename__ = "sales_changes"
+    # Dias com pedidos criados ou cancelados ainda não levados para os rollups de vendas
+    # (app/sales_rollup.py); o job processa os ids acima da marca d'água e apaga o que processou
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+
+    __table_args__ = {"sqlite_autoincrement": True} # Ids nunca reaproveitados depois da limpeza
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    # Último id de sales_changes já processado e quando o job rodou pela última vez
+    name = Column(String, primary_key=True)
+    change_id = Column(Integer, nullable=False, default=0, server_default="0")
+    refreshed_at = Column(DateTime(timezone=True), nullable=True)
+
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+    # Rollups de vendas por dia (pedidos não cancelados), servidos por GET /analytics/sales
+    day = Column(Date, primary_key=True)
+    order_count = Column(Integer, nullable=False)
+    items_sold = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+
+class SalesDailySection(Base):
+    __tablename__ = "sales_daily_sections"
+    day = Column(Date, primary_key=True)
+    section = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False)
+    items_sold = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+
+class SalesDailyProduct(Base):
+    __tablename__ = "sales_daily_products"
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False)
+    items_sold = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+
+class SalesMonthlyProduct(Base):
+    __tablename__ = "sales_monthly_products"
+    # Soma mensal de sales_daily_products: períodos longos agrupados por produto leem
+    # um mês inteiro por linha em vez de um dia
+    month = Column(Date, primary_key=True) # Primeiro dia do mês
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False)
+    items_sold = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+
 class WhatsAppLog(Base):
     __tablename__ = "whatsapp_logs"
     id = Column(Integer, primary_key=True, index=True)
@@ -96,6 +214,77 @@ class WhatsAppLog(Base):
     response_data = Column(Text, nullable=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
     order = relationship("Order")
+    campaign_id = Column(Integer, ForeignKey("whatsapp_campaigns.id"), nullable=True)
     # Ajuste aqui:
     created_at = Column(DateTime(timezone=True), server_default=func.now()) # Adicione created_at
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now()) # Adicione updated_at
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now()) # Adicione updated_at
+    # Fila de saída (app/whatsapp_outbox.py): tentativas feitas e quando a mensagem volta a ser
+    # elegível (próximo retry para "queued", fim do lease para "sending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Índices para os filtros de list_whatsapp_logs, para a busca da fila e para a retenção
+    # (phone_number em E.164, ver app/phone.py: busca exata e por prefixo, ordenada por id)
+    __table_args__ = (
+        Index("ix_whatsapp_logs_phone_number_id", "phone_number", "id"),
+        Index("ix_whatsapp_logs_status_sent_at", "status", "sent_at"),
+        Index("ix_whatsapp_logs_status_next_attempt_at", "status", "next_attempt_at"),
+        Index("ix_whatsapp_logs_campaign_id_status", "campaign_id", "status"),
+        # Só as linhas com response_data ainda não arquivado: cada lote da compactação lê apenas o que falta
+        Index(
+            "ix_whatsapp_logs_unarchived_sent_at", "sent_at",
+            postgresql_where=text("response_data IS NOT NULL"),
+            sqlite_where=text("response_data IS NOT NULL"),
+        ),
+    )
+
+class WhatsAppLogArchive(Base):
+    __tablename__ = "whatsapp_log_archives"
+    id = Column(Integer, primary_key=True, index=True)
+    # Um registro por lote compactado: JSON {log_id: response_data} comprimido com zlib
+    first_log_id = Column(Integer, nullable=False)
+    last_log_id = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class WhatsAppCampaign(Base):
+    __tablename__ = "whatsapp_campaigns"
+    id = Column(Integer, primary_key=True, index=True)
+    message_template = Column(Text, nullable=False)
+    filters = Column(Text, nullable=True) # JSON com o filtro de clientes usado
+    status = Column(String, default="enqueuing", nullable=False) # enqueuing, enqueued, failed
+    enqueued = Column(Integer, default=0, nullable=False) # Mensagens já gravadas na fila
+    last_client_id = Column(Integer, default=0, nullable=False) # Posição do keyset: clientes até este id já enfileirados
+    error = Column(Text, nullable=True)
+    created_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    # Respostas guardadas por Idempotency-Key (app/idempotency.py): um retry com a mesma chave
+    # recebe a resposta original em vez de executar a operação de novo
+    id = Column(Integer, primary_key=True)
+    scope = Column(String, nullable=False) # Rota e usuário: a mesma chave em rotas diferentes não colide
+    key = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False) # SHA-256 do corpo: a chave não vale para outro pedido
+    token = Column(String, nullable=False) # Dono atual do processamento
+    status = Column(String, nullable=False, default="processing") # processing, completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True) # Fim do lease de quem está processando
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ux_idempotency_keys_scope_key", "scope", "key", unique=True),
+        Index("ix_idempotency_keys_expires_at", "expires_at"), # Limpeza em lotes
+    )
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    # Contador por cache compartilhado entre os workers (ver app/product_cache.py):
+    # incrementado a cada escrita, relido periodicamente por cada processo
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,110 @@
+# app/pagination.py
+
+# --- Paginação por cursor (keyset) ---
+# O cursor é opaco para o cliente: base64 de um JSON com os valores da chave de
+# ordenação da última linha da página. A próxima página começa estritamente
+# depois dessa chave, então o custo não cresce com o número da página.
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Encodes the sort-key values of a row into an opaque, URL-safe cursor.
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _coerce(column: Any, value: Any) -> Any:
+    # O cursor vem do cliente: cada valor precisa ter o tipo da coluna antes de chegar ao banco
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if value is None or isinstance(value, bool):
+        raise TypeError("valor de cursor inválido")
+    if python_type is int:
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError("inteiro esperado")
+        value = int(value)
+        if not -2**63 <= value < 2**63:
+            raise OverflowError("inteiro fora da faixa")
+        return value
+    if python_type is float:
+        return float(value)
+    if not isinstance(value, python_type):
+        raise TypeError("valor de cursor inválido")
+    return value
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """
+    Decodes a cursor back into typed values for the given sort columns.
+    Raises 400 if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor com número de chaves inválido")
+        return [_coerce(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, OverflowError, NotImplementedError, json.JSONDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginação inválido.")
+
+
+def apply_keyset(query, columns: Sequence[Any], cursor: Optional[str], skip: int, limit: int, descending: bool = False):
+    """
+    Adds ORDER BY, the keyset predicate, OFFSET and LIMIT to an ORM Query or a
+    select() statement. The last column must be unique (normally the primary key).
+    With `descending`, every column is sorted in descending order.
+    """
+    query = query.order_by(*(column.desc() for column in columns) if descending else columns)
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        left = columns[0] if len(columns) == 1 else tuple_(*columns)
+        right = values[0] if len(columns) == 1 else tuple_(*values)
+        query = query.filter(left < right if descending else left > right)
+    if skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def set_next_cursor(rows: list, columns: Sequence[Any], limit: int, response: Response) -> None:
+    """
+    Sets the X-Next-Cursor header when a full page was returned.
+    """
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in columns])
+
+
+def paginate(query: Query, columns: Sequence[Any], cursor: Optional[str], skip: int, limit: int, response: Response) -> list:
+    """
+    Applies keyset pagination ordered by `columns`. `skip` is still honoured
+    for backwards compatibility.
+    """
+    rows = apply_keyset(query, columns, cursor, skip, limit).all()
+    set_next_cursor(rows, columns, limit, response)
+    return rows
+
+
+async def paginate_async(db: AsyncSession, stmt: Select, columns: Sequence[Any], cursor: Optional[str], skip: int, limit: int, response: Response) -> list:
+    """
+    Async variant of paginate() for select() statements on an AsyncSession.
+    """
+    result = await db.execute(apply_keyset(stmt, columns, cursor, skip, limit))
+    rows = list(result.scalars().all())
+    set_next_cursor(rows, columns, limit, response)
+    return rows
@@ -0,0 +1,50 @@
+# app/phone.py
+
+# --- Normalização de telefones (E.164) ---
+# Os telefones de whatsapp_logs são gravados no formato E.164 apenas com dígitos
+# (código do país + DDD + número, sem "+"), que é também o formato que a Z-API
+# espera. Assim a busca exata e por prefixo usa o índice de phone_number, e a
+# comparação de faixas só envolve dígitos (independe da collation do banco).
+
+import os
+import re
+from typing import Optional, Tuple
+
+DEFAULT_PHONE_COUNTRY_CODE = os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "55")
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(raw: str, default_country_code: str = DEFAULT_PHONE_COUNTRY_CODE) -> str:
+    """
+    Normalizes a phone number to E.164 digits. Numbers written without a
+    country code ("(11) 99999-9999", "011 99999-9999") get `default_country_code`.
+    Raises ValueError if the result is not a plausible E.164 number.
+    """
+    raw = raw.strip()
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("+"):
+        pass
+    elif raw.startswith("00"):
+        digits = digits[2:] # Prefixo internacional
+    else:
+        digits = digits.lstrip("0") # Prefixo de longa distância nacional
+        if len(digits) in (10, 11): # DDD + número (fixo ou celular)
+            digits = default_country_code + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        raise ValueError("número de telefone inválido")
+    return digits
+
+
+def phone_prefix_range(prefix: str) -> Tuple[str, Optional[str]]:
+    """
+    Returns [lower, upper) bounds matching every digit string that starts
+    with `prefix` (upper is None when the prefix is all nines). A range on the
+    indexed column is used instead of LIKE 'x%', which Postgres only indexes
+    with text_pattern_ops and SQLite only with a matching collation.
+    """
+    digits = _NON_DIGITS.sub("", prefix)
+    upper = digits.rstrip("9")
+    if not upper:
+        return digits, None
+    return digits, upper[:-1] + str(int(upper[-1]) + 1)
@@ -0,0 +1,264 @@
+# app/product_cache.py
+
+# --- Cache de produtos em processo ---
+# Produtos são lidos muito mais do que alterados. get_product_by_id e
+# list_products guardam as respostas em um LRU por processo: por id e pela chave
+# normalizada dos filtros da listagem (incluindo cursor/offset/limit e o
+# X-Next-Cursor da página).
+#
+# Invalidação: toda escrita em produtos (create/update/delete) chama
+# invalidate(db) depois do commit. Isso incrementa o contador "products" da
+# tabela cache_versions, compartilhada pelos workers, e a versão local (as
+# entradas antigas deixam de valer na hora, neste processo). Cada worker relê
+# esse contador no máximo a cada PRODUCT_CACHE_VERSION_CHECK_SECONDS; se mudou,
+# descarta o que tem. PRODUCT_CACHE_TTL_SECONDS limita a idade de uma entrada
+# mesmo que uma escrita fora da API não passe pelo contador.
+#
+# A baixa e a devolução de estoque dos pedidos usam invalidate_coalesced(db):
+# a versão local muda na hora, mas o contador compartilhado é incrementado no
+# máximo uma vez por PRODUCT_CACHE_VERSION_CHECK_SECONDS, por uma thread fora da
+# requisição. Assim o checkout não disputa a linha de cache_versions com os
+# outros workers nem faz uma segunda transação. Janela de desatualização do
+# estoque nos outros workers: até 2 x PRODUCT_CACHE_VERSION_CHECK_SECONDS
+# (espera do incremento + intervalo de releitura).
+#
+# Uma falha ao incrementar o contador depois do commit é registrada
+# (error_reporter) e não vira erro da requisição: a escrita já foi gravada.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.error_reporting import error_reporter
+from app.metrics import register_collector
+from app.models import CacheVersion as DBCacheVersion
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "2048"))
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "300"))
+PRODUCT_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("PRODUCT_CACHE_VERSION_CHECK_SECONDS", "1"))
+
+PRODUCTS_STAMP = "products"
+
+
+def normalize_filters(**filters: Any) -> Tuple:
+    """
+    Cache key for a listing: text filters trimmed and lowercased (they are
+    matched case-insensitively), empty values dropped, keys sorted.
+    """
+    normalized = []
+    for name, value in sorted(filters.items()):
+        if isinstance(value, str):
+            value = value.strip().lower() if name == "description" else value.strip()
+        if value is None or value == "":
+            continue
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+class ProductCache:
+    """
+    Bounded LRU of product responses, invalidated by a version counter that
+    is shared between processes through the cache_versions table.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, check_interval: float, stamp: str = PRODUCTS_STAMP):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.check_interval = check_interval
+        self.stamp = stamp
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict() # chave -> (versão, expira em, valor)
+        self._lock = threading.Lock()
+        self.version = 0 # Versão local: só entradas gravadas nesta versão são válidas
+        self._shared_version: Optional[int] = None # Último valor lido de cache_versions
+        self._checked_at = 0.0
+        self._stamped_at = float("-inf") # Último incremento coalescido do contador compartilhado
+        self._stamp_timer: Optional[threading.Timer] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.stamp_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def sync(self, db: Session) -> int:
+        """
+        Re-reads the shared stamp (at most once per check interval) and drops
+        every entry if another process bumped it. Returns the local version,
+        to be passed to put() for values read after this call.
+        """
+        if not self.enabled:
+            return self.version
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            shared = db.scalar(select(DBCacheVersion.version).where(DBCacheVersion.name == self.stamp)) or 0
+            with self._lock:
+                self._checked_at = now
+                if shared != self._shared_version:
+                    self._shared_version = shared
+                    self._bump()
+        return self.version
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, value: Any, version: int) -> None:
+        """
+        Stores `value` if the cache is still at `version` (the version seen
+        before the value was read from the database), so a read that raced
+        with a write is never cached.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, db: Session) -> None:
+        """
+        Called after a committed product write: bumps the shared stamp so other
+        processes drop their entries, then drops this process's. Commits.
+        """
+        try:
+            shared = self._bump_shared(db)
+        except Exception as e:
+            db.rollback()
+            self._report(e)
+            shared = None
+        # Só depois do commit: leituras feitas antes dele foram gravadas na versão anterior e caem aqui
+        with self._lock:
+            if shared is not None:
+                self._shared_version = shared
+            self._bump()
+
+    def invalidate_coalesced(self, db: Session) -> None:
+        """
+        Called after a committed stock change from order traffic: drops this
+        process's entries now and schedules the shared bump, at most one per
+        check interval, on a separate session bound to the same database.
+        """
+        bind = db.get_bind()
+        with self._lock:
+            self._bump()
+            if self._stamp_timer is not None:
+                return # O incremento já agendado cobre esta escrita
+            delay = max(0.0, self._stamped_at + self.check_interval - time.monotonic())
+            timer = threading.Timer(delay, self._flush_stamp, args=(bind,))
+            timer.daemon = True
+            self._stamp_timer = timer
+        try:
+            timer.start()
+        except Exception as e: # Ex.: sem threads disponíveis; o pedido já foi gravado
+            with self._lock:
+                self._stamp_timer = None
+            self._report(e)
+
+    def flush(self) -> None:
+        """
+        Runs the pending coalesced bump now (shutdown and tests).
+        """
+        with self._lock:
+            timer = self._stamp_timer
+        if timer is not None:
+            timer.cancel()
+            self._flush_stamp(*timer.args)
+
+    def _flush_stamp(self, bind) -> None:
+        with self._lock:
+            if self._stamp_timer is None:
+                return # Já executado por flush()
+            # Liberado antes do UPDATE: escritas commitadas depois disto agendam outro incremento
+            self._stamp_timer = None
+            self._stamped_at = time.monotonic()
+        try:
+            with Session(bind) as db:
+                shared = self._bump_shared(db)
+        except Exception as e:
+            self._report(e)
+            return
+        with self._lock:
+            self._shared_version = shared
+            self._bump()
+
+    def _bump_shared(self, db: Session) -> int:
+        bumped = db.execute(
+            update(DBCacheVersion).where(DBCacheVersion.name == self.stamp).values(version=DBCacheVersion.version + 1)
+        ).rowcount
+        if not bumped:
+            try:
+                db.execute(insert(DBCacheVersion).values(name=self.stamp, version=1))
+            except IntegrityError: # Outro processo criou a linha ao mesmo tempo
+                db.rollback()
+                return self._bump_shared(db)
+        shared = db.scalar(select(DBCacheVersion.version).where(DBCacheVersion.name == self.stamp))
+        db.commit()
+        return shared
+
+    def _report(self, exc: Exception) -> None:
+        # Os outros workers ficam com o cache antigo até o TTL ou o próximo incremento
+        error_reporter.capture(exc)
+        with self._lock:
+            self.stamp_errors += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._stamp_timer is not None:
+                self._stamp_timer.cancel()
+                self._stamp_timer = None
+            self._stamped_at = float("-inf")
+            self._bump()
+            self._shared_version = None
+            self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stamp_errors": self.stamp_errors,
+                "stamp_pending": self._stamp_timer is not None,
+            }
+
+    def _bump(self) -> None:
+        self.version += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+
+product_cache = ProductCache(PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL_SECONDS, PRODUCT_CACHE_VERSION_CHECK_SECONDS)
+register_collector("product_cache", product_cache.stats)
@@ -0,0 +1,143 @@
+# app/product_import.py
+
+# --- Importação de produtos em lote (POST /products/import) ---
+# O CSV enviado é lido linha a linha direto do arquivo temporário do upload (sem
+# carregar o arquivo inteiro em memória) e processado em lotes de
+# PRODUCT_IMPORT_BATCH_SIZE linhas. Por lote: cada linha é validada com
+# ProductCreate, os códigos de barras são conferidos com uma única consulta
+# IN (...), os produtos novos entram com um INSERT em lote (COPY no Postgres com
+# psycopg2) e, no modo upsert, os existentes são atualizados com um UPDATE em
+# lote por id. Os produtos novos ganham a movimentação inicial no razão do
+# estoque (app/stock_ledger.py) com um INSERT ... SELECT. Um commit por lote.
+
+import csv
+import io
+import os
+from enum import Enum
+from typing import IO, Dict, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models import Product as DBProduct
+from app.schemas import ProductCreate, ProductImportError, ProductImportResponse
+from app.stock_ledger import record_initial_stock
+
+PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv("PRODUCT_IMPORT_BATCH_SIZE", "500"))
+
+REQUIRED_COLUMNS = [name for name, field in ProductCreate.model_fields.items() if field.is_required()]
+_FIELDS = frozenset(ProductCreate.model_fields)
+# Colunas gravadas (current_stock começa igual ao estoque inicial, como em create_product)
+_INSERT_COLUMNS = list(ProductCreate.model_fields) + ["current_stock"]
+
+
+class ImportMode(str, Enum):
+    insert = "insert" # Código de barras já cadastrado é um erro da linha
+    upsert = "upsert" # Código de barras já cadastrado atualiza o produto
+
+
+class InvalidImportFile(ValueError):
+    pass
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in exc.errors())
+
+
+def _read_batches(reader: csv.DictReader, batch_size: int) -> Iterator[List[Tuple[int, Dict[str, str]]]]:
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_rows(db: Session, rows: List[dict]) -> None:
+    """
+    COPY ... FROM STDIN for Postgres (psycopg2): one round trip for the batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[column] is None else row[column] for column in _INSERT_COLUMNS])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY products ({', '.join(_INSERT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _write_batch(db: Session, new_rows: List[dict], updates: List[dict]) -> None:
+    if new_rows:
+        if db.get_bind().dialect.driver == "psycopg2":
+            _copy_rows(db, new_rows)
+        else:
+            # Core (sem a camada de persistência do ORM): um executemany direto no driver
+            db.execute(insert(DBProduct.__table__), new_rows)
+        record_initial_stock(db, DBProduct.barcode.in_([row["barcode"] for row in new_rows]))
+    if updates:
+        # current_stock não é tocado no upsert: o estoque atual reflete os pedidos já feitos
+        db.execute(update(DBProduct), updates) # UPDATE em lote pela chave primária
+
+
+def import_products(db: Session, file: IO[bytes], mode: ImportMode = ImportMode.insert, batch_size: int = PRODUCT_IMPORT_BATCH_SIZE) -> ProductImportResponse:
+    """
+    Imports products from a CSV file object (header row with the ProductCreate
+    field names). Invalid rows are reported and skipped; valid rows are
+    written batch by batch. Raises InvalidImportFile for a bad header or an
+    unreadable file (batches before the bad line stay committed).
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        header = reader.fieldnames or []
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise InvalidImportFile(f"faltam as colunas {', '.join(missing)}")
+
+        report = ProductImportResponse(processed=0, created=0, updated=0, failed=0, errors=[])
+        for batch in _read_batches(reader, batch_size):
+            valid: List[Tuple[int, ProductCreate]] = []
+            for line, row in batch:
+                report.processed += 1
+                values = {key: value.strip() or None for key, value in row.items() if key in _FIELDS and value is not None}
+                try:
+                    valid.append((line, ProductCreate.model_validate(values)))
+                except ValidationError as e:
+                    report.errors.append(ProductImportError(line=line, barcode=row.get("barcode"), error=_format_validation_error(e)))
+
+            # Uma consulta para todos os códigos de barras do lote
+            barcodes = {product.barcode for _, product in valid}
+            existing = dict(db.query(DBProduct.barcode, DBProduct.id).filter(DBProduct.barcode.in_(barcodes))) if barcodes else {}
+
+            new_rows, updates, seen = [], [], set()
+            for line, product in valid:
+                if product.barcode in seen:
+                    report.errors.append(ProductImportError(line=line, barcode=product.barcode, error="Código de barras repetido no arquivo."))
+                    continue
+                seen.add(product.barcode)
+                data = product.model_dump()
+                if product.barcode in existing:
+                    if mode is ImportMode.upsert:
+                        updates.append({**data, "id": existing[product.barcode]})
+                    else:
+                        report.errors.append(ProductImportError(line=line, barcode=product.barcode, error="Produto com este código de barras já existe."))
+                    continue
+                new_rows.append({**data, "current_stock": product.initial_stock})
+
+            _write_batch(db, new_rows, updates)
+            db.commit()
+            report.created += len(new_rows)
+            report.updated += len(updates)
+
+        report.failed = len(report.errors)
+        return report
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise InvalidImportFile(str(e))
+    finally:
+        text.detach() # O arquivo do upload é fechado pelo FastAPI
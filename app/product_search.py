@@ -0,0 +1,125 @@
+# app/product_search.py
+
+# --- Busca textual de produtos (GET /products/search) ---
+# Um LIKE '%termo%' em description varre a tabela inteira e não ignora acentos.
+# A busca usa um índice textual próprio de cada banco:
+#   - SQLite: tabela virtual FTS5 products_fts (conteúdo externo: só o índice, o
+#     texto continua em products), mantida em sincronia por triggers. O tokenizer
+#     unicode61 com remove_diacritics remove os acentos; prefix='2 3' indexa
+#     prefixos curtos para a busca "enquanto digita".
+#   - Postgres: índice GIN sobre to_tsvector('simple', immutable_unaccent(description))
+#     para a busca por palavras/prefixos e um GIN pg_trgm para aproximar erros de
+#     digitação. As extensões, a função e os índices vêm da migração
+#     f3b8c2d5e917 (e dos eventos abaixo quando as tabelas são criadas via create_all).
+# Cada palavra da busca vira um prefixo e todas precisam aparecer; o resultado é
+# ordenado por relevância (bm25 no SQLite, ts_rank + similaridade no Postgres).
+
+import re
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import DDL, column, event, func, literal_column, or_, table, text
+from sqlalchemy.orm import Session
+
+from app.models import Product as DBProduct
+
+_WORDS = re.compile(r"\w+")
+
+products_fts = table("products_fts", column("rowid"), column("description"))
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "description, content='products', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, description) VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF description ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+    "INSERT INTO products_fts(rowid, description) VALUES (new.id, new.description); END",
+]
+
+# Mesmo conteúdo da migração f3b8c2d5e917
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # unaccent() não é IMMUTABLE, o que impede o uso em índices de expressão
+    "CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+    "CREATE INDEX IF NOT EXISTS ix_products_description_tsv ON products "
+    "USING gin (to_tsvector('simple', immutable_unaccent(description)))",
+    "CREATE INDEX IF NOT EXISTS ix_products_description_trgm ON products "
+    "USING gin (immutable_unaccent(lower(description)) gin_trgm_ops)",
+]
+
+for _statement in _SQLITE_DDL:
+    event.listen(DBProduct.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_DDL:
+    event.listen(DBProduct.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(DBProduct.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
+
+
+def fold(value: str) -> str:
+    """
+    Lowercases and strips accents ("Calça" -> "calca").
+    """
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def search_terms(q: str) -> List[str]:
+    return _WORDS.findall(fold(q))
+
+
+def search_products(db: Session, q: str, category: Optional[str] = None, skip: int = 0, limit: int = 10) -> List[DBProduct]:
+    """
+    Products whose description contains every word of `q` as a word prefix,
+    most relevant first. Returns [] when `q` has no searchable words.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # Cada termo entre aspas (sem operadores FTS vindos do usuário) com * de prefixo
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = (
+            db.query(DBProduct)
+            .join(products_fts, products_fts.c.rowid == DBProduct.id)
+            .filter(text("products_fts MATCH :match"))
+            .params(match=match)
+            .order_by(func.bm25(literal_column("products_fts")), DBProduct.id)
+        )
+    elif dialect == "postgresql":
+        document = func.to_tsvector("simple", func.immutable_unaccent(DBProduct.description))
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        folded = func.immutable_unaccent(func.lower(DBProduct.description))
+        phrase = " ".join(terms)
+        query = (
+            db.query(DBProduct)
+            .filter(or_(document.op("@@")(tsquery), folded.op("%")(phrase)))
+            .order_by((func.ts_rank(document, tsquery) + func.similarity(folded, phrase)).desc(), DBProduct.id)
+        )
+    else:
+        query = db.query(DBProduct)
+        for term in terms:
+            query = query.filter(DBProduct.description.ilike(f"%{term}%"))
+        query = query.order_by(DBProduct.id)
+    if category:
+        query = query.filter(DBProduct.section == category)
+    return query.offset(skip).limit(limit).all()
+
+
+def rebuild_search_index(db: Session) -> None:
+    """
+    Repopulates products_fts from products (SQLite databases created before the
+    search table existed). Postgres indexes are maintained by the database.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    for statement in _SQLITE_DDL:
+        db.execute(text(statement))
+    db.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    db.commit()
@@ -0,0 +1,131 @@
+# app/routers/analytics.py
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import date, timedelta
+from enum import Enum
+from app.users import admin_required
+
+from app.database import get_db
+from app.models import (
+    Product as DBProduct,
+    RollupWatermark,
+    SalesDaily,
+    SalesDailyProduct,
+    SalesDailySection,
+    SalesMonthlyProduct,
+)
+from app.schemas import SalesReport, SalesRow
+from app.sales_rollup import WATERMARK_NAME, month_start, next_month
+
+router = APIRouter(tags=["Análises"])
+
+
+class SalesGroupBy(str, Enum):
+    day = "day"
+    section = "section"
+    product = "product"
+
+
+def _product_columns(model):
+    return select(model.product_id, model.order_count, model.items_sold, model.revenue)
+
+
+def _product_periods(start_date: date, end_date: date):
+    """
+    Rows of the product rollups covering [start_date, end_date]: whole months
+    from sales_monthly_products, the partial months at the edges from
+    sales_daily_products.
+    """
+    first_month = start_date if start_date.day == 1 else next_month(start_date)
+    end_month = month_start(end_date + timedelta(days=1)) # Exclusivo
+    daily, monthly = SalesDailyProduct, SalesMonthlyProduct
+    if first_month >= end_month: # Nenhum mês inteiro no período
+        return [_product_columns(daily).where(daily.day >= start_date, daily.day <= end_date)]
+    parts = [_product_columns(monthly).where(monthly.month >= first_month, monthly.month < end_month)]
+    if start_date < first_month:
+        parts.append(_product_columns(daily).where(daily.day >= start_date, daily.day < first_month))
+    if end_month <= end_date:
+        parts.append(_product_columns(daily).where(daily.day >= end_month, daily.day <= end_date))
+    return parts
+
+
+@router.get("/sales", response_model=SalesReport, summary="Vendas por dia, seção ou produto (rollups diários)")
+def sales_report(
+    group_by: SalesGroupBy = Query(SalesGroupBy.day, description="Agrupamento: day, section ou product"),
+    start_date: Optional[date] = Query(None, description="Primeiro dia (padrão: 29 dias antes de end_date)"),
+    end_date: Optional[date] = Query(None, description="Último dia, inclusivo (padrão: hoje)"),
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de produtos (group_by=product), por receita"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(admin_required) # Apenas admin vê os números de vendas
+):
+    """
+    Reads only the rollup tables kept by app/sales_rollup.py: a multi-year
+    range reads at most one row per day (and section) or, per product, one
+    row per whole month plus the days at the edges.
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date deve ser anterior ou igual a end_date.")
+
+    if group_by == SalesGroupBy.day:
+        rows = [
+            SalesRow(day=row.day, order_count=row.order_count, items_sold=row.items_sold, revenue=row.revenue)
+            for row in db.execute(
+                select(SalesDaily)
+                .where(SalesDaily.day >= start_date, SalesDaily.day <= end_date)
+                .order_by(SalesDaily.day)
+            ).scalars()
+        ]
+    elif group_by == SalesGroupBy.section:
+        rows = [
+            SalesRow(section=row.section, order_count=row.order_count, items_sold=row.items_sold, revenue=row.revenue)
+            for row in db.execute(
+                select(
+                    SalesDailySection.section,
+                    func.sum(SalesDailySection.order_count).label("order_count"),
+                    func.sum(SalesDailySection.items_sold).label("items_sold"),
+                    func.sum(SalesDailySection.revenue).label("revenue"),
+                )
+                .where(SalesDailySection.day >= start_date, SalesDailySection.day <= end_date)
+                .group_by(SalesDailySection.section)
+                .order_by(func.sum(SalesDailySection.revenue).desc())
+            )
+        ]
+    else:
+        periods = union_all(*_product_periods(start_date, end_date)).subquery()
+        totals = (
+            select(
+                periods.c.product_id,
+                func.sum(periods.c.order_count).label("order_count"),
+                func.sum(periods.c.items_sold).label("items_sold"),
+                func.sum(periods.c.revenue).label("revenue"),
+            )
+            .group_by(periods.c.product_id)
+            .order_by(func.sum(periods.c.revenue).desc(), periods.c.product_id)
+            .limit(limit)
+            .subquery()
+        )
+        rows = [
+            SalesRow(
+                product_id=row.product_id, description=row.description,
+                order_count=row.order_count, items_sold=row.items_sold, revenue=row.revenue,
+            )
+            for row in db.execute(
+                select(totals, DBProduct.description)
+                .join(DBProduct, DBProduct.id == totals.c.product_id)
+                .order_by(totals.c.revenue.desc(), totals.c.product_id)
+            )
+        ]
+
+    watermark = db.get(RollupWatermark, WATERMARK_NAME)
+    return SalesReport(
+        group_by=group_by.value,
+        start_date=start_date,
+        end_date=end_date,
+        refreshed_at=watermark.refreshed_at if watermark else None,
+        rows=rows,
+    )
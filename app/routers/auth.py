@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User as DBUser
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.schemas import UserCreate, UserLogin, Token, RefreshTokenInput # Importa os schemas Pydantic
-from app.auth import get_password_hash, verify_password, criar_token, ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
+from app.auth import verify_password_bounded, criar_token, ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
 from jose import jwt, JWTError
 from datetime import timedelta
 from app.users import get_current_user, admin_required
@@ -13,7 +12,7 @@ from app.crud import create_user_in_db, get_user_by_email
 router = APIRouter(tags=["Autenticação"])
 
 @router.post("/register", response_model=Token, summary="Registra um novo usuário")
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Registra um novo usuário na aplicação.
     - **email**: O endereço de e-mail do usuário.
@@ -22,40 +21,33 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     Retorna um token de acesso para o usuário recém-registrado.
     """
     # Verifica se já existe um usuário com o e-mail fornecido
-    db_user = db.query(DBUser).filter(DBUser.email == user_data.email).first()
+    db_user = await get_user_by_email(db, user_data.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email já registrado."
         )
 
-    # Gera o hash da senha para armazenamento seguro
-    hashed_password = get_password_hash(user_data.password)
-
-    # Cria uma nova instância do modelo de usuário do SQLAlchemy
-    new_user = create_user_in_db(db, user_data)
-    
-    # Adiciona o novo usuário à sessão do banco de dados, salva e atualiza o objeto
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # Cria e salva o usuário (o hash da senha é feito uma única vez, no executor de bcrypt)
+    new_user = await create_user_in_db(db, user_data)
 
     # Cria um token de acesso para o novo usuário
     access_token = criar_token(data={"sub": new_user.email, "is_admin": new_user.is_admin})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token, summary="Autentica um usuário existente")
-def login_for_access_token(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_for_access_token(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     Autentica um usuário e retorna um token de acesso JWT.
     - **email**: O e-mail do usuário.
     - **password**: A senha do usuário.
     """
     # Busca o usuário no banco de dados pelo e-mail
-    user = db.query(DBUser).filter(DBUser.email == user_data.email).first()
+    user = await get_user_by_email(db, user_data.email)
     
-    # Verifica se o usuário existe e se a senha está correta
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    # Verifica se o usuário existe e se a senha está correta (bcrypt roda no executor dedicado,
+    # aguardado sem ocupar uma thread do pool de requisições)
+    if not user or not await verify_password_bounded(user_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciais inválidas",
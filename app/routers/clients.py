@@ -1,14 +1,21 @@
 # app/routers/clients.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
+from enum import Enum
 from pydantic import EmailStr
 from app.users import get_current_user, admin_required
 # Importe seus modelos SQLAlchemy e Pydantic
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models import Client as DBClient # Renomeie para evitar conflito com Pydantic Client
-from app.schemas import ClientCreate, ClientUpdate, Client # Seu modelo Pydantic Client
+from app.models import ClientOrderStats as DBClientOrderStats
+from app.schemas import ClientCreate, ClientUpdate, Client, ClientWithStats # Seu modelo Pydantic Client
+from app.pagination import NEXT_CURSOR_HEADER, apply_keyset, encode_cursor, paginate_async
+from app.client_stats import ensure_client_stats
+from app.export import ExportFormat, stream_export
 
 # Assumindo que você tem essas
 
@@ -16,23 +23,72 @@ router = APIRouter(tags=["Clientes"])
 
 # Remova o dicionário em memória: clients = {}
 
-@router.get("/", response_model=List[Client], summary="Listar todos os clientes com paginação e filtro")
+class ClientSort(str, Enum):
+    id = "id"
+    order_count = "order_count" # Os demais: decrescente, lidos de client_order_stats
+    lifetime_value = "lifetime_value"
+    last_order_date = "last_order_date"
+
+def _client_filters(nome: Optional[str], email: Optional[str]) -> list:
+    """
+    Filtros comuns de list_clients e export_clients.
+    """
+    conditions = []
+    if nome:
+        conditions.append(DBClient.nome.ilike(f"%{nome}%"))  # Corrigido aqui!
+    if email:
+        conditions.append(DBClient.email.ilike(f"%{email}%"))
+    return conditions
+
+@router.get("/", response_model=List[ClientWithStats], summary="Listar todos os clientes com paginação e filtro")
 async def list_clients(
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_async_db), # Sessão assíncrona: a consulta não bloqueia o event loop
     nome: Optional[str] = Query(None, description="Filtrar clientes por nome"),
     email: Optional[EmailStr] = Query(None, description="Filtrar clientes por e-mail"),
+    sort_by: ClientSort = Query(ClientSort.id, description="Ordenação: id (crescente) ou order_count, lifetime_value, last_order_date (decrescente)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor da resposta anterior)"),
     skip: int = Query(0, ge=0, description="Número de clientes a pular (offset)"),
     limit: int = Query(10, ge=1, le=100, description="Número máximo de clientes por página"),
     current_user: dict = Depends(admin_required)
 ):
-    query = db.query(DBClient)
-    if nome:
-        query = query.filter(DBClient.nome.ilike(f"%{nome}%"))  # Corrigido aqui!
-    if email:
-        query = query.filter(DBClient.email.ilike(f"%{email}%"))
-    clients_from_db = query.offset(skip).limit(limit).all()
+    if sort_by is ClientSort.id:
+        stmt = select(DBClient).where(*_client_filters(nome, email)).options(selectinload(DBClient.order_stats))
+        return await paginate_async(db, stmt, [DBClient.id], cursor, skip, limit, response)
+
+    # Ordenação pelos agregados: percorre o índice (coluna, client_id) de client_order_stats;
+    # por data do último pedido, só entram clientes com pedidos
+    sort_column = getattr(DBClientOrderStats, sort_by.value)
+    stmt = (
+        select(DBClient)
+        .join(DBClient.order_stats)
+        .options(contains_eager(DBClient.order_stats))
+        .where(*_client_filters(nome, email))
+    )
+    if sort_by is ClientSort.last_order_date:
+        stmt = stmt.where(sort_column.is_not(None))
+    columns = [sort_column, DBClientOrderStats.client_id]
+    result = await db.execute(apply_keyset(stmt, columns, cursor, skip, limit, descending=True))
+    clients_from_db = list(result.scalars().all())
+    if len(clients_from_db) == limit:
+        last = clients_from_db[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last.order_stats, sort_by.value), last.id])
     return clients_from_db
 
+@router.get("/export", summary="Exportar clientes em streaming (NDJSON ou CSV)")
+def export_clients(
+    db: Session = Depends(get_db),
+    fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format", description="Formato da exportação: ndjson ou csv"),
+    nome: Optional[str] = Query(None, description="Filtrar clientes por nome"),
+    email: Optional[EmailStr] = Query(None, description="Filtrar clientes por e-mail"),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Exporta todos os clientes que atendem aos filtros, sem paginação.
+    """
+    query = db.query(DBClient).filter(*_client_filters(nome, email)).order_by(DBClient.id)
+    return stream_export(db, query, Client, fmt, "clients")
+
 @router.post("/", response_model=Client, status_code=status.HTTP_201_CREATED, summary="Criar um novo cliente")
 def create_client(
     client: ClientCreate, # Usa o modelo Pydantic para criação
@@ -59,19 +115,21 @@ def create_client(
     db_client = DBClient(**client.model_dump()) # Converte Pydantic para SQLAlchemy model
 
     db.add(db_client) # Adiciona ao sessão
+    db.flush()
+    ensure_client_stats(db, db_client.id) # Linha zerada: o cliente já aparece nas ordenações por agregados
     db.commit()      # Salva no banco de dados
     db.refresh(db_client) # Atualiza o objeto com o ID gerado pelo DB
 
     return db_client # Retorna o objeto SQLAlchemy, que será convertido para Pydantic pelo response_model
 
-@router.get("/{client_id}", response_model=Client, summary="Obter informações de um cliente específico")
+@router.get("/{client_id}", response_model=ClientWithStats, summary="Obter informações de um cliente específico")
 def get_client_by_id(
     client_id: int, # Renomeado para evitar conflito com o parâmetro 'id' do Pydantic
     db: Session = Depends(get_db),
     current_user: dict = Depends(admin_required)
 ):
-    # Busca o cliente pelo ID
-    client = db.query(DBClient).filter(DBClient.id == client_id).first()
+    # Busca o cliente pelo ID, com os agregados de pedidos (uma linha pela PK, sem agregar orders)
+    client = db.query(DBClient).options(joinedload(DBClient.order_stats)).filter(DBClient.id == client_id).first()
     if not client:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cliente não encontrado")
     return client
@@ -117,6 +175,7 @@ def delete_client(
     if not client:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cliente não encontrado")
 
+    db.execute(delete(DBClientOrderStats.__table__).where(DBClientOrderStats.client_id == client_id)) # FK em cascata só no Postgres
     db.delete(client) # Marca o objeto para exclusão
     db.commit()      # Executa a exclusão no banco de dados
     return {"message": f"Client {client_id} deleted."} # Para 204, o corpo da resposta geralmente é vazio
\ No newline at end of file
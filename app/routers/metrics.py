@@ -0,0 +1,17 @@
+# app/routers/metrics.py
+
+from fastapi import APIRouter, Depends
+from typing import Any, Dict
+
+from app.metrics import collect
+from app.users import admin_required
+
+router = APIRouter(tags=["Métricas"])
+
+
+@router.get("/", summary="Métricas internas da aplicação (caches, pools, filas)")
+def get_metrics(current_user: dict = Depends(admin_required)) -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna os contadores de todos os componentes registrados em app.metrics.
+    """
+    return collect()
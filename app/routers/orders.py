@@ -1,9 +1,11 @@
 # app/routers/orders.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload # Importar joinedload para carregar relacionamentos
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Response
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session, joinedload, selectinload # Importar joinedload para carregar relacionamentos
 from typing import Optional, List
 from datetime import datetime
+import os
 from app.users import get_current_user, admin_required
 
 # Importe seus modelos SQLAlchemy e Pydantic
@@ -12,16 +14,48 @@ from app.models import (
     Order as DBOrder,
     Client as DBClient,
     Product as DBProduct,
-    OrderProduct as DBOrderProduct
+    OrderProduct as DBOrderProduct,
+    WhatsAppLog as DBWhatsAppLog
 )
-from app.schemas import OrderCreate, UpdateOrderStatus, Order, OrderProductCreate # Importe OrderProductCreate aqui
+from app.schemas import OrderCreate, UpdateOrderStatus, Order, OrderProductCreate, BulkOrderResult, BulkOrderResponse
+from app.schemas import OrderProduct as OrderProductSchema
+from app.export import ExportFormat, stream_export
+from app.stock import aggregate_quantities, reserve_stock, decrement_stock, restore_order_stock
+from app.pagination import paginate
+from app.product_cache import product_cache
+from app.stock_ledger import record_movements
+from app.client_stats import add_orders, remove_order
+from app.sales_rollup import record_order_changes
+from app.idempotency import IdempotencyClaim, claim_key, release_key, request_hash, store_response
 
 router = APIRouter(tags=["Pedidos"])
 
+# Tamanho padrão do lote para POST /orders/bulk (pode ser sobrescrito por requisição com ?chunk_size=)
+BULK_ORDER_CHUNK_SIZE = int(os.getenv("BULK_ORDER_CHUNK_SIZE", "500"))
+
 # Remova o dicionário em memória: pedidos = {}
 
+def _apply_order_filters(query, status_filter, client_id, start_date, end_date, min_total_value, max_total_value):
+    """
+    Filtros comuns de list_orders e export_orders.
+    """
+    if status_filter:
+        query = query.filter(DBOrder.status == status_filter)
+    if client_id:
+        query = query.filter(DBOrder.client_id == client_id)
+    if start_date:
+        query = query.filter(DBOrder.order_date >= start_date)
+    if end_date:
+        query = query.filter(DBOrder.order_date <= end_date)
+    if min_total_value is not None:
+        query = query.filter(DBOrder.total_value >= min_total_value)
+    if max_total_value is not None:
+        query = query.filter(DBOrder.total_value <= max_total_value)
+    return query
+
 @router.get("/", response_model=List[Order], summary="Listar todos os pedidos com filtros e paginação")
 def list_orders(
+    response: Response,
     db: Session = Depends(get_db),
     status_filter: Optional[str] = Query(None, description="Filtrar pedidos por status (ex: pending, completed)"),
     client_id: Optional[int] = Query(None, description="Filtrar pedidos por ID do cliente"),
@@ -29,28 +63,49 @@ def list_orders(
     end_date: Optional[datetime] = Query(None, description="Filtrar pedidos até esta data (YYYY-MM-DDTHH:MM:SS)"),
     min_total_value: Optional[float] = Query(None, description="Filtrar pedidos com valor total mínimo"),
     max_total_value: Optional[float] = Query(None, description="Filtrar pedidos com valor total máximo"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor da resposta anterior)"),
     skip: int = Query(0, ge=0, description="Número de pedidos a pular (offset)"),
     limit: int = Query(10, ge=1, le=100, description="Número máximo de pedidos por página"),
     current_user: dict = Depends(admin_required) # Admin pode ver todos os pedidos
 ):
     query = db.query(DBOrder).options(joinedload(DBOrder.order_products).joinedload(DBOrderProduct.product))
+    query = _apply_order_filters(query, status_filter, client_id, start_date, end_date, min_total_value, max_total_value)
 
-    if status_filter:
-        query = query.filter(DBOrder.status == status_filter)
-    if client_id:
-        query = query.filter(DBOrder.client_id == client_id)
-    if start_date:
-        query = query.filter(DBOrder.order_date >= start_date)
-    if end_date:
-        query = query.filter(DBOrder.order_date <= end_date)
-    if min_total_value is not None:
-        query = query.filter(DBOrder.total_value >= min_total_value)
-    if max_total_value is not None:
-        query = query.filter(DBOrder.total_value <= max_total_value)
-
-    orders_from_db = query.offset(skip).limit(limit).all()
+    # Ordenado por id: order_date é sempre o horário de inserção (server_default), então a ordem é a mesma,
+    # e o id é comparável em todos os bancos (no SQLite o CURRENT_TIMESTAMP não tem o mesmo formato do bind)
+    orders_from_db = paginate(query, [DBOrder.id], cursor, skip, limit, response)
     return orders_from_db
 
+def _order_csv_rows(order: dict):
+    # Uma linha de CSV por item do pedido (pedidos sem itens geram uma linha com os campos do item vazios)
+    lines = order.pop("order_products") or [{}]
+    for line in lines:
+        yield {**order, **line}
+
+@router.get("/export", summary="Exportar pedidos em streaming (NDJSON ou CSV)")
+def export_orders(
+    db: Session = Depends(get_db),
+    fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format", description="Formato da exportação: ndjson ou csv"),
+    status_filter: Optional[str] = Query(None, description="Filtrar pedidos por status (ex: pending, completed)"),
+    client_id: Optional[int] = Query(None, description="Filtrar pedidos por ID do cliente"),
+    start_date: Optional[datetime] = Query(None, description="Filtrar pedidos a partir desta data (YYYY-MM-DDTHH:MM:SS)"),
+    end_date: Optional[datetime] = Query(None, description="Filtrar pedidos até esta data (YYYY-MM-DDTHH:MM:SS)"),
+    min_total_value: Optional[float] = Query(None, description="Filtrar pedidos com valor total mínimo"),
+    max_total_value: Optional[float] = Query(None, description="Filtrar pedidos com valor total máximo"),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Exporta todos os pedidos que atendem aos filtros, com seus itens, sem paginação.
+    Os itens são carregados por lote (selectinload) em vez de um JOIN por pedido.
+    """
+    query = db.query(DBOrder).options(selectinload(DBOrder.order_products))
+    query = _apply_order_filters(query, status_filter, client_id, start_date, end_date, min_total_value, max_total_value)
+    return stream_export(
+        db, query.order_by(DBOrder.id), Order, fmt, "orders",
+        csv_fields=[f for f in Order.model_fields if f != "order_products"] + list(OrderProductSchema.model_fields),
+        csv_flatten=_order_csv_rows,
+    )
+
 # Endpoint para usuários comuns verem seus próprios pedidos
 @router.get("/my_orders", response_model=List[Order], summary="Listar pedidos do usuário autenticado")
 def list_my_orders(
@@ -76,8 +131,23 @@ def list_my_orders(
 def create_order(
     order_data: OrderCreate, # Usa o modelo Pydantic para criação do pedido
     db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user) # Usuários logados podem criar pedidos
+    current_user: dict = Depends(get_current_user), # Usuários logados podem criar pedidos
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255, description="Chave para repetir a requisição sem criar outro pedido"),
 ):
+    claim = None
+    if idempotency_key:
+        # Retry de um pedido já criado: devolve a resposta guardada sem tocar no estoque
+        claim = claim_key(db, f"POST /orders/:{current_user['id']}", idempotency_key, request_hash(order_data))
+        if claim.replay is not None:
+            return claim.replay
+    try:
+        return _place_order(db, order_data, claim)
+    except Exception:
+        if claim is not None:
+            release_key(db, claim) # Falhou: um retry executa de novo
+        raise
+
+def _place_order(db: Session, order_data: OrderCreate, claim: Optional[IdempotencyClaim]) -> DBOrder:
     # 1. Verificar se o cliente existe
     db_client = db.query(DBClient).filter(DBClient.id == order_data.client_id).first()
     if not db_client:
@@ -93,7 +163,11 @@ def create_order(
     #     if not auth_client or auth_client.id != order_data.client_id:
     #         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Você não tem permissão para criar pedidos para este cliente.")
 
-    # 2. Criar o objeto Order
+    # 2. Reservar o estoque de todos os produtos de uma vez (uma consulta + um UPDATE condicional)
+    quantities = aggregate_quantities(order_data.products)
+    products = reserve_stock(db, quantities)
+
+    # 3. Criar o objeto Order
     db_order = DBOrder(
         client_id=order_data.client_id,
         notes=order_data.notes,
@@ -106,39 +180,34 @@ def create_order(
     total_order_value = 0.0
     order_products_to_add = []
 
-    # 3. Processar cada produto no pedido, validar estoque e criar OrderProduct
-    for item in order_data.products:
-        db_product = db.query(DBProduct).filter(DBProduct.id == item.product_id).first()
-        if not db_product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Produto com ID {item.product_id} não encontrado."
-            )
-        if db_product.current_stock < item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Estoque insuficiente para o produto '{db_product.description}'. Disponível: {db_product.current_stock}, Solicitado: {item.quantity}"
-            )
-
-        # Decrementar estoque
-        db_product.current_stock -= item.quantity
-        db.add(db_product) # Atualiza o produto no DB
-
-        # Cria o item do pedido
+    # 4. Criar um OrderProduct por produto (quantidades repetidas já foram somadas)
+    for product_id, quantity in quantities.items():
+        db_product = products[product_id]
         db_order_product = DBOrderProduct(
             order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
+            product_id=product_id,
+            quantity=quantity,
             price_at_order=db_product.sale_value # Registra o preço do produto no momento do pedido
         )
         order_products_to_add.append(db_order_product)
-        total_order_value += item.quantity * db_product.sale_value
+        total_order_value += quantity * db_product.sale_value
 
     db.add_all(order_products_to_add) # Adiciona todos os itens do pedido
+    record_movements(db, [
+        {"product_id": product_id, "delta": -quantity, "stock_after": products[product_id].current_stock, "order_id": db_order.id}
+        for product_id, quantity in quantities.items()
+    ], "order")
     db_order.total_value = total_order_value # Atualiza o valor total do pedido
     db.add(db_order) # Marca o pedido para ser salvo/atualizado
+    db.flush()
+    add_orders(db, [db_order.id]) # Agregados do cliente na mesma transação
+    record_order_changes(db, [db_order.id]) # Dia do pedido na fila dos rollups de vendas
+    if claim is not None:
+        db.refresh(db_order) # Defaults do servidor (order_date etc.), ainda dentro da transação
+        store_response(db, claim, status.HTTP_201_CREATED, Order.model_validate(db_order)) # Grava junto com o pedido
 
     db.commit()      # Salva todas as mudanças no banco de dados (pedido, itens de pedido, estoque de produtos)
+    product_cache.invalidate_coalesced(db) # current_stock mudou: respostas de produtos em cache ficaram velhas
     db.refresh(db_order) # Atualiza o objeto db_order com seus relacionamentos carregados
 
     # Carrega os produtos relacionados para o retorno (o joinedload inicial no GET já faz isso, mas aqui para POST)
@@ -148,6 +217,123 @@ def create_order(
 
     return db_order_final # Retorna o objeto Order completo
 
+def _ingest_order_chunk(db: Session, chunk: List[OrderCreate], offset: int) -> List[BulkOrderResult]:
+    """
+    Validates and inserts one chunk of orders with a fixed number of statements:
+    one query for clients, one for products, one conditional stock UPDATE and
+    two executemany INSERTs (orders and order lines). Commits once per chunk.
+    """
+    client_ids = {order.client_id for order in chunk}
+    product_ids = {item.product_id for order in chunk for item in order.products}
+
+    existing_clients = {row.id for row in db.query(DBClient.id).filter(DBClient.id.in_(client_ids))}
+    products = {
+        row.id: row for row in db.query(
+            DBProduct.id, DBProduct.description, DBProduct.sale_value, DBProduct.current_stock
+        ).filter(DBProduct.id.in_(product_ids))
+    }
+
+    # Estoque simulado em memória, consumido na ordem de chegada dos pedidos
+    remaining = {pid: product.current_stock for pid, product in products.items()}
+    results: List[BulkOrderResult] = []
+    accepted = []  # (resultado, pedido, quantidades)
+
+    for index, order in enumerate(chunk, start=offset):
+        if order.client_id not in existing_clients:
+            results.append(BulkOrderResult(index=index, success=False, error=f"Cliente com ID {order.client_id} não encontrado."))
+            continue
+
+        quantities = aggregate_quantities(order.products)
+        missing = sorted(pid for pid in quantities if pid not in products)
+        if missing:
+            results.append(BulkOrderResult(index=index, success=False, error=f"Produto(s) com ID {', '.join(map(str, missing))} não encontrado(s)."))
+            continue
+
+        shortages = [
+            f"'{products[pid].description}' (Disponível: {remaining[pid]}, Solicitado: {qty})"
+            for pid, qty in quantities.items() if remaining[pid] < qty
+        ]
+        if shortages:
+            results.append(BulkOrderResult(index=index, success=False, error=f"Estoque insuficiente para: {'; '.join(shortages)}"))
+            continue
+
+        for pid, qty in quantities.items():
+            remaining[pid] -= qty
+        result = BulkOrderResult(
+            index=index,
+            success=True,
+            total_value=sum(qty * products[pid].sale_value for pid, qty in quantities.items())
+        )
+        results.append(result)
+        accepted.append((result, order, quantities))
+
+    if not accepted:
+        return results
+
+    reserved = {pid: products[pid].current_stock - remaining[pid] for pid in remaining if remaining[pid] != products[pid].current_stock}
+    levels = decrement_stock(db, reserved)
+    if levels is None:
+        # Estoque alterado por outra transação durante o lote: nada deste lote é gravado
+        db.rollback()
+        for result, _, _ in accepted:
+            result.success = False
+            result.total_value = None
+            result.error = "Conflito de estoque ao reservar os produtos. Tente novamente."
+        return results
+
+    order_ids = db.scalars(
+        insert(DBOrder).returning(DBOrder.id, sort_by_parameter_order=True),
+        [
+            {"client_id": order.client_id, "notes": order.notes, "status": "pending", "total_value": result.total_value}
+            for result, order, _ in accepted
+        ]
+    ).all()
+
+    order_lines = []
+    for (result, _, quantities), order_id in zip(accepted, order_ids):
+        result.order_id = order_id
+        order_lines.extend(
+            {"order_id": order_id, "product_id": pid, "quantity": qty, "price_at_order": products[pid].sale_value}
+            for pid, qty in quantities.items()
+        )
+    if order_lines:
+        db.execute(insert(DBOrderProduct), order_lines)
+    add_orders(db, order_ids)
+    record_order_changes(db, order_ids)
+
+    # Uma movimentação por pedido e produto: o UPDATE devolveu o estoque final, então o
+    # estoque após cada pedido é o final somado ao que os pedidos seguintes do lote baixaram
+    movements = []
+    for (_, _, quantities), order_id in reversed(list(zip(accepted, order_ids))):
+        for pid, qty in quantities.items():
+            movements.append({"product_id": pid, "delta": -qty, "stock_after": levels[pid], "order_id": order_id})
+            levels[pid] += qty
+    movements.reverse()
+    record_movements(db, movements, "order")
+
+    db.commit()
+    product_cache.invalidate_coalesced(db)
+    return results
+
+@router.post("/bulk", response_model=BulkOrderResponse, summary="Criar pedidos em lote")
+def create_orders_bulk(
+    orders_data: List[OrderCreate],
+    chunk_size: int = Query(BULK_ORDER_CHUNK_SIZE, ge=1, le=5000, description="Quantidade de pedidos processados por transação"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Cria vários pedidos em uma única requisição, processando-os em lotes.
+    Cada pedido é validado individualmente e o resultado (sucesso ou erro) é
+    retornado na mesma posição da lista enviada.
+    """
+    results: List[BulkOrderResult] = []
+    for start in range(0, len(orders_data), chunk_size):
+        results.extend(_ingest_order_chunk(db, orders_data[start:start + chunk_size], start))
+
+    created = sum(1 for result in results if result.success)
+    return BulkOrderResponse(created=created, failed=len(results) - created, results=results)
+
 @router.get("/{order_id}", response_model=Order, summary="Obter detalhes de um pedido específico")
 def get_order_by_id(
     order_id: int,
@@ -169,6 +355,27 @@ def get_order_by_id(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pedido não encontrado ou você não tem permissão para acessá-lo.")
     return order
 
+def _cancel_order(db: Session, order_id: int) -> bool:
+    """
+    Marks the order as cancelled, returns its stock, takes it out of the
+    client's stats and queues its day for the sales rollups, in the caller's
+    transaction. The conditional UPDATE on the status guarantees the stock
+    is returned only once, even with concurrent cancellations. Returns
+    False if the order was already cancelled. Does not commit.
+    """
+    cancelled = db.execute(
+        update(DBOrder.__table__)
+        .where(DBOrder.id == order_id, DBOrder.status != "cancelled")
+        .values(status="cancelled")
+        .returning(DBOrder.client_id, DBOrder.total_value)
+    ).first()
+    if cancelled is None:
+        return False
+    restore_order_stock(db, order_id)
+    remove_order(db, cancelled.client_id, cancelled.total_value)
+    record_order_changes(db, [order_id])
+    return True
+
 @router.put("/{order_id}/status", response_model=Order, summary="Atualizar o status de um pedido")
 def update_order_status(
     order_id: int,
@@ -183,10 +390,25 @@ def update_order_status(
     # Opcional: Adicionar validação de status (ex: status_update.status in ["pending", "completed", "cancelled"])
     if status_update.status not in ["pending", "processing", "shipped", "delivered", "cancelled"]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Status inválido.")
+    if db_order.status == "cancelled" and status_update.status != "cancelled":
+        # O estoque já voltou para os produtos: reabrir exigiria reservar de novo
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pedido cancelado não pode mudar de status. Crie um novo pedido.")
 
-    db_order.status = status_update.status
-    db.add(db_order)
-    db.commit()
+    if status_update.status == "cancelled":
+        if _cancel_order(db, order_id):
+            db.commit()
+            product_cache.invalidate_coalesced(db) # current_stock mudou
+    else:
+        # Condicional: um cancelamento concorrente (estoque já devolvido) não é desfeito
+        changed = db.execute(
+            update(DBOrder.__table__)
+            .where(DBOrder.id == order_id, DBOrder.status != "cancelled")
+            .values(status=status_update.status)
+        ).rowcount
+        if not changed:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pedido cancelado não pode mudar de status. Crie um novo pedido.")
+        db.commit()
     db.refresh(db_order)
     
     # Carrega os produtos relacionados para o retorno
@@ -206,11 +428,12 @@ def delete_order(
     if not db_order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pedido não encontrado.")
 
-    # Importante: Se você tem `ondelete="CASCADE"` configurado no SQLAlchemy para `OrderProduct`
-    # na sua tabela `Order`, a exclusão dos itens do pedido será automática.
-    # Caso contrário, você precisaria excluir os DBOrderProduct associados manualmente primeiro:
-    # db.query(DBOrderProduct).filter(DBOrderProduct.order_id == order_id).delete()
-
-    db.delete(db_order)
+    # Sem cascade configurado entre Order e OrderProduct: itens, referências nos logs
+    # de WhatsApp e o pedido são apagados com um comando cada, sem carregar objetos
+    restored = _cancel_order(db, order_id) # Pedido ainda ativo: o estoque volta antes de apagar
+    db.execute(delete(DBOrderProduct.__table__).where(DBOrderProduct.order_id == order_id))
+    db.execute(update(DBWhatsAppLog.__table__).where(DBWhatsAppLog.order_id == order_id).values(order_id=None))
+    db.execute(delete(DBOrder.__table__).where(DBOrder.id == order_id))
     db.commit()
-    return {"message": f"Pedido {order_id} deletado."}
\ No newline at end of file
+    if restored:
+        product_cache.invalidate_coalesced(db)
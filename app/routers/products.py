@@ -1,52 +1,187 @@
 # app/routers/products.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, File, HTTPException, status, Query, Response, UploadFile
+from sqlalchemy import Numeric, case, cast, func, select, update
 from sqlalchemy.orm import Session
-from typing import Optional, List
-from datetime import date # Para data de validade
+from typing import Optional, List, Union
+from datetime import date, timedelta # Para data de validade
+import os
 from app.users import get_current_user, admin_required
 
 # Importe seus modelos SQLAlchemy e Pydantic
 from app.database import get_db
 from app.models import Product as DBProduct # Renomeie para evitar conflito com Pydantic Product
-from app.schemas import ProductCreate, ProductUpdate, Product # Seus modelos Pydantic
+from app.schemas import ProductCreate, ProductUpdate, Product, ProductImportResponse, BarcodeLookup, BarcodeLookupResponse # Seus modelos Pydantic
+from app.schemas import FacetCount, PriceBucket, ProductFacets, ProductListWithFacets
+from app.schemas import ProductBulkUpdate, ProductBulkUpdateResponse, StockAlerts, StockMovement
+from app.pagination import NEXT_CURSOR_HEADER, paginate
+from app.product_cache import normalize_filters, product_cache
+from app.barcode_index import lookup_barcodes
+from app.export import ExportFormat, stream_export, stream_rows
+from app.product_search import search_products
+from app.product_import import PRODUCT_IMPORT_BATCH_SIZE, ImportMode, InvalidImportFile, import_products
+from app.stock_ledger import EXPIRY_ALERT_DAYS, LOW_STOCK_THRESHOLD, expiring_products, low_stock_products, product_movements, record_initial_stock, record_movements
 
 # Importe suas dependências de autenticação
 
 router = APIRouter(tags=["Produtos"])
 
+# Limites das faixas do histograma de preços (?facets=true): "0,50,100" gera [0,50), [50,100) e [100, ∞)
+PRODUCT_PRICE_BUCKETS = [float(edge) for edge in os.getenv("PRODUCT_PRICE_BUCKETS", "0,50,100,200,500").split(",")]
+
 # Remova o dicionário em memória: products = {}
 
-@router.get("/", response_model=List[Product], summary="Listar todos os produtos com filtros")
+def _apply_product_filters(query, description, category, min_price, max_price, available):
+    """
+    Filtros comuns de list_products e export_products.
+    """
+    if description and description.strip():
+        # Mesmo termo usado na chave do cache (normalize_filters); minúsculo também cobre
+        # letras acentuadas, que o lower() do SQLite não converte
+        query = query.filter(DBProduct.description.ilike(f"%{description.strip().lower()}%"))
+    if category: # Se você tiver um campo 'category' no seu modelo DBProduct
+        query = query.filter(DBProduct.section == category) # Ajuste para o nome correto do campo
+    if min_price is not None:
+        query = query.filter(DBProduct.sale_value >= min_price)
+    if max_price is not None:
+        query = query.filter(DBProduct.sale_value <= max_price)
+    if available is not None:
+        if available:
+            query = query.filter(DBProduct.current_stock > 0)
+        else:
+            query = query.filter(DBProduct.current_stock <= 0) # Ou == 0, dependendo da sua regra
+    return query
+
+def _product_facets(db: Session, description, category, min_price, max_price, available) -> ProductFacets:
+    """
+    Contagens por seção, por disponibilidade e por faixa de preço dos produtos que
+    atendem aos filtros, em uma única consulta agrupada pelas três dimensões
+    (poucos grupos: seções x 2 x faixas); os totais de cada faceta saem da soma em Python.
+    """
+    edges = PRODUCT_PRICE_BUCKETS
+    bucket = case(*((DBProduct.sale_value < edge, index) for index, edge in enumerate(edges[1:])), else_=len(edges) - 1)
+    in_stock = case((DBProduct.current_stock > 0, 1), else_=0)
+    query = db.query(DBProduct.section, in_stock, bucket, func.count()).group_by(DBProduct.section, in_stock, bucket)
+    query = _apply_product_filters(query, description, category, min_price, max_price, available)
+
+    sections, stock, histogram = {}, [0, 0], [0] * len(edges)
+    for section, stocked, index, count in query:
+        sections[section] = sections.get(section, 0) + count
+        stock[stocked] += count
+        histogram[index] += count
+    return ProductFacets(
+        total=sum(stock),
+        sections=[FacetCount(value=section, count=count) for section, count in sorted(sections.items())],
+        in_stock=stock[1],
+        out_of_stock=stock[0],
+        price_histogram=[
+            PriceBucket(min=edge, max=edges[index + 1] if index + 1 < len(edges) else None, count=histogram[index])
+            for index, edge in enumerate(edges)
+        ],
+    )
+
+@router.get("/", response_model=Union[List[Product], ProductListWithFacets], summary="Listar todos os produtos com filtros")
 def list_products(
+    response: Response,
     db: Session = Depends(get_db),
     description: Optional[str] = Query(None, description="Filtrar produtos por descrição (parcial)"),
     category: Optional[str] = Query(None, description="Filtrar produtos por categoria"), # Ajuste para 'section' se for o caso
     min_price: Optional[float] = Query(None, ge=0, description="Filtrar produtos com preço mínimo"),
     max_price: Optional[float] = Query(None, ge=0, description="Filtrar produtos com preço máximo"),
     available: Optional[bool] = Query(None, description="Filtrar produtos por disponibilidade de estoque"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor da resposta anterior)"),
     skip: int = Query(0, ge=0, description="Número de produtos a pular (offset)"),
     limit: int = Query(10, ge=1, le=100, description="Número máximo de produtos por página"),
+    facets: bool = Query(False, description="Devolver {items, facets}: contagens por seção, estoque e faixa de preço para os filtros aplicados"),
     current_user: dict = Depends(admin_required)
 ):
-    query = db.query(DBProduct)
+    products = _list_products_page(db, response, description, category, min_price, max_price, available, cursor, skip, limit)
+    if not facets:
+        return products
 
-    if description:
-        query = query.filter(DBProduct.description.ilike(f"%{description}%"))
-    if category: # Se você tiver um campo 'category' no seu modelo DBProduct
-        query = query.filter(DBProduct.section == category) # Ajuste para o nome correto do campo
-    if min_price is not None:
-        query = query.filter(DBProduct.sale_value >= min_price)
-    if max_price is not None:
-        query = query.filter(DBProduct.sale_value <= max_price)
-    if available is not None:
-        if available:
-            query = query.filter(DBProduct.current_stock > 0)
-        else:
-            query = query.filter(DBProduct.current_stock <= 0) # Ou == 0, dependendo da sua regra
+    version = product_cache.sync(db)
+    key = ("facets", normalize_filters(description=description, category=category, min_price=min_price, max_price=max_price, available=available))
+    product_facets = product_cache.get(key)
+    if product_facets is None:
+        product_facets = _product_facets(db, description, category, min_price, max_price, available)
+        product_cache.put(key, product_facets, version)
+    return ProductListWithFacets(items=products, facets=product_facets)
+
+def _list_products_page(db, response, description, category, min_price, max_price, available, cursor, skip, limit) -> List[Product]:
+    # Página em cache: lista de produtos + o X-Next-Cursor que acompanhava a resposta
+    version = product_cache.sync(db)
+    key = ("list", normalize_filters(
+        description=description, category=category, min_price=min_price, max_price=max_price,
+        available=available, cursor=cursor, skip=skip, limit=limit,
+    ))
+    cached = product_cache.get(key)
+    if cached is not None:
+        products, next_cursor = cached
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return products
+
+    query = _apply_product_filters(db.query(DBProduct), description, category, min_price, max_price, available)
 
-    products_from_db = query.offset(skip).limit(limit).all()
-    return products_from_db
+    products_from_db = paginate(query, [DBProduct.id], cursor, skip, limit, response)
+    products = [Product.model_validate(p) for p in products_from_db]
+    product_cache.put(key, (products, response.headers.get(NEXT_CURSOR_HEADER)), version)
+    return products
+
+@router.get("/export", summary="Exportar produtos em streaming (NDJSON ou CSV)")
+def export_products(
+    db: Session = Depends(get_db),
+    fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format", description="Formato da exportação: ndjson ou csv"),
+    description: Optional[str] = Query(None, description="Filtrar produtos por descrição (parcial)"),
+    category: Optional[str] = Query(None, description="Filtrar produtos por categoria"),
+    min_price: Optional[float] = Query(None, ge=0, description="Filtrar produtos com preço mínimo"),
+    max_price: Optional[float] = Query(None, ge=0, description="Filtrar produtos com preço máximo"),
+    available: Optional[bool] = Query(None, description="Filtrar produtos por disponibilidade de estoque"),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Exporta todos os produtos que atendem aos filtros, sem paginação.
+    """
+    query = _apply_product_filters(db.query(DBProduct), description, category, min_price, max_price, available)
+    return stream_export(db, query.order_by(DBProduct.id), Product, fmt, "products")
+
+@router.get("/search", response_model=List[Product], summary="Buscar produtos por descrição")
+def search_products_endpoint(
+    db: Session = Depends(get_db),
+    q: str = Query(..., min_length=1, description="Palavras da descrição; acentos são ignorados e cada palavra vale como prefixo"),
+    category: Optional[str] = Query(None, description="Filtrar produtos por categoria"),
+    skip: int = Query(0, ge=0, description="Número de produtos a pular (offset)"),
+    limit: int = Query(10, ge=1, le=100, description="Número máximo de produtos por página"),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Busca textual ordenada por relevância (índice FTS5 no SQLite, tsvector/pg_trgm no Postgres).
+    """
+    return search_products(db, q, category, skip, limit)
+
+# Leitores de código de barras do ponto de venda: qualquer usuário autenticado
+@router.get("/barcode/{code}", response_model=Product, summary="Obter um produto pelo código de barras")
+def get_product_by_barcode(
+    code: str,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    found, _ = lookup_barcodes(db, [code])
+    if code not in found:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Produto não encontrado")
+    return found[code]
+
+@router.post("/barcode/lookup", response_model=BarcodeLookupResponse, summary="Obter vários produtos pelos códigos de barras")
+def lookup_products_by_barcode(
+    lookup: BarcodeLookup,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Resolve vários códigos de uma vez (ex.: o carrinho inteiro do caixa) com no máximo duas consultas ao banco.
+    """
+    found, missing = lookup_barcodes(db, lookup.barcodes)
+    return BarcodeLookupResponse(found=list(found.values()), missing=missing)
 
 @router.post("/", response_model=Product, status_code=status.HTTP_201_CREATED, summary="Criar um novo produto")
 def create_product(
@@ -76,21 +211,150 @@ def create_product(
     )
 
     db.add(db_product)
+    db.flush()
+    record_initial_stock(db, DBProduct.id == db_product.id)
     db.commit()
+    product_cache.invalidate(db)
     db.refresh(db_product)
 
     return db_product
 
+@router.post("/import", response_model=ProductImportResponse, summary="Importar produtos de um arquivo CSV")
+def import_products_csv(
+    file: UploadFile = File(..., description="CSV com cabeçalho: description, sale_value, barcode, section, initial_stock[, expiration_date, main_image_url]"),
+    mode: ImportMode = Query(ImportMode.insert, description="insert: código de barras existente é erro; upsert: atualiza o produto existente"),
+    batch_size: int = Query(PRODUCT_IMPORT_BATCH_SIZE, ge=1, le=20000, description="Linhas validadas e gravadas por transação"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Importa produtos em lote. Linhas inválidas não interrompem a importação:
+    são devolvidas no relatório com o número da linha e o motivo.
+    """
+    try:
+        report = import_products(db, file.file, mode, batch_size)
+    except InvalidImportFile as e:
+        db.rollback()
+        product_cache.invalidate(db) # Lotes anteriores ao erro já foram gravados
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Arquivo CSV inválido: {e}")
+    if report.created or report.updated:
+        product_cache.invalidate(db)
+    return report
+
+@router.patch("/bulk", response_model=ProductBulkUpdateResponse, summary="Alterar preço ou estoque de vários produtos")
+def bulk_update_products(
+    change: ProductBulkUpdate,
+    returning: Optional[ExportFormat] = Query(None, description="Devolver os produtos alterados em streaming (ndjson ou csv) em vez da contagem"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Aplica a operação a todos os produtos que atendem ao filtro com um único
+    UPDATE ... WHERE, em uma transação. O número de produtos alterados vai no
+    corpo (ou no header X-Updated-Count, quando os produtos são devolvidos).
+    """
+    selected = change.filter
+    conditions = []
+    if selected.section is not None:
+        conditions.append(DBProduct.section == selected.section)
+    if selected.ids is not None:
+        conditions.append(DBProduct.id.in_(selected.ids))
+    if selected.min_price is not None:
+        conditions.append(DBProduct.sale_value >= selected.min_price)
+    if selected.max_price is not None:
+        conditions.append(DBProduct.sale_value <= selected.max_price)
+    if not conditions: # Evita alterar o catálogo inteiro por engano
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe ao menos um filtro (section, ids, min_price ou max_price)")
+    if change.percent_change is not None and change.sale_value is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use percent_change ou sale_value, não os dois")
+
+    values = {}
+    if change.percent_change is not None:
+        # round(numeric, int): o Postgres não tem round para double precision
+        values["sale_value"] = func.round(cast(DBProduct.sale_value * (1 + change.percent_change / 100), Numeric), 2)
+    elif change.sale_value is not None:
+        values["sale_value"] = change.sale_value
+    if change.stock_delta is not None:
+        new_stock = DBProduct.current_stock + change.stock_delta
+        values["current_stock"] = case((new_stock < 0, 0), else_=new_stock)
+    if not values:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe uma operação (percent_change, sale_value ou stock_delta)")
+
+    statement = update(DBProduct.__table__).where(*conditions).values(values)
+    before = None
+    if change.stock_delta is not None:
+        # Estoque anterior (travado até o commit) para o razão: o ajuste real difere do pedido quando para em zero
+        before = dict(db.execute(select(DBProduct.id, DBProduct.current_stock).where(*conditions).with_for_update()).all())
+    if returning is not None:
+        rows = db.execute(statement.returning(*DBProduct.__table__.c)).all()
+        levels = {row.id: row.current_stock for row in rows}
+    elif before is not None:
+        rows = None
+        levels = dict(db.execute(statement.returning(DBProduct.id, DBProduct.current_stock)).all())
+    else:
+        rows = levels = None
+    updated = len(levels) if levels is not None else db.execute(statement).rowcount
+    if before is not None:
+        record_movements(db, [
+            {"product_id": product_id, "delta": stock - before[product_id], "stock_after": stock}
+            for product_id, stock in levels.items() if stock != before.get(product_id, stock)
+        ], "adjustment")
+    db.commit()
+    if updated:
+        product_cache.invalidate(db)
+
+    if rows is None:
+        return ProductBulkUpdateResponse(updated=updated)
+    streamed = stream_rows((Product.model_validate(row).model_dump(mode="json") for row in rows), Product, returning, "products")
+    streamed.headers["X-Updated-Count"] = str(updated)
+    return streamed
+
+@router.get("/alerts", response_model=StockAlerts, summary="Produtos com estoque baixo ou perto do vencimento")
+def stock_alerts(
+    db: Session = Depends(get_db),
+    expiring_within_days: int = Query(EXPIRY_ALERT_DAYS, ge=0, le=365, description="Janela de vencimento em dias (vencidos entram sempre)"),
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de produtos em cada lista"),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Estoque baixo vem do conjunto low_stock_products, mantido a cada movimentação
+    de estoque; vencimento, de uma busca por faixa no índice de expiration_date.
+    Nenhuma das duas listas varre a tabela de produtos.
+    """
+    expiring_until = date.today() + timedelta(days=expiring_within_days)
+    return StockAlerts(
+        low_stock_threshold=LOW_STOCK_THRESHOLD,
+        low_stock=low_stock_products(db, limit),
+        expiring_until=expiring_until,
+        expiring=expiring_products(db, expiring_within_days, limit),
+    )
+
+@router.get("/{product_id}/movements", response_model=List[StockMovement], summary="Histórico de estoque de um produto")
+def list_stock_movements(
+    product_id: int,
+    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=500, description="Máximo de movimentações, da mais recente para a mais antiga"),
+    current_user: dict = Depends(admin_required)
+):
+    return product_movements(db, product_id, limit)
+
 @router.get("/{product_id}", response_model=Product, summary="Obter informações de um produto específico")
 def get_product_by_id(
     product_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(admin_required)
 ):
+    version = product_cache.sync(db)
+    cached = product_cache.get(("id", product_id))
+    if cached is not None:
+        return cached
+
     product = db.query(DBProduct).filter(DBProduct.id == product_id).first()
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Produto não encontrado")
-    return product
+    result = Product.model_validate(product)
+    product_cache.put(("id", product_id), result, version)
+    return result
 
 @router.put("/{product_id}", response_model=Product, summary="Atualizar informações de um produto específico")
 def update_product(
@@ -99,12 +363,19 @@ def update_product(
     db: Session = Depends(get_db),
     current_user: dict = Depends(admin_required)
 ):
-    product = db.query(DBProduct).filter(DBProduct.id == product_id).first()
+    changes = updated_data.model_dump(exclude_unset=True)
+    query = db.query(DBProduct).filter(DBProduct.id == product_id)
+    if changes.get("current_stock") is not None:
+        query = query.with_for_update() # Contagem de inventário: o ajuste é calculado sobre o estoque travado
+    product = query.first()
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Produto não encontrado")
+    previous_stock = product.current_stock
 
     # Atualiza os campos do produto existente
-    for key, value in updated_data.model_dump(exclude_unset=True).items():
+    for key, value in changes.items():
+        if key == "current_stock" and value is None: # Coluna NOT NULL: nulo não altera o estoque
+            continue
         if key == "barcode" and value:
             existing_barcode_product = db.query(DBProduct).filter(DBProduct.barcode == value, DBProduct.id != product_id).first()
             if existing_barcode_product:
@@ -112,7 +383,11 @@ def update_product(
         setattr(product, key, value)
 
     db.add(product) # Opcional, SQLAlchemy rastreia mudanças no objeto
+    if product.current_stock != previous_stock:
+        db.flush()
+        record_movements(db, [{"product_id": product_id, "delta": product.current_stock - previous_stock, "stock_after": product.current_stock}], "adjustment")
     db.commit()
+    product_cache.invalidate(db)
     db.refresh(product)
 
     return product
@@ -129,5 +404,6 @@ def delete_product(
 
     db.delete(product)
     db.commit()
+    product_cache.invalidate(db)
     # Opcional: return Response(status_code=status.HTTP_204_NO_CONTENT) para um corpo vazio no 204
     return {"message": f"Produto {product_id} deletado."}
\ No newline at end of file
@@ -1,113 +1,167 @@
 # app/routers/whatsapp.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status, Query, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-import requests
-import sentry_sdk # Para log de erros
-import json # Para converter response_data para string
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import json
 from typing import Optional, List
 # Importe seus modelos SQLAlchemy e Pydantic
-from app.database import get_db
-from app.models import WhatsAppLog as DBWhatsAppLog
-from app.schemas import WhatsAppMessage, WhatsAppLog # Importe o schema para a mensagem e o log
-from app.users import get_current_user, admin_required
+from app.database import get_db, get_async_db
+from app.models import WhatsAppLog as DBWhatsAppLog, WhatsAppCampaign as DBWhatsAppCampaign
+from app.schemas import WhatsAppMessage, WhatsAppLog, WhatsAppBroadcast, WhatsAppCampaign # Importe o schema para a mensagem e o log
+from app.users import get_current_user, get_optional_user, admin_required
+from app.pagination import paginate
+from app.phone import normalize_phone, phone_prefix_range
+from app.whatsapp_outbox import STATUS_QUEUED, STATUS_SENDING, STATUS_SENT, STATUS_FAILED, outbox, utcnow
+from app.whatsapp_campaigns import CAMPAIGN_ENQUEUED, fan_out_campaign, validate_template
+from app.idempotency import claim_key_async, release_key_async, request_hash, store_response_async
 # Importe suas dependências de autenticação (se necessário proteger este endpoint) # Normalmente, apenas admins ou sistemas internos acionam isso
 
 router = APIRouter(tags=["Notificações WhatsApp"])
 
-# Lembre-se: TOKEN E ID DA INSTÂNCIA DEVEM VIR DE VARIÁVEIS DE AMBIENTE EM PRODUÇÃO!
-# Exemplo:
-# from decouple import config # pip install python-decouple
-# ZAPI_INSTANCE_ID = config("ZAPI_INSTANCE_ID")
-# ZAPI_TOKEN = config("ZAPI_TOKEN")
+# Credenciais, URL, timeouts e limites da Z-API ficam em app/zapi.py (variáveis de ambiente ZAPI_*);
+# o envio em si é feito pela fila de saída em app/whatsapp_outbox.py.
 
-# Por enquanto, vou usar o que você passou, mas COM ESTRESSE para que não use em produção assim.
-ZAPI_INSTANCE_ID = "3E1948F9F42F101A7F1D6260F2C0F8BD" # <<< ATENÇÃO: NUNCA HARDCODE ISSO EM PRODUÇÃO!
-ZAPI_TOKEN = "3A2716359C0548F1285A905E" # <<< ATENÇÃO: NUNCA HARDCODE ISSO EM PRODUÇÃO!
-ZAPI_BASE_URL = "https://api.z-api.io"
 
-
-@router.post("/send", response_model=WhatsAppLog, summary="Enviar uma mensagem de WhatsApp")
-def send_whatsapp_message(
+@router.post("/send", response_model=WhatsAppLog, status_code=status.HTTP_202_ACCEPTED, summary="Enfileirar uma mensagem de WhatsApp")
+async def send_whatsapp_message(
     message_data: WhatsAppMessage,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255, description="Chave para repetir a requisição sem enfileirar outra mensagem (exige autenticação)"),
+    current_user: Optional[dict] = Depends(get_optional_user),
     # current_user: dict = Depends(admin_required) # Proteja se apenas admins puderem acionar
 ):
     """
-    Envia uma mensagem de texto via Z-API e registra o evento em WhatsAppLog.
+    Registra a mensagem em WhatsAppLog com status "queued" e retorna 202.
+    O envio via Z-API (com retries) é feito pelos workers de app/whatsapp_outbox.py.
+    Com Idempotency-Key, um retry recebe o log original em vez de enfileirar de novo.
     """
-    log_status = "failed"
-    log_response_data = None
-    
-    try:
-        url = f"{ZAPI_BASE_URL}/instances/{ZAPI_INSTANCE_ID}/token/{ZAPI_TOKEN}/send-text"
-        payload = {
-            "phone": message_data.phone_number,
-            "message": message_data.message
-        }
-        
-        response = requests.post(url, json=payload)
-        response.raise_for_status() # Levanta um erro para status de resposta HTTP 4xx/5xx
-
-        log_status = "sent"
-        log_response_data = json.dumps(response.json()) # Armazena a resposta JSON como string
-
-        # Cria o log no banco de dados
-        db_log = DBWhatsAppLog(
-            phone_number=message_data.phone_number,
-            message=message_data.message,
-            status=log_status,
-            response_data=log_response_data
-            # order_id=... # Se você for associar a um pedido específico, passe o ID aqui
-        )
-        db.add(db_log)
-        db.commit()
-        db.refresh(db_log)
-
-        return db_log # Retorna o objeto WhatsAppLog do DB
-
-    except requests.RequestException as e:
-        # Captura erros de requisição HTTP (conexão, timeout, status 4xx/5xx)
-        sentry_sdk.capture_exception(e) # Envia para o Sentry
-        
-        log_status = "failed"
-        log_response_data = str(e) # Converte o erro para string para log
-        if hasattr(e, 'response') and e.response is not None:
-            log_response_data += f" | Response: {e.response.text}"
-
-        # Tenta registrar o erro no banco de dados
-        try:
-            db_log = DBWhatsAppLog(
-                phone_number=message_data.phone_number,
-                message=message_data.message,
-                status=log_status,
-                response_data=log_response_data
+    claim = None
+    if idempotency_key:
+        if current_user is None:
+            # As chaves são por usuário (como em POST /orders/): sem token, não há a quem atribuí-la
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Idempotency-Key exige autenticação.",
+                headers={"WWW-Authenticate": "Bearer"},
             )
-            db.add(db_log)
-            db.commit()
-            db.refresh(db_log)
-        except Exception as db_e:
-            sentry_sdk.capture_exception(db_e) # Loga se falhar ao salvar no DB
-            print(f"Erro ao salvar log de WhatsApp no DB: {db_e}") # Print para depuração imediata
+        claim = await claim_key_async(db, f"POST /whatsapp/send:{current_user['id']}", idempotency_key, request_hash(message_data))
+        if claim.replay is not None:
+            return claim.replay
+    db_log = DBWhatsAppLog(
+        phone_number=message_data.phone_number,
+        message=message_data.message,
+        status=STATUS_QUEUED,
+        next_attempt_at=utcnow(),
+        # order_id=... # Se você for associar a um pedido específico, passe o ID aqui
+    )
+    db.add(db_log)
+    try:
+        if claim is not None:
+            await db.flush()
+            await db.refresh(db_log) # sent_at do servidor, ainda dentro da transação
+            await store_response_async(db, claim, status.HTTP_202_ACCEPTED, WhatsAppLog.model_validate(db_log))
+        await db.commit()
+    except Exception:
+        if claim is not None:
+            await release_key_async(db, claim)
+        raise
+    await db.refresh(db_log)
+    outbox.notify() # Acorda um worker ocioso em vez de esperar o próximo ciclo de polling
+
+    return db_log # Retorna o objeto WhatsAppLog do DB
 
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao enviar mensagem WhatsApp")
+
+async def _campaign_status(db: AsyncSession, campaign: DBWhatsAppCampaign) -> WhatsAppCampaign:
+    result = WhatsAppCampaign.model_validate(campaign)
+    # Contagem por status servida pelo índice (campaign_id, status)
+    counts = await db.execute(
+        select(DBWhatsAppLog.status, func.count())
+        .where(DBWhatsAppLog.campaign_id == campaign.id)
+        .group_by(DBWhatsAppLog.status)
+    )
+    for log_status, count in counts:
+        if log_status in (STATUS_QUEUED, STATUS_SENDING, STATUS_SENT, STATUS_FAILED):
+            setattr(result, log_status, count)
+    result.completed = campaign.status == CAMPAIGN_ENQUEUED and result.queued == 0 and result.sending == 0
+    return result
+
+
+@router.post("/broadcast", response_model=WhatsAppCampaign, status_code=status.HTTP_202_ACCEPTED, summary="Enviar uma mensagem para vários clientes")
+async def broadcast_whatsapp_message(
+    broadcast: WhatsAppBroadcast,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(admin_required)
+):
+    """
+    Cria uma campanha para todos os clientes ativos com telefone que atendem ao filtro
+    e retorna 202. As mensagens são enfileiradas em segundo plano, em blocos; o
+    progresso fica em GET /whatsapp/broadcast/{campaign_id}.
+    """
+    try:
+        validate_template(broadcast.message)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Modelo de mensagem inválido: {e}")
+
+    filters = broadcast.model_dump(exclude={"message"}, exclude_none=True)
+    campaign = DBWhatsAppCampaign(
+        message_template=broadcast.message,
+        filters=json.dumps(filters),
+        created_by_user_id=current_user["id"],
+    )
+    db.add(campaign)
+    await db.commit()
+    await db.refresh(campaign)
+
+    # A expansão abre as próprias sessões no mesmo engine desta requisição
+    session_factory = async_sessionmaker(db.bind, autoflush=False, expire_on_commit=False)
+    background_tasks.add_task(fan_out_campaign, session_factory, campaign.id)
+    return await _campaign_status(db, campaign)
+
+
+@router.get("/broadcast/{campaign_id}", response_model=WhatsAppCampaign, summary="Progresso de uma campanha de WhatsApp")
+async def get_broadcast_status(
+    campaign_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(admin_required)
+):
+    campaign = await db.get(DBWhatsAppCampaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Campanha não encontrada")
+    return await _campaign_status(db, campaign)
 
 
 # Endpoint para listar logs de WhatsApp (protegido por admin)
 @router.get("/logs", response_model=List[WhatsAppLog], summary="Listar logs de envio de WhatsApp")
 def list_whatsapp_logs(
+    response: Response,
     db: Session = Depends(get_db),
-    phone_number: Optional[str] = Query(None, description="Filtrar por número de telefone"),
-    status_filter: Optional[str] = Query(None, description="Filtrar por status de envio (sent, failed)"),
+    phone_number: Optional[str] = Query(None, description="Filtrar por número de telefone (exato, após normalização para E.164)"),
+    phone_prefix: Optional[str] = Query(None, description="Filtrar por prefixo E.164, ex.: 5511 (país + DDD)"),
+    status_filter: Optional[str] = Query(None, description="Filtrar por status de envio (queued, sending, sent, failed)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor da resposta anterior)"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     current_user: dict = Depends(admin_required)
 ):
     query = db.query(DBWhatsAppLog)
     if phone_number:
-        query = query.filter(DBWhatsAppLog.phone_number.contains(phone_number))
+        try:
+            query = query.filter(DBWhatsAppLog.phone_number == normalize_phone(phone_number))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Telefone inválido")
+    if phone_prefix:
+        # Faixa [lower, upper) sobre o índice (phone_number, id) em vez de LIKE
+        lower, upper = phone_prefix_range(phone_prefix)
+        if not lower:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prefixo de telefone inválido")
+        query = query.filter(DBWhatsAppLog.phone_number >= lower)
+        if upper is not None:
+            query = query.filter(DBWhatsAppLog.phone_number < upper)
     if status_filter:
         query = query.filter(DBWhatsAppLog.status == status_filter)
 
-    logs = query.offset(skip).limit(limit).all()
+    logs = paginate(query, [DBWhatsAppLog.id], cursor, skip, limit, response)
     return logs
\ No newline at end of file
@@ -0,0 +1,274 @@
+# app/sales_rollup.py
+
+# --- Rollups diários de vendas (GET /analytics/sales) ---
+# Os relatórios de vendas por dia, seção e produto leem tabelas pré-agregadas
+# (sales_daily, sales_daily_sections, sales_daily_products e a soma mensal
+# sales_monthly_products) em vez de agregar orders e order_products, então não
+# disputam o banco com o checkout. Só contam pedidos não cancelados; o dia é o
+# de order_date no fuso do banco.
+#
+# As rotas de pedidos não tocam os rollups: gravam em sales_changes o dia de
+# cada pedido criado ou cancelado (a exclusão de um pedido ativo passa pelo
+# cancelamento), na mesma transação. O job incremental lê as mudanças acima da
+# marca d'água (rollup_watermarks), recalcula só esses dias (e os meses deles)
+# a partir dos pedidos, avança a marca e apaga as mudanças processadas.
+# Recalcular um dia inteiro é idempotente, então rodar de novo não duplica nada.
+#
+# O job roda em cada processo da API a cada SALES_ROLLUP_INTERVAL_SECONDS
+# (0 desliga); execuções concorrentes se serializam no lock da marca d'água.
+# Uso manual:
+#     python -m app.sales_rollup            (uma rodada incremental)
+#     python -m app.sales_rollup --rebuild  (recalcula todo o histórico)
+
+import asyncio
+import os
+import sys
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Set
+
+from sqlalchemy import delete, distinct, func, insert, literal, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.error_reporting import error_reporter
+from app.metrics import register_collector
+from app.models import (
+    Order as DBOrder,
+    OrderProduct as DBOrderProduct,
+    Product as DBProduct,
+    RollupWatermark,
+    SalesChange,
+    SalesDaily,
+    SalesDailyProduct,
+    SalesDailySection,
+    SalesMonthlyProduct,
+)
+
+SALES_ROLLUP_INTERVAL_SECONDS = float(os.getenv("SALES_ROLLUP_INTERVAL_SECONDS", "60"))
+
+WATERMARK_NAME = "sales"
+
+_orders = DBOrder.__table__
+_lines = DBOrderProduct.__table__
+_products = DBProduct.__table__
+_changes = SalesChange.__table__
+_daily = SalesDaily.__table__
+_sections = SalesDailySection.__table__
+_daily_products = SalesDailyProduct.__table__
+_monthly_products = SalesMonthlyProduct.__table__
+
+_order_day = func.date(_orders.c.order_date)
+_measures = ["order_count", "items_sold", "revenue"]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def record_order_changes(db: Session, order_ids: Iterable[int]) -> None:
+    """
+    Queues the days of the given orders for the next rollup refresh, with
+    one INSERT ... SELECT. Call it in the transaction that creates or cancels
+    the orders, after they are flushed. Does not commit.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    db.execute(insert(_changes).from_select(
+        ["day"], select(_order_day).where(_orders.c.id.in_(order_ids)).distinct()
+    ))
+
+
+def _sold_lines(days: Optional[Set[date]]):
+    # Itens de pedidos não cancelados, limitados aos dias pedidos (faixa em order_date para usar o índice)
+    stmt = (
+        select(_order_day.label("day"))
+        .select_from(_orders.join(_lines, _lines.c.order_id == _orders.c.id))
+        .where(_orders.c.status != "cancelled")
+    )
+    if days is not None:
+        stmt = stmt.where(
+            _orders.c.order_date >= datetime.combine(min(days), time.min),
+            _orders.c.order_date < datetime.combine(max(days) + timedelta(days=1), time.min),
+            _order_day.in_(days),
+        )
+    return stmt
+
+
+def _totals():
+    return (
+        func.count(distinct(_orders.c.id)),
+        func.sum(_lines.c.quantity),
+        func.sum(_lines.c.quantity * _lines.c.price_at_order),
+    )
+
+
+def _refresh_days(db: Session, days: Optional[Set[date]]) -> None:
+    """
+    Recomputes the daily rollups of `days` (every day when None) from orders
+    and order_products, then the monthly product rollup of their months.
+    """
+    for table in (_daily, _sections, _daily_products):
+        db.execute(delete(table) if days is None else delete(table).where(table.c.day.in_(days)))
+
+    db.execute(insert(_daily).from_select(
+        ["day", *_measures], _sold_lines(days).add_columns(*_totals()).group_by(_order_day)
+    ))
+    db.execute(insert(_sections).from_select(
+        ["day", "section", *_measures],
+        _sold_lines(days).add_columns(_products.c.section, *_totals())
+        .join(_products, _products.c.id == _lines.c.product_id)
+        .group_by(_order_day, _products.c.section),
+    ))
+    db.execute(insert(_daily_products).from_select(
+        ["day", "product_id", *_measures],
+        _sold_lines(days).add_columns(_lines.c.product_id, *_totals()).group_by(_order_day, _lines.c.product_id),
+    ))
+
+    if days is None:
+        db.execute(delete(_monthly_products))
+        days = set(db.scalars(select(_daily.c.day)))
+    # Um INSERT ... SELECT por mês (o mês é calculado aqui, igual nos dois bancos)
+    for month in sorted({month_start(day) for day in days}):
+        db.execute(delete(_monthly_products).where(_monthly_products.c.month == month))
+        db.execute(insert(_monthly_products).from_select(
+            ["month", "product_id", *_measures],
+            select(
+                literal(month, _monthly_products.c.month.type),
+                _daily_products.c.product_id,
+                func.sum(_daily_products.c.order_count),
+                func.sum(_daily_products.c.items_sold),
+                func.sum(_daily_products.c.revenue),
+            )
+            .where(_daily_products.c.day >= month, _daily_products.c.day < next_month(month))
+            .group_by(_daily_products.c.product_id),
+        ))
+
+
+def _lock_watermark(db: Session) -> RollupWatermark:
+    # Lock da linha: duas execuções (processos diferentes) não recalculam os mesmos dias ao mesmo tempo
+    watermark = db.get(RollupWatermark, WATERMARK_NAME, with_for_update=True)
+    if watermark is None:
+        watermark = RollupWatermark(name=WATERMARK_NAME, change_id=0)
+        db.add(watermark)
+    return watermark
+
+
+def refresh_sales_rollups(db: Session) -> int:
+    """
+    Incremental refresh: recomputes only the days queued in sales_changes
+    above the watermark, advances it and deletes the processed changes.
+    Returns the number of days recomputed. Commits.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Espera os checkouts que já gravaram em sales_changes: nenhum id até o máximo lido
+        # pode aparecer depois (sequências não seguem a ordem de commit). O lock dura só esta leitura.
+        db.execute(text("LOCK TABLE sales_changes IN EXCLUSIVE MODE"))
+    high = db.scalar(select(func.max(_changes.c.id)))
+    db.commit()
+
+    watermark = _lock_watermark(db)
+    days: Set[date] = set()
+    if high is not None and high > watermark.change_id:
+        days = set(db.scalars(
+            select(_changes.c.day).where(_changes.c.id > watermark.change_id, _changes.c.id <= high).distinct()
+        ))
+        if days:
+            _refresh_days(db, days)
+        watermark.change_id = high
+    db.execute(delete(_changes).where(_changes.c.id <= watermark.change_id))
+    watermark.refreshed_at = datetime.now(timezone.utc)
+    db.commit()
+    return len(days)
+
+
+def rebuild_sales_rollups(db: Session) -> int:
+    """
+    Recomputes every rollup from the whole order history (initial load or
+    after writing orders outside the API). Changes queued meanwhile stay for
+    the next incremental refresh. Returns the number of days. Commits.
+    """
+    watermark = _lock_watermark(db)
+    _refresh_days(db, None)
+    watermark.refreshed_at = datetime.now(timezone.utc)
+    days = db.scalar(select(func.count()).select_from(_daily))
+    db.commit()
+    return days
+
+
+class SalesRollupJob:
+    """
+    Periodic in-process incremental refresh of the sales rollups.
+    """
+
+    def __init__(self, interval: float = SALES_ROLLUP_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.days_refreshed = 0
+        self.errors = 0
+        self.last_run_seconds: Optional[float] = None
+
+    def start(self, session_factory: sessionmaker) -> None:
+        if self._task is not None or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop(session_factory), name="sales-rollup")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def _loop(self, session_factory: sessionmaker) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once, session_factory) # Sessão síncrona fora do event loop
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Banco indisponível etc.: as mudanças continuam na fila para a próxima rodada
+                error_reporter.capture(e)
+                with self._lock:
+                    self.errors += 1
+            await asyncio.sleep(self.interval)
+
+    def run_once(self, session_factory: sessionmaker) -> int:
+        started = datetime.now(timezone.utc)
+        with session_factory() as db:
+            days = refresh_sales_rollups(db)
+        with self._lock:
+            self.runs += 1
+            self.days_refreshed += days
+            self.last_run_seconds = (datetime.now(timezone.utc) - started).total_seconds()
+        return days
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self._task is not None,
+                "runs": self.runs,
+                "days_refreshed": self.days_refreshed,
+                "errors": self.errors,
+                "last_run_seconds": self.last_run_seconds,
+            }
+
+
+sales_rollup_job = SalesRollupJob()
+register_collector("sales_rollup", sales_rollup_job.stats)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        if "--rebuild" in sys.argv[1:]:
+            print(f"sales rollups: {rebuild_sales_rollups(session)} dia(s) recalculado(s)")
+        else:
+            print(f"sales rollups: {refresh_sales_rollups(session)} dia(s) atualizado(s)")
@@ -1,10 +1,12 @@
 # app/schemas.py
 
 from pydantic import BaseModel, EmailStr, Field
-from pydantic import ConfigDict
+from pydantic import ConfigDict, field_validator
 from typing import Optional, List
 from datetime import date, datetime # Importar date e datetime juntos
 
+from app.phone import normalize_phone
+
 # --- Schemas de Autenticação ---
 class UserCreate(BaseModel): 
     email: EmailStr = Field(..., description="E-mail do usuário")
@@ -96,6 +98,16 @@ class Client(ClientBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ClientOrderStats(BaseModel):
+    order_count: int = Field(..., description="Pedidos não cancelados")
+    lifetime_value: float = Field(..., description="Soma do valor total dos pedidos não cancelados")
+    last_order_date: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ClientWithStats(Client):
+    order_stats: Optional[ClientOrderStats] = Field(None, description="Agregados de pedidos; nulo se o cliente ainda não tem registro em client_order_stats")
+
 # --- Schemas de Produtos ---
 class ProductBase(BaseModel):
     description: str
@@ -131,12 +143,25 @@ class ProductCreate(BaseModel):
         }
     )
 
+class ProductImportError(BaseModel):
+    line: int = Field(..., description="Linha do CSV (contando o cabeçalho)")
+    barcode: Optional[str] = None
+    error: str
+
+class ProductImportResponse(BaseModel):
+    processed: int = Field(..., description="Linhas lidas do arquivo")
+    created: int
+    updated: int
+    failed: int
+    errors: List[ProductImportError] = Field(..., description="Uma entrada por linha rejeitada")
+
 class ProductUpdate(BaseModel):
     description: Optional[str] = None
     sale_value: Optional[float] = None
     barcode: Optional[str] = None
     section: Optional[str] = None
     initial_stock: Optional[int] = None
+    current_stock: Optional[int] = Field(None, ge=0, description="Estoque contado no inventário (registrado como ajuste no razão do estoque)")
     expiration_date: Optional[date] = None
     main_image_url: Optional[str] = None
 
@@ -150,10 +175,88 @@ class Product(ProductBase):
     model_config = ConfigDict(from_attributes=True)
         
 
+class ProductBulkFilter(BaseModel):
+    section: Optional[str] = Field(None, description="Seção dos produtos")
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=10000, description="IDs dos produtos (até 10000)")
+    min_price: Optional[float] = Field(None, ge=0, description="Preço mínimo (inclusivo)")
+    max_price: Optional[float] = Field(None, ge=0, description="Preço máximo (inclusivo)")
+
+class ProductBulkUpdate(BaseModel):
+    filter: ProductBulkFilter
+    percent_change: Optional[float] = Field(None, gt=-100, description="Variação percentual do preço (ex.: -15 para 15% de desconto)")
+    sale_value: Optional[float] = Field(None, ge=0, description="Novo preço absoluto")
+    stock_delta: Optional[int] = Field(None, description="Quantidade somada ao estoque atual (negativa para baixar; o estoque não fica abaixo de zero)")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {"filter": {"section": "Moda Praia"}, "percent_change": -20},
+                {"filter": {"ids": [1, 2, 3]}, "stock_delta": 10},
+            ]
+        }
+    )
+
+class ProductBulkUpdateResponse(BaseModel):
+    updated: int = Field(..., description="Produtos alterados")
+
+class StockAlert(BaseModel):
+    id: int
+    description: str
+    barcode: Optional[str] = None
+    section: str
+    current_stock: int
+    expiration_date: Optional[date] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class StockAlerts(BaseModel):
+    low_stock_threshold: int
+    low_stock: List[StockAlert] = Field(..., description="Produtos com estoque atual até o limite, do menor estoque para o maior")
+    expiring_until: date
+    expiring: List[StockAlert] = Field(..., description="Produtos em estoque que vencem até expiring_until (vencidos inclusos), do vencimento mais próximo")
+
+class StockMovement(BaseModel):
+    id: int
+    product_id: int
+    delta: int
+    stock_after: int
+    reason: str
+    order_id: Optional[int] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float = Field(..., description="Preço mínimo da faixa (inclusivo)")
+    max: Optional[float] = Field(None, description="Preço máximo da faixa (exclusivo); nulo na última faixa")
+    count: int
+
+class ProductFacets(BaseModel):
+    total: int = Field(..., description="Produtos que atendem aos filtros (todas as páginas)")
+    sections: List[FacetCount]
+    in_stock: int
+    out_of_stock: int
+    price_histogram: List[PriceBucket]
+
+class ProductListWithFacets(BaseModel):
+    items: List[Product]
+    facets: ProductFacets
+
+class BarcodeLookup(BaseModel):
+    barcodes: List[str] = Field(..., min_length=1, max_length=1000, description="Códigos de barras a consultar (até 1000)")
+
+class BarcodeLookupResponse(BaseModel):
+    found: List[Product] = Field(..., description="Produtos encontrados, na ordem dos códigos enviados")
+    missing: List[str] = Field(..., description="Códigos sem produto cadastrado")
+
 # --- Schemas de Pedidos ---
 class OrderProductCreate(BaseModel):
     product_id: int = Field(..., description="ID do produto")
-    quantity: int = Field(..., description="Quantidade do produto")
+    quantity: int = Field(..., gt=0, description="Quantidade do produto")
 
 class OrderCreate(BaseModel):
     client_id: int = Field(..., description="ID do cliente")
@@ -200,11 +303,28 @@ class Order(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class BulkOrderResult(BaseModel):
+    index: int = Field(..., description="Posição do pedido na lista enviada")
+    success: bool
+    order_id: Optional[int] = None
+    total_value: Optional[float] = None
+    error: Optional[str] = None
+
+class BulkOrderResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkOrderResult]
+
 # --- Schemas de WhatsApp ---
 class WhatsAppMessage(BaseModel):
-    phone_number: str = Field(..., description="Número do cliente no WhatsApp (com DDD)")
+    phone_number: str = Field(..., description="Número do cliente no WhatsApp (com DDD); gravado em E.164")
     message: str = Field(..., description="Mensagem a ser enviada")
 
+    @field_validator("phone_number")
+    @classmethod
+    def normalize_phone_number(cls, value: str) -> str:
+        return normalize_phone(value)
+
     model_config = ConfigDict(
         json_schema_extra={
             "examples": [
@@ -224,5 +344,55 @@ class WhatsAppLog(BaseModel):
     sent_at: datetime
     response_data: Optional[str] = None
     order_id: Optional[int] = None # FK para Order, se o log estiver associado a um pedido
+    campaign_id: Optional[int] = None # Campanha (POST /whatsapp/broadcast) que gerou a mensagem
+
+    model_config = ConfigDict(from_attributes=True)
+
+class WhatsAppBroadcast(BaseModel):
+    message: str = Field(..., description="Modelo da mensagem; aceita {nome}, {email} e {phone_number}")
+    section: Optional[str] = Field(None, description="Somente clientes que já compraram produtos desta seção")
+    nome: Optional[str] = Field(None, description="Filtrar clientes por nome (contém)")
+    email: Optional[str] = Field(None, description="Filtrar clientes por e-mail (contém)")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "message": "Olá {nome}, chegou a nova coleção de verão!",
+                    "section": "Moda Praia"
+                }
+            ]
+        }
+    )
+
+class WhatsAppCampaign(BaseModel):
+    id: int
+    message_template: str
+    status: str = Field(..., description="enqueuing, enqueued ou failed (gravação das mensagens na fila)")
+    enqueued: int = Field(..., description="Mensagens já gravadas na fila")
+    queued: int = 0
+    sending: int = 0
+    sent: int = 0
+    failed: int = 0
+    completed: bool = Field(False, description="Todas as mensagens foram enfileiradas e processadas")
+    error: Optional[str] = None
+    created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+# --- Schemas de Análises ---
+class SalesRow(BaseModel):
+    day: Optional[date] = None
+    section: Optional[str] = None
+    product_id: Optional[int] = None
+    description: Optional[str] = None
+    order_count: int = Field(..., description="Pedidos não cancelados com itens do grupo")
+    items_sold: int
+    revenue: float
+
+class SalesReport(BaseModel):
+    group_by: str
+    start_date: date
+    end_date: date
+    refreshed_at: Optional[datetime] = Field(None, description="Última atualização dos rollups; pedidos posteriores ainda não aparecem")
+    rows: List[SalesRow]
@@ -0,0 +1,127 @@
+# app/stock.py
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, insert, literal, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, Iterable, List, Optional
+
+from app.models import OrderProduct as DBOrderProduct, Product as DBProduct, StockMovement
+from app.schemas import OrderProductCreate
+from app.stock_ledger import sync_low_stock
+
+
+def aggregate_quantities(items: Iterable[OrderProductCreate]) -> Dict[int, int]:
+    """
+    Sums the requested quantity per product_id (an order may repeat a product).
+    """
+    quantities: Dict[int, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def _shortage_message(products: Dict[int, DBProduct], quantities: Dict[int, int]) -> List[str]:
+    return [
+        f"'{products[pid].description}' (Disponível: {products[pid].current_stock}, Solicitado: {qty})"
+        for pid, qty in quantities.items()
+        if products[pid].current_stock < qty
+    ]
+
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> Dict[int, DBProduct]:
+    """
+    Reserves stock for every product of an order.
+
+    Loads all products in a single IN (...) query, reports every missing product
+    or shortage at once and decrements stock with one conditional UPDATE
+    (current_stock >= qty), so concurrent orders can never oversell a product.
+    Returns the loaded products keyed by id, with current_stock already
+    reflecting the reservation. Does not commit.
+    """
+    if not quantities:
+        return {}
+
+    # 1. Uma única consulta para todos os produtos do pedido
+    products = {
+        p.id: p for p in db.query(DBProduct).filter(DBProduct.id.in_(quantities.keys())).all()
+    }
+
+    missing = sorted(pid for pid in quantities if pid not in products)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Produto(s) com ID {', '.join(map(str, missing))} não encontrado(s)."
+        )
+
+    shortages = _shortage_message(products, quantities)
+    if shortages:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Estoque insuficiente para: {'; '.join(shortages)}"
+        )
+
+    # 2. Decremento atômico: só afeta as linhas que ainda têm estoque suficiente
+    levels = decrement_stock(db, quantities)
+    if levels is None:
+        # Outro pedido consumiu o estoque entre a leitura e o UPDATE: desfaz e relata o estado atual
+        db.rollback()
+        current = {
+            p.id: p for p in db.query(DBProduct).filter(DBProduct.id.in_(quantities.keys())).all()
+        }
+        shortages = _shortage_message(current, quantities) if len(current) == len(quantities) else []
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Estoque insuficiente para: {'; '.join(shortages)}" if shortages
+            else "Conflito de estoque ao reservar os produtos. Tente novamente."
+        )
+
+    for product_id, product in products.items(): # Estoque devolvido pelo UPDATE, sem nova leitura
+        set_committed_value(product, "current_stock", levels[product_id])
+    return products
+
+
+def decrement_stock(db: Session, quantities: Dict[int, int]) -> Optional[Dict[int, int]]:
+    """
+    Decrements current_stock for all products in one conditional UPDATE and
+    returns the new stock per product id. Returns None (and changes nothing
+    the caller should keep) if any product no longer has enough stock; the
+    caller is expected to roll back.
+    """
+    if not quantities:
+        return {}
+    qty_expr = case(quantities, value=DBProduct.id)
+    rows = db.execute(
+        update(DBProduct)
+        .where(DBProduct.id.in_(quantities.keys()), DBProduct.current_stock >= qty_expr)
+        .values(current_stock=DBProduct.current_stock - qty_expr)
+        .returning(DBProduct.id, DBProduct.current_stock)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(rows) != len(quantities):
+        return None
+    return dict(rows)
+
+
+def restore_order_stock(db: Session, order_id: int) -> int:
+    """
+    Returns the stock of every line of an order to products with a single
+    UPDATE ... FROM order_products, and writes the matching ledger rows with
+    one INSERT ... SELECT. Returns the number of products restored. Does not
+    commit; the caller must make sure the order is cancelled only once.
+    """
+    products, lines = DBProduct.__table__, DBOrderProduct.__table__
+    restored = db.execute(
+        update(products)
+        .where(products.c.id == lines.c.product_id, lines.c.order_id == order_id)
+        .values(current_stock=products.c.current_stock + lines.c.quantity)
+    ).rowcount
+    if restored:
+        db.execute(insert(StockMovement.__table__).from_select(
+            ["product_id", "delta", "stock_after", "reason", "order_id"],
+            select(lines.c.product_id, lines.c.quantity, products.c.current_stock, literal("order_cancel"), lines.c.order_id)
+            .join(products, products.c.id == lines.c.product_id)
+            .where(lines.c.order_id == order_id),
+        ))
+        sync_low_stock(db, DBProduct.id.in_(select(lines.c.product_id).where(lines.c.order_id == order_id)))
+    return restored
@@ -0,0 +1,125 @@
+# app/stock_ledger.py
+
+# --- Razão do estoque e alertas (GET /products/alerts) ---
+# Toda variação de current_stock feita pela API grava uma linha em
+# stock_movements na mesma transação. Na mesma hora, o conjunto
+# low_stock_products é refeito só para os produtos tocados, então o alerta de
+# estoque baixo lê um conjunto pequeno em vez de varrer products. O alerta de
+# vencimento depende da data de hoje, não das movimentações: é uma busca por
+# faixa no índice ix_products_expiration_date.
+#
+# As escritas sempre atualizam a linha do produto antes de chegar aqui; o lock
+# dessa linha serializa as transações que mexem no mesmo produto, e o DELETE +
+# INSERT em low_stock_products não disputa a chave primária.
+
+import os
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.models import LowStockProduct, Product as DBProduct, StockMovement
+
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "5"))
+EXPIRY_ALERT_DAYS = int(os.getenv("EXPIRY_ALERT_DAYS", "30"))
+
+_low_stock = LowStockProduct.__table__
+
+
+def sync_low_stock(db: Session, condition) -> None:
+    """
+    Recomputes low-stock membership for the products matching `condition`
+    (a filter on Product) with one DELETE and one INSERT ... SELECT.
+    """
+    touched = select(DBProduct.id).where(condition)
+    db.execute(delete(_low_stock).where(_low_stock.c.product_id.in_(touched)))
+    db.execute(insert(_low_stock).from_select(["product_id"], touched.where(DBProduct.current_stock <= LOW_STOCK_THRESHOLD)))
+
+
+def record_movements(db: Session, movements: List[dict], reason: str) -> None:
+    """
+    Appends ledger rows ({product_id, delta, stock_after, order_id}) and
+    refreshes the low-stock set for the products involved. Does not commit.
+    """
+    if not movements:
+        return
+    db.execute(insert(StockMovement.__table__), [
+        {"product_id": m["product_id"], "delta": m["delta"], "stock_after": m["stock_after"], "reason": reason, "order_id": m.get("order_id")}
+        for m in movements
+    ])
+    sync_low_stock(db, DBProduct.id.in_({m["product_id"] for m in movements}))
+
+
+def record_initial_stock(db: Session, condition) -> None:
+    """
+    Ledger entry for newly created products (their whole current stock),
+    written set-based from the products matching `condition`. Does not commit.
+    """
+    db.execute(insert(StockMovement.__table__).from_select(
+        ["product_id", "delta", "stock_after", "reason"],
+        select(DBProduct.id, DBProduct.current_stock, DBProduct.current_stock, literal("initial")).where(condition),
+    ))
+    sync_low_stock(db, condition)
+
+
+def rebuild_low_stock(db: Session) -> int:
+    """
+    Rebuilds the whole low-stock set (after changing LOW_STOCK_THRESHOLD or
+    writing stock outside the API). Returns the set size. Commits.
+    """
+    db.execute(delete(_low_stock))
+    result = db.execute(insert(_low_stock).from_select(
+        ["product_id"], select(DBProduct.id).where(DBProduct.current_stock <= LOW_STOCK_THRESHOLD)
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def low_stock_products(db: Session, limit: int) -> List[DBProduct]:
+    """
+    Products in the low-stock set, lowest stock first.
+    """
+    # IN (subconsulta) em vez de JOIN: o conjunto pequeno é lido primeiro e os produtos buscados pela PK
+    return (
+        db.query(DBProduct)
+        .filter(DBProduct.id.in_(select(_low_stock.c.product_id)))
+        .order_by(DBProduct.current_stock, DBProduct.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def expiring_products(db: Session, within_days: int, limit: int, today: Optional[date] = None) -> List[DBProduct]:
+    """
+    Products still in stock whose expiration date falls within `within_days`
+    (already expired included), soonest first.
+    """
+    horizon = (today or date.today()) + timedelta(days=within_days)
+    return (
+        db.query(DBProduct)
+        .filter(DBProduct.expiration_date.is_not(None), DBProduct.expiration_date <= horizon, DBProduct.current_stock > 0)
+        .order_by(DBProduct.expiration_date, DBProduct.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def product_movements(db: Session, product_id: int, limit: int) -> List[StockMovement]:
+    """
+    Latest ledger rows of a product, newest first.
+    """
+    return (
+        db.query(StockMovement)
+        .filter(StockMovement.product_id == product_id)
+        .order_by(StockMovement.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"low_stock_products: {rebuild_low_stock(session)} produtos com estoque <= {LOW_STOCK_THRESHOLD}")
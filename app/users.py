@@ -2,14 +2,132 @@
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import hashlib
+import os
+import threading
+import time
+from app.database import get_async_sessionmaker
 from app.models import User as DBUser
 from app.auth import verificar_token # Importa a função de verificação de token
+from app.metrics import register_collector
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+# Para rotas abertas que usam o usuário quando há token (ex.: escopo da Idempotency-Key)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# --- Cache de usuários autenticados ---
+# Tamanho máximo (0 desativa o cache) e tempo máximo que uma entrada pode viver,
+# mesmo que o token expire depois disso.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+
+class PrincipalCache:
+    """
+    In-process LRU cache of authenticated principals keyed by the SHA-256 of the
+    token. Each entry expires at the earlier of the token's `exp` and the
+    configured TTL, and can be dropped for a user via invalidate_email().
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._keys_by_email: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key: str, principal: dict, token_exp: Optional[float]) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (dict(principal), expires_at)
+            self._keys_by_email.setdefault(principal["email"], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_email(self, email: str) -> None:
+        with self._lock:
+            for key in list(self._keys_by_email.get(email, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_email.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: str) -> None:
+        principal, _ = self._entries.pop(key)
+        keys = self._keys_by_email.get(principal["email"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_email[principal["email"]]
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+register_collector("principal_cache", principal_cache.stats)
+
+
+# Qualquer alteração ou exclusão de usuário via ORM derruba as entradas em cache desse usuário
+# (pelo e-mail antigo e pelo novo, caso o e-mail tenha mudado).
+@event.listens_for(DBUser, "after_update")
+@event.listens_for(DBUser, "after_delete")
+def _invalidate_cached_principal(mapper, connection, target):
+    previous_emails = inspect(target).attrs.email.history.deleted or ()
+    for email in {target.email, *previous_emails}:
+        if email:
+            principal_cache.invalidate_email(email)
+
+
+# Dependência async def: usa a sessão assíncrona para não bloquear o event loop em cada requisição autenticada.
+# Um acerto no cache não abre sessão; numa falta, a sessão é curta e devolve a conexão ao pool antes
+# de a rota rodar, então rotas síncronas (get_db) não seguram uma conexão de cada pool ao mesmo tempo.
+async def get_current_user(token: str = Depends(oauth2_scheme), session_factory: async_sessionmaker = Depends(get_async_sessionmaker)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -21,11 +139,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     email: str = payload.get("sub")
     if email is None:
         raise credentials_exception
-    user = db.query(DBUser).filter(DBUser.email == email).first()
-    if user is None:
+
+    cache_key = principal_cache.key_for(token)
+    principal = principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
+
+    async with session_factory() as db:
+        result = await db.execute(select(DBUser).where(DBUser.email == email))
+        user = result.scalars().first()
+    if user is None or user.is_active is False:
         raise credentials_exception
     # Retorna um dicionário com informações do usuário, incluindo se é admin
-    return {"email": user.email, "is_admin": user.is_admin, "id": user.id}
+    principal = {"email": user.email, "is_admin": user.is_admin, "id": user.id}
+    principal_cache.put(cache_key, principal, payload.get("exp"))
+    return principal
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), session_factory: async_sessionmaker = Depends(get_async_sessionmaker)):
+    """
+    Principal of the request, or None when no token was sent (an invalid token still gets 401).
+    """
+    if token is None:
+        return None
+    return await get_current_user(token, session_factory)
 
 async def admin_required(current_user: dict = Depends(get_current_user)):
     if not current_user.get("is_admin"):
@@ -33,4 +169,4 @@ async def admin_required(current_user: dict = Depends(get_current_user)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Operation requires administrator privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
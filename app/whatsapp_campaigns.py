@@ -0,0 +1,173 @@
+# app/whatsapp_campaigns.py
+
+# --- Campanhas de WhatsApp (POST /whatsapp/broadcast) ---
+# A requisição só valida o modelo e cria a campanha; a expansão para os
+# destinatários roda em segundo plano: os clientes são lidos em blocos (keyset por
+# id) e cada bloco vira um único INSERT em lote na fila de saída
+# (app/whatsapp_outbox.py) mais um commit. O ritmo de envio é o dos workers da
+# fila, limitado pelo token bucket do cliente Z-API (ZAPI_RATE_LIMIT_PER_SECOND).
+#
+# Cada bloco grava as mensagens e a posição do keyset (last_client_id) na mesma
+# transação. Se o processo reinicia no meio, a campanha continua "enqueuing" e é
+# retomada no startup a partir dessa posição (BROADCAST_RESUME_ON_STARTUP, 0
+# desliga), sem reenviar a quem já estava na fila. O avanço da posição é
+# condicional à posição lida, então duas execuções da mesma campanha (ex.: a
+# original ainda viva e a retomada por outro processo) não gravam o mesmo bloco:
+# a que perde desfaz o bloco e para.
+
+import asyncio
+import json
+import os
+import string
+from typing import Any, Dict, Optional
+
+from sqlalchemy import exists, insert, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.error_reporting import error_reporter
+from app.models import Client as DBClient, Order as DBOrder, OrderProduct as DBOrderProduct, Product as DBProduct
+from app.models import WhatsAppCampaign as DBWhatsAppCampaign, WhatsAppLog as DBWhatsAppLog
+from app.phone import normalize_phone
+from app.whatsapp_outbox import STATUS_QUEUED, outbox, utcnow
+
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "1000"))
+BROADCAST_RESUME_ON_STARTUP = os.getenv("BROADCAST_RESUME_ON_STARTUP", "1") != "0"
+
+TEMPLATE_FIELDS = ("nome", "email", "phone_number")
+
+CAMPAIGN_ENQUEUING = "enqueuing"
+CAMPAIGN_ENQUEUED = "enqueued"
+CAMPAIGN_FAILED = "failed"
+
+
+def validate_template(template: str) -> None:
+    """
+    Raises ValueError unless every placeholder is one of TEMPLATE_FIELDS
+    (no positional, attribute or index lookups), with no conversion or
+    format spec.
+    """
+    for _, field, spec, conversion in string.Formatter().parse(template):
+        if field is None:
+            continue
+        if field not in TEMPLATE_FIELDS:
+            raise ValueError(f"campo '{{{field}}}' não suportado; use {', '.join('{' + f + '}' for f in TEMPLATE_FIELDS)}")
+        if spec or conversion:
+            # Ex.: {nome:>99999999} geraria uma mensagem gigante por destinatário
+            raise ValueError(f"campo '{{{field}}}' não aceita conversão nem formatação; use apenas {{{field}}}")
+
+
+def recipients_stmt(filters: Dict[str, Any]):
+    """
+    Active clients with a phone number matching the campaign filters, as
+    (id, nome, email, phone_number) rows.
+    """
+    stmt = select(DBClient.id, DBClient.nome, DBClient.email, DBClient.phone_number).where(
+        DBClient.is_active.is_(True),
+        DBClient.phone_number.is_not(None),
+        DBClient.phone_number != "",
+    )
+    if filters.get("nome"):
+        stmt = stmt.where(DBClient.nome.ilike(f"%{filters['nome']}%"))
+    if filters.get("email"):
+        stmt = stmt.where(DBClient.email.ilike(f"%{filters['email']}%"))
+    if filters.get("section"):
+        # Compradores da seção: ao menos um pedido com um produto dela
+        stmt = stmt.where(
+            exists()
+            .where(DBOrder.client_id == DBClient.id)
+            .where(DBOrderProduct.order_id == DBOrder.id)
+            .where(DBProduct.id == DBOrderProduct.product_id)
+            .where(DBProduct.section == filters["section"])
+        )
+    return stmt
+
+
+async def fan_out_campaign(session_factory: async_sessionmaker, campaign_id: int, chunk_size: Optional[int] = None) -> None:
+    """
+    Streams the campaign's recipients in chunks, starting after its saved
+    keyset position, and enqueues one message per recipient. Each chunk
+    commits together with the new position, so a restarted campaign resumes
+    without enqueuing anyone twice.
+    """
+    chunk_size = chunk_size or BROADCAST_CHUNK_SIZE
+    try:
+        async with session_factory() as db:
+            campaign = await db.get(DBWhatsAppCampaign, campaign_id)
+            if campaign is None or campaign.status != CAMPAIGN_ENQUEUING:
+                return
+            filters = json.loads(campaign.filters or "{}")
+            base = recipients_stmt(filters).order_by(DBClient.id).limit(chunk_size)
+            last_id = campaign.last_client_id
+            enqueued = campaign.enqueued
+            while True:
+                rows = (await db.execute(base.where(DBClient.id > last_id))).all()
+                if not rows:
+                    break
+                now = utcnow()
+                messages = []
+                for row in rows:
+                    try:
+                        phone = normalize_phone(row.phone_number)
+                    except ValueError:
+                        continue # Telefone de cadastro inválido: não há para onde enviar
+                    messages.append({
+                        "phone_number": phone,
+                        "message": campaign.message_template.format_map(row._mapping),
+                        "status": STATUS_QUEUED,
+                        "next_attempt_at": now,
+                        "campaign_id": campaign_id,
+                    })
+                # Posição primeiro (trava a linha da campanha), mensagens depois, um commit para os dois
+                advanced = (await db.execute(
+                    update(DBWhatsAppCampaign)
+                    .where(
+                        DBWhatsAppCampaign.id == campaign_id,
+                        DBWhatsAppCampaign.status == CAMPAIGN_ENQUEUING,
+                        DBWhatsAppCampaign.last_client_id == last_id,
+                    )
+                    .values(enqueued=enqueued + len(messages), last_client_id=rows[-1].id)
+                )).rowcount
+                if not advanced:
+                    await db.rollback() # Outra execução já gravou este bloco
+                    return
+                if messages:
+                    await db.execute(insert(DBWhatsAppLog), messages)
+                await db.commit()
+                enqueued += len(messages)
+                outbox.notify()
+                last_id = rows[-1].id
+            await db.execute(
+                update(DBWhatsAppCampaign)
+                .where(DBWhatsAppCampaign.id == campaign_id, DBWhatsAppCampaign.last_client_id == last_id)
+                .values(status=CAMPAIGN_ENQUEUED)
+            )
+            await db.commit()
+    except Exception as e:
+        error_reporter.capture(e) # Envia para o Sentry (deduplicado e amostrado)
+        async with session_factory() as db:
+            await db.execute(
+                update(DBWhatsAppCampaign)
+                .where(DBWhatsAppCampaign.id == campaign_id)
+                .values(status=CAMPAIGN_FAILED, error=str(e))
+            )
+            await db.commit()
+
+
+async def resume_campaigns(session_factory: async_sessionmaker) -> int:
+    """
+    Resumes every campaign left "enqueuing" (e.g. by a restart during the
+    fan-out) from its saved position. Returns how many were resumed.
+    """
+    try:
+        async with session_factory() as db:
+            campaign_ids = list(await db.scalars(
+                select(DBWhatsAppCampaign.id).where(DBWhatsAppCampaign.status == CAMPAIGN_ENQUEUING).order_by(DBWhatsAppCampaign.id)
+            ))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e: # Banco indisponível no startup: as campanhas esperam o próximo
+        error_reporter.capture(e)
+        return 0
+    for campaign_id in campaign_ids:
+        await fan_out_campaign(session_factory, campaign_id)
+    return len(campaign_ids)
@@ -0,0 +1,289 @@
+# app/whatsapp_outbox.py
+
+# --- Fila de saída (outbox) de mensagens WhatsApp ---
+# POST /whatsapp/send só grava a mensagem em whatsapp_logs com status "queued";
+# um pool de workers asyncio drena a tabela:
+#   queued -> sending (claim) -> sent | queued (retry com backoff) | failed
+# O claim é um único UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+# RETURNING, então várias instâncias da API podem drenar a mesma tabela sem
+# enviar a mesma mensagem duas vezes. Uma mensagem em "sending" cujo lease expirou
+# (worker morreu no meio do envio) volta a ser elegível. Com o circuit breaker
+# do cliente Z-API aberto, os workers não reivindicam mensagens, e as que já
+# estavam em mãos voltam para a fila sem gastar uma tentativa.
+#
+# Configuração: WHATSAPP_WORKERS (0 desliga os workers neste processo),
+# WHATSAPP_CLAIM_BATCH, WHATSAPP_MAX_ATTEMPTS, WHATSAPP_BACKOFF_BASE_SECONDS,
+# WHATSAPP_BACKOFF_MAX_SECONDS, WHATSAPP_LEASE_SECONDS, WHATSAPP_POLL_INTERVAL_SECONDS.
+
+import asyncio
+import json
+import os
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.error_reporting import error_reporter
+from app.metrics import register_collector
+from app.models import WhatsAppLog as DBWhatsAppLog
+from app.zapi import ZAPIClient, ZAPIUnavailable
+
+WHATSAPP_WORKERS = int(os.getenv("WHATSAPP_WORKERS", "2"))
+WHATSAPP_CLAIM_BATCH = int(os.getenv("WHATSAPP_CLAIM_BATCH", "10"))
+WHATSAPP_MAX_ATTEMPTS = int(os.getenv("WHATSAPP_MAX_ATTEMPTS", "5"))
+WHATSAPP_BACKOFF_BASE_SECONDS = float(os.getenv("WHATSAPP_BACKOFF_BASE_SECONDS", "2"))
+WHATSAPP_BACKOFF_MAX_SECONDS = float(os.getenv("WHATSAPP_BACKOFF_MAX_SECONDS", "300"))
+WHATSAPP_LEASE_SECONDS = float(os.getenv("WHATSAPP_LEASE_SECONDS", "60"))
+WHATSAPP_POLL_INTERVAL_SECONDS = float(os.getenv("WHATSAPP_POLL_INTERVAL_SECONDS", "1"))
+
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def backoff_delay(attempts: int, base: float = WHATSAPP_BACKOFF_BASE_SECONDS, cap: float = WHATSAPP_BACKOFF_MAX_SECONDS) -> float:
+    """
+    Exponential backoff with full jitter: a random delay in
+    [0, min(cap, base * 2 ** (attempts - 1))].
+    """
+    return random.uniform(0, min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def is_retryable(exc: httpx.HTTPError) -> bool:
+    """
+    Network errors, timeouts, 429 and 5xx are retried; other 4xx are not.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return True
+
+
+def _error_text(exc: httpx.HTTPError) -> str:
+    text = str(exc) or type(exc).__name__ # Timeouts vêm sem mensagem
+    if isinstance(exc, httpx.HTTPStatusError):
+        text += f" | Response: {exc.response.text}"
+    return text
+
+
+async def claim_batch(db: AsyncSession, limit: int, lease_seconds: float = WHATSAPP_LEASE_SECONDS) -> List[DBWhatsAppLog]:
+    """
+    Atomically moves up to `limit` due messages to "sending", bumps their
+    attempt counter and returns them.
+    """
+    now = utcnow()
+    due = and_(
+        DBWhatsAppLog.status.in_((STATUS_QUEUED, STATUS_SENDING)),
+        DBWhatsAppLog.next_attempt_at <= now,
+    )
+    candidates = (
+        select(DBWhatsAppLog.id)
+        .where(due)
+        .order_by(DBWhatsAppLog.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True) # Ignorado no SQLite, onde o UPDATE já é serializado
+    )
+    stmt = (
+        update(DBWhatsAppLog)
+        .where(DBWhatsAppLog.id.in_(candidates), due)
+        .values(
+            status=STATUS_SENDING,
+            attempts=DBWhatsAppLog.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=lease_seconds),
+        )
+        .returning(DBWhatsAppLog)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = list((await db.scalars(stmt)).all())
+    await db.commit()
+    return claimed
+
+
+class WhatsAppOutbox:
+    """
+    Pool of asyncio workers draining the whatsapp_logs outbox.
+    """
+
+    def __init__(
+        self,
+        workers: int = WHATSAPP_WORKERS,
+        batch_size: int = WHATSAPP_CLAIM_BATCH,
+        max_attempts: int = WHATSAPP_MAX_ATTEMPTS,
+        poll_interval: float = WHATSAPP_POLL_INTERVAL_SECONDS,
+        backoff_base: float = WHATSAPP_BACKOFF_BASE_SECONDS,
+        backoff_max: float = WHATSAPP_BACKOFF_MAX_SECONDS,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.claimed = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.deferred = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, session_factory: async_sessionmaker, zapi: ZAPIClient) -> None:
+        if self.running or self.workers <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(session_factory, zapi), name=f"whatsapp-outbox-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """
+        Lets each worker finish the batch it is sending (so no message is left
+        in "sending" until its lease expires), then cancels what is left.
+        """
+        tasks, self._tasks = self._tasks, []
+        if not tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._stopping = False
+
+    def notify(self) -> None:
+        """
+        Wakes idle workers after a message is enqueued (no-op when not running).
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, session_factory: async_sessionmaker, zapi: ZAPIClient) -> None:
+        while not self._stopping:
+            breaker_wait = zapi.breaker.retry_after()
+            if breaker_wait > 0:
+                # Z-API fora: não adianta reivindicar mensagens até a próxima sondagem
+                await asyncio.sleep(min(breaker_wait, self.poll_interval))
+                continue
+            try:
+                processed = await self.process_batch(session_factory, zapi)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Banco indisponível etc.: registra e tenta de novo no próximo ciclo
+                error_reporter.capture(e)
+                with self._lock:
+                    self.errors += 1
+                processed = 0
+            if processed or self._stopping:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_batch(self, session_factory: async_sessionmaker, zapi: ZAPIClient) -> int:
+        """
+        Claims one batch, sends it concurrently (bounded by the Z-API client)
+        and records every outcome in a single transaction. Returns the number
+        of messages processed.
+        """
+        async with session_factory() as db:
+            claimed = await claim_batch(db, self.batch_size)
+            if not claimed:
+                return 0
+            outcomes = await asyncio.gather(*(self._deliver(zapi, log) for log in claimed))
+            await db.execute(update(DBWhatsAppLog), outcomes)
+            await db.commit()
+        return len(claimed)
+
+    async def _deliver(self, zapi: ZAPIClient, log: DBWhatsAppLog) -> Dict[str, Any]:
+        with self._lock:
+            self.claimed += 1
+        # Todas as saídas têm as mesmas chaves (UPDATE em lote por chave primária);
+        # sent_at passa a ser o horário da última tentativa
+        try:
+            response_json = await zapi.send_text(log.phone_number, log.message)
+        except ZAPIUnavailable as e:
+            # Circuito aberto: a Z-API não foi chamada, então a tentativa não conta
+            with self._lock:
+                self.deferred += 1
+            return {
+                "id": log.id,
+                "status": STATUS_QUEUED,
+                "attempts": log.attempts - 1,
+                "sent_at": log.sent_at,
+                "next_attempt_at": utcnow() + timedelta(seconds=e.retry_after + random.uniform(0, 1)),
+                "response_data": log.response_data,
+            }
+        except httpx.HTTPError as e:
+            error_reporter.capture(e) # Envia para o Sentry (deduplicado e amostrado)
+            outcome: Dict[str, Any] = {"id": log.id, "attempts": log.attempts, "sent_at": utcnow(), "response_data": _error_text(e)}
+            if is_retryable(e) and log.attempts < self.max_attempts:
+                outcome.update(status=STATUS_QUEUED, next_attempt_at=utcnow() + timedelta(seconds=backoff_delay(log.attempts, self.backoff_base, self.backoff_max)))
+                with self._lock:
+                    self.retried += 1
+            else:
+                outcome.update(status=STATUS_FAILED, next_attempt_at=None)
+                with self._lock:
+                    self.failed += 1
+            return outcome
+        except Exception as e:
+            # Erro inesperado (ex.: resposta 200 sem JSON): a Z-API pode já ter entregue a mensagem,
+            # então ela não é reenviada; o resultado entra no UPDATE do lote junto com os demais
+            error_reporter.capture(e)
+            with self._lock:
+                self.failed += 1
+            return {
+                "id": log.id,
+                "status": STATUS_FAILED,
+                "attempts": log.attempts,
+                "sent_at": utcnow(),
+                "next_attempt_at": None,
+                "response_data": f"{type(e).__name__}: {e}",
+            }
+        with self._lock:
+            self.sent += 1
+        return {
+            "id": log.id,
+            "status": STATUS_SENT,
+            "attempts": log.attempts,
+            "sent_at": utcnow(),
+            "next_attempt_at": None,
+            "response_data": json.dumps(response_json), # Armazena a resposta JSON como string
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": len(self._tasks),
+                "claimed": self.claimed,
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "deferred": self.deferred,
+                "errors": self.errors,
+            }
+
+
+outbox = WhatsAppOutbox()
+register_collector("whatsapp_outbox", outbox.stats)
@@ -0,0 +1,118 @@
+# app/whatsapp_retention.py
+
+# --- Retenção do log de WhatsApp ---
+# whatsapp_logs cresce uma linha por mensagem e o response_data (JSON da Z-API) é
+# a maior parte de cada linha. O job roda em duas etapas, ambas em lotes de
+# WHATSAPP_RETENTION_BATCH linhas com um commit por lote (transações curtas, sem
+# segurar locks na tabela inteira):
+#   1. compactação: response_data com mais de WHATSAPP_RESPONSE_ARCHIVE_DAYS dias é
+#      comprimido (zlib) em um registro de whatsapp_log_archives por lote e zerado
+#      na linha original;
+#   2. expurgo: mensagens finalizadas (sent/failed) com mais de
+#      WHATSAPP_LOG_RETENTION_DAYS dias são apagadas. Mensagens ainda na fila
+#      (queued/sending) nunca são apagadas.
+#
+# Uso (ex.: cron diário):
+#     python -m app.whatsapp_retention
+
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.models import WhatsAppLog as DBWhatsAppLog, WhatsAppLogArchive as DBWhatsAppLogArchive
+from app.whatsapp_outbox import STATUS_FAILED, STATUS_SENT, utcnow
+
+WHATSAPP_RESPONSE_ARCHIVE_DAYS = int(os.getenv("WHATSAPP_RESPONSE_ARCHIVE_DAYS", "30"))
+WHATSAPP_LOG_RETENTION_DAYS = int(os.getenv("WHATSAPP_LOG_RETENTION_DAYS", "90"))
+WHATSAPP_RETENTION_BATCH = int(os.getenv("WHATSAPP_RETENTION_BATCH", "5000"))
+# Pausa entre lotes, para dar folga ao banco (e às réplicas) em tabelas grandes
+WHATSAPP_RETENTION_PAUSE_SECONDS = float(os.getenv("WHATSAPP_RETENTION_PAUSE_SECONDS", "0"))
+
+
+def compact_responses(db: Session, older_than: datetime, batch_size: int = WHATSAPP_RETENTION_BATCH, pause: float = WHATSAPP_RETENTION_PAUSE_SECONDS) -> int:
+    """
+    Moves response_data of logs sent before `older_than` into compressed
+    whatsapp_log_archives rows, one archive per batch. Returns how many logs
+    were compacted.
+    """
+    # Sem ORDER BY: o índice parcial ix_whatsapp_logs_unarchived_sent_at só contém as
+    # linhas que ainda faltam, então cada lote lê apenas o que vai processar
+    stmt = (
+        select(DBWhatsAppLog.id, DBWhatsAppLog.response_data)
+        .where(DBWhatsAppLog.response_data.is_not(None), DBWhatsAppLog.sent_at < older_than)
+        .limit(batch_size)
+    )
+    total = 0
+    while True:
+        rows = db.execute(stmt).all()
+        if not rows:
+            return total
+        ids = [row.id for row in rows]
+        payload = json.dumps({row.id: row.response_data for row in rows}, separators=(",", ":"))
+        db.add(DBWhatsAppLogArchive(
+            first_log_id=min(ids),
+            last_log_id=max(ids),
+            row_count=len(rows),
+            payload=zlib.compress(payload.encode("utf-8")),
+        ))
+        db.execute(
+            update(DBWhatsAppLog).where(DBWhatsAppLog.id.in_(ids)).values(response_data=None),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+        total += len(rows)
+        if pause:
+            time.sleep(pause)
+
+
+def purge_logs(db: Session, older_than: datetime, batch_size: int = WHATSAPP_RETENTION_BATCH, pause: float = WHATSAPP_RETENTION_PAUSE_SECONDS) -> int:
+    """
+    Deletes finished (sent/failed) logs older than `older_than` in batches.
+    Returns how many rows were deleted.
+    """
+    # Cada lote é um DELETE ... WHERE id IN (subconsulta com LIMIT) servido pelo índice (status, sent_at)
+    batch = (
+        select(DBWhatsAppLog.id)
+        .where(DBWhatsAppLog.status.in_((STATUS_SENT, STATUS_FAILED)), DBWhatsAppLog.sent_at < older_than)
+        .limit(batch_size)
+    )
+    total = 0
+    while True:
+        deleted = db.execute(
+            delete(DBWhatsAppLog).where(DBWhatsAppLog.id.in_(batch.scalar_subquery())),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def read_archive(archive: DBWhatsAppLogArchive) -> Dict[int, str]:
+    """
+    Returns the archived {log_id: response_data} mapping.
+    """
+    return {int(log_id): data for log_id, data in json.loads(zlib.decompress(archive.payload)).items()}
+
+
+def run_retention(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    now = now or utcnow()
+    return {
+        "compacted": compact_responses(db, now - timedelta(days=WHATSAPP_RESPONSE_ARCHIVE_DAYS)),
+        "purged": purge_logs(db, now - timedelta(days=WHATSAPP_LOG_RETENTION_DAYS)),
+    }
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        print(run_retention(db))
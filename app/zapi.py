@@ -0,0 +1,293 @@
+# app/zapi.py
+
+# --- Cliente HTTP da Z-API ---
+# Um único httpx.AsyncClient por processo, criado no lifespan da aplicação:
+# conexões keep-alive reaproveitadas (sem novo handshake TLS por mensagem),
+# timeouts de conexão/leitura, um token bucket com a cota de mensagens por
+# segundo da instância Z-API, um circuit breaker e um limite de requisições
+# simultâneas ajustado por AIMD (cresce devagar com sucessos, cai pela metade
+# em timeouts, 429 e 5xx).
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import Request
+
+# Lembre-se: TOKEN E ID DA INSTÂNCIA DEVEM VIR DE VARIÁVEIS DE AMBIENTE EM PRODUÇÃO!
+ZAPI_INSTANCE_ID = os.getenv("ZAPI_INSTANCE_ID", "3E1948F9F42F101A7F1D6260F2C0F8BD")
+ZAPI_TOKEN = os.getenv("ZAPI_TOKEN", "3A2716359C0548F1285A905E")
+ZAPI_BASE_URL = os.getenv("ZAPI_BASE_URL", "https://api.z-api.io")
+ZAPI_CONNECT_TIMEOUT = float(os.getenv("ZAPI_CONNECT_TIMEOUT", "3"))
+ZAPI_READ_TIMEOUT = float(os.getenv("ZAPI_READ_TIMEOUT", "10"))
+ZAPI_MAX_CONNECTIONS = int(os.getenv("ZAPI_MAX_CONNECTIONS", "20"))
+ZAPI_MAX_CONCURRENCY = int(os.getenv("ZAPI_MAX_CONCURRENCY", "20"))
+# Cota da Z-API (mensagens/segundo) e rajada permitida; 0 desliga o limite
+ZAPI_RATE_LIMIT_PER_SECOND = float(os.getenv("ZAPI_RATE_LIMIT_PER_SECOND", "0"))
+ZAPI_RATE_LIMIT_BURST = int(os.getenv("ZAPI_RATE_LIMIT_BURST", "10"))
+# Circuit breaker: abre quando a taxa de falhas nas últimas ZAPI_BREAKER_WINDOW chamadas
+# (com ao menos ZAPI_BREAKER_MIN_CALLS) chega a ZAPI_BREAKER_FAILURE_RATE; 0 desliga
+ZAPI_BREAKER_FAILURE_RATE = float(os.getenv("ZAPI_BREAKER_FAILURE_RATE", "0.5"))
+ZAPI_BREAKER_WINDOW = int(os.getenv("ZAPI_BREAKER_WINDOW", "20"))
+ZAPI_BREAKER_MIN_CALLS = int(os.getenv("ZAPI_BREAKER_MIN_CALLS", "10"))
+ZAPI_BREAKER_OPEN_SECONDS = float(os.getenv("ZAPI_BREAKER_OPEN_SECONDS", "30"))
+ZAPI_BREAKER_HALF_OPEN_PROBES = int(os.getenv("ZAPI_BREAKER_HALF_OPEN_PROBES", "3"))
+ZAPI_MIN_CONCURRENCY = int(os.getenv("ZAPI_MIN_CONCURRENCY", "1"))
+
+
+class ZAPIUnavailable(Exception):
+    """
+    Raised without calling Z-API while the circuit breaker is open.
+    `retry_after` is the number of seconds until the next probe is allowed.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Z-API indisponível (circuito aberto); nova tentativa em {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, at most `capacity` banked.
+    Waiters are served in FIFO order.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by the failure rate over the
+    last `window` calls. Open rejects calls for `open_seconds`; half-open lets
+    `half_open_probes` calls through and closes once all of them succeed.
+    Runs on a single event loop, so no locking is needed.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = ZAPI_BREAKER_FAILURE_RATE,
+        window: int = ZAPI_BREAKER_WINDOW,
+        min_calls: int = ZAPI_BREAKER_MIN_CALLS,
+        open_seconds: float = ZAPI_BREAKER_OPEN_SECONDS,
+        half_open_probes: int = ZAPI_BREAKER_HALF_OPEN_PROBES,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_rate > 0
+
+    def retry_after(self) -> float:
+        """
+        Seconds until calls are allowed again (0 unless open).
+        """
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def before_call(self) -> None:
+        if not self.enabled:
+            return
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                raise ZAPIUnavailable(self.retry_after())
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                raise ZAPIUnavailable(1.0)
+            self._probes_in_flight += 1
+
+    def record(self, ok: Optional[bool]) -> None:
+        """
+        Records a call outcome: True (Z-API answered), False (timeout, network
+        error, 429 or 5xx) or None (cancelled before an answer).
+        """
+        if not self.enabled or self.state == self.OPEN:
+            return
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if ok is False:
+                self._trip()
+            elif ok:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+            return
+        if ok is None:
+            return
+        self._outcomes.append(ok)
+        if len(self._outcomes) >= self.min_calls and self.current_failure_rate() >= self.failure_rate:
+            self._trip()
+
+    def current_failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _trip(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on in-flight calls: +1/limit per success (about +1 per
+    round of `limit` calls), halved on failure. Only calls started after the
+    last decrease can trigger another one, so a burst of timeouts from the
+    same round halves the limit once.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = ZAPI_MIN_CONCURRENCY, decrease_factor: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = max(1, min(min_limit, max_limit))
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started_at: float, ok: Optional[bool]) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if ok is True:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            elif ok is False and started_at >= self._last_decrease:
+                self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                self._last_decrease = time.monotonic()
+            self._condition.notify_all()
+
+
+class ZAPIClient:
+    """
+    Async Z-API client with keep-alive connection pooling, connect/read
+    timeouts, an optional messages-per-second rate limit, a circuit breaker
+    and an AIMD-adjusted bound on in-flight requests.
+    """
+
+    def __init__(
+        self,
+        base_url: str = ZAPI_BASE_URL,
+        instance_id: str = ZAPI_INSTANCE_ID,
+        token: str = ZAPI_TOKEN,
+        connect_timeout: float = ZAPI_CONNECT_TIMEOUT,
+        read_timeout: float = ZAPI_READ_TIMEOUT,
+        max_connections: int = ZAPI_MAX_CONNECTIONS,
+        max_concurrency: int = ZAPI_MAX_CONCURRENCY,
+        rate_limit: float = ZAPI_RATE_LIMIT_PER_SECOND,
+        rate_burst: int = ZAPI_RATE_LIMIT_BURST,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._path_prefix = f"/instances/{instance_id}/token/{token}"
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._bucket = TokenBucket(rate_limit, rate_burst) if rate_limit > 0 else None
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.requests = 0
+        self.failures = 0
+
+    async def send_text(self, phone: str, message: str) -> dict:
+        """
+        Sends a text message. Raises ZAPIUnavailable while the breaker is
+        open, and httpx.HTTPError on network errors, timeouts and 4xx/5xx.
+        """
+        self.breaker.before_call()
+        ok: Optional[bool] = None
+        started_at = 0.0
+        try:
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            started_at = await self.limiter.acquire()
+            self.requests += 1
+            try:
+                response = await self._client.post(
+                    f"{self._path_prefix}/send-text",
+                    json={"phone": phone, "message": message},
+                )
+            except httpx.HTTPError:
+                ok = False
+                raise
+            # 429/5xx indicam Z-API sobrecarregada ou fora; outros 4xx são erro da requisição
+            ok = not (response.status_code == 429 or response.status_code >= 500)
+        finally:
+            if started_at:
+                await self.limiter.release(started_at, ok)
+            if ok is False:
+                self.failures += 1
+            self.breaker.record(ok)
+        response.raise_for_status() # Levanta um erro para status de resposta HTTP 4xx/5xx
+        return response.json()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_failure_rate": self.breaker.current_failure_rate(),
+            "breaker_opened": self.breaker.opened,
+            "breaker_rejected": self.breaker.rejected,
+            "breaker_retry_after_s": self.breaker.retry_after(),
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def get_zapi_client(request: Request) -> ZAPIClient:
+    """
+    Dependency that returns the shared client created in the app lifespan.
+    """
+    return request.app.state.zapi
@@ -0,0 +1,78 @@
+# benchmarks/async_db.py
+"""
+Latência (p50/p99) de requisições rápidas (GET /metrics) disputando o event
+loop com requisições lentas de listagem de clientes:
+
+- antes: consulta síncrona dentro de uma rota async def (bloqueia o event loop),
+  reproduzida aqui na rota /bench/legacy-clients;
+- depois: GET /clients, que usa a sessão assíncrona (app.database.get_async_db).
+
+Uso:
+    python -m benchmarks.async_db
+"""
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.main import app
+from app.models import Client
+from benchmarks.common import make_engine, reset_schema, install_overrides
+
+ROWS = int(os.getenv("BENCH_ROWS", "300000"))
+SLOW = int(os.getenv("BENCH_SLOW", "20"))
+FAST = int(os.getenv("BENCH_FAST", "200"))
+
+
+async def legacy_list_clients(nome: str, db: Session = Depends(get_db)):
+    # Padrão antigo: db.query síncrono executado direto no event loop
+    return [c.id for c in db.query(Client).filter(Client.nome.ilike(f"%{nome}%")).limit(10).all()]
+
+app.add_api_route("/bench/legacy-clients", legacy_list_clients, methods=["GET"])
+
+
+async def run(headers, slow_url):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        await client.get("/metrics/")  # aquece o cache de autenticação
+        latencies = []
+
+        async def fast():
+            start = time.perf_counter()
+            assert (await client.get("/metrics/")).status_code == 200
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        async def slow():
+            assert (await client.get(slow_url)).status_code == 200
+
+        tasks = [slow() for _ in range(SLOW)] + [fast() for _ in range(FAST)]
+        await asyncio.gather(*tasks)
+        latencies.sort()
+        return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    engine = make_engine(pool_size=SLOW + 5)
+    Session = reset_schema(engine)
+    with Session() as db:
+        db.execute(insert(Client), [
+            {"nome": f"Cliente {i}", "email": f"c{i}@example.com", "cpf": f"{i:011d}"} for i in range(ROWS)
+        ])
+        db.commit()
+    headers = install_overrides(Session)
+
+    print(f"{engine.dialect.name}: {ROWS} clientes, {SLOW} listagens lentas + {FAST} requisições rápidas")
+    for label, url in (("antes (sync no loop)", "/bench/legacy-clients?nome=zzz"),
+                       ("depois (AsyncSession)", "/clients/?nome=zzz")):
+        p50, p99 = asyncio.run(run(headers, url))
+        print(f"  {label:22} rápidas p50={p50:8.1f} ms  p99={p99:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
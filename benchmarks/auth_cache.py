@@ -0,0 +1,41 @@
+# benchmarks/auth_cache.py
+"""
+Throughput de requisições autenticadas (GET /products/{id}) com e sem o
+cache de usuários autenticados de app.users.
+
+Uso:
+    python -m benchmarks.auth_cache
+"""
+import os
+import time
+
+from app.models import Product
+from app.users import principal_cache
+from benchmarks.common import make_engine, reset_schema, admin_client
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "3000"))
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    with Session() as db:
+        db.add(Product(description="Produto", sale_value=1.0, barcode="B1", section="bench", initial_stock=1, current_stock=1))
+        db.commit()
+    client = admin_client(Session)
+
+    maxsize = principal_cache.maxsize
+    print(f"{engine.dialect.name}: {REQUESTS} x GET /products/1")
+    for label, size in (("sem cache", 0), ("com cache", maxsize or 1024)):
+        principal_cache.clear()
+        principal_cache.maxsize = size
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            assert client.get("/products/1").status_code == 200
+        elapsed = time.perf_counter() - start
+        print(f"  {label:10} {REQUESTS / elapsed:8.0f} req/s")
+    print(f"  {principal_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
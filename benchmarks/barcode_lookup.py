@@ -0,0 +1,106 @@
+# benchmarks/barcode_lookup.py
+"""
+Latência da busca por código de barras (app/barcode_index.py) sob uma carga
+constante de BENCH_RATE consultas/s (padrão: 10 mil) durante BENCH_SECONDS, em
+um catálogo de BENCH_PRODUCTS produtos. A carga é de malha aberta: cada consulta
+tem um horário agendado e a latência conta a partir dele, então atrasos
+acumulados aparecem no p99. Duas distribuições de códigos:
+  - "quentes": os BENCH_HOT produtos mais vendidos (cabem no cache de produtos);
+  - "uniforme": qualquer produto do catálogo (a maioria cai no banco por id).
+Mede também GET /products/barcode/{code} pelo TestClient, para referência.
+
+Uso:
+    python -m benchmarks.barcode_lookup
+"""
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import insert
+
+from app.barcode_index import barcode_index, lookup_barcodes
+from app.models import Product
+from app.product_cache import product_cache
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "100000"))
+RATE = int(os.getenv("BENCH_RATE", "10000"))
+SECONDS = float(os.getenv("BENCH_SECONDS", "5"))
+HOT = int(os.getenv("BENCH_HOT", "1000"))
+HTTP_REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+
+
+def barcode(i: int) -> str:
+    return f"789{i:010d}"
+
+
+def populate(Session):
+    with Session() as db:
+        for start in range(0, PRODUCTS, 20_000):
+            db.execute(insert(Product.__table__), [
+                {"description": f"Produto {i}", "sale_value": 10.0, "barcode": barcode(i), "section": "bench", "initial_stock": 5, "current_stock": 5}
+                for i in range(start, min(start + 20_000, PRODUCTS))
+            ])
+            db.commit()
+
+
+def paced(Session, pick) -> str:
+    interval = 1.0 / RATE
+    total = int(RATE * SECONDS)
+    latencies = []
+    with Session() as db:
+        start = time.perf_counter()
+        for n in range(total):
+            scheduled = start + n * interval
+            while time.perf_counter() < scheduled:
+                pass
+            found, _ = lookup_barcodes(db, [pick()])
+            latencies.append(time.perf_counter() - scheduled)
+            db.rollback() # Encerra a transação de leitura, como ao fim de cada requisição
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1e6
+    return f"{total / elapsed:7.0f} consultas/s  p50 {p(0.5):7.0f} µs  p99 {p(0.99):8.0f} µs  máx {latencies[-1] * 1e6:8.0f} µs"
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    populate(Session)
+    with Session() as db:
+        start = time.perf_counter()
+        count = barcode_index.warm(db)
+        print(f"mapa carregado: {count} códigos em {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = random.Random(1)
+    print(f"carga alvo: {RATE} consultas/s por {SECONDS:.0f}s")
+    default_size = product_cache.maxsize
+    for label, size, population in (
+        (f"quentes ({HOT})", default_size, HOT),
+        (f"uniforme, cache {default_size}", default_size, PRODUCTS),
+        (f"uniforme, cache {PRODUCTS}", PRODUCTS, PRODUCTS),
+    ):
+        product_cache.maxsize = size
+        product_cache.clear()
+        with Session() as db: # Aquecimento: uma passada pelos códigos (até o tamanho do cache)
+            for start in range(0, min(population, size), 500):
+                lookup_barcodes(db, [barcode(i) for i in range(start, min(start + 500, population, size))])
+        before = product_cache.stats()
+        result = paced(Session, lambda: barcode(rng.randrange(population)))
+        after = product_cache.stats()
+        hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+        print(f"  {label:24} {result}  acertos no cache {hits / max(1, hits + misses):.0%}")
+    product_cache.maxsize = default_size
+
+    client = admin_client(Session)
+    samples = []
+    for _ in range(HTTP_REQUESTS):
+        start = time.perf_counter()
+        assert client.get(f"/products/barcode/{barcode(rng.randrange(HOT))}").status_code == 200
+        samples.append(time.perf_counter() - start)
+    print(f"HTTP (TestClient, sequencial): {HTTP_REQUESTS / sum(samples):.0f} req/s, p50 {statistics.median(samples) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bulk_orders.py
+"""
+Throughput (pedidos/s) de POST /orders (um pedido por requisição) contra
+POST /orders/bulk com o mesmo volume de pedidos.
+
+Uso:
+    python -m benchmarks.bulk_orders
+    BENCH_ORDERS=20000 BENCH_CHUNK_SIZE=1000 python -m benchmarks.bulk_orders
+"""
+import os
+import time
+
+from app.models import Client, Product
+from benchmarks.common import make_engine, reset_schema, admin_client
+
+ORDERS = int(os.getenv("BENCH_ORDERS", "2000"))
+CHUNK_SIZE = int(os.getenv("BENCH_CHUNK_SIZE", "500"))
+PRODUCTS = 50
+LINES_PER_ORDER = 3
+
+
+def seed(Session):
+    with Session() as db:
+        db.add_all(Client(nome=f"Cliente {i}", email=f"c{i}@example.com", cpf=f"{i:011d}") for i in range(100))
+        db.add_all(
+            Product(description=f"Produto {i}", sale_value=10.0 + i, barcode=f"B{i}", section="bench",
+                    initial_stock=10**9, current_stock=10**9)
+            for i in range(PRODUCTS)
+        )
+        db.commit()
+
+
+def payloads():
+    return [
+        {
+            "client_id": 1 + n % 100,
+            "products": [{"product_id": 1 + (n + k) % PRODUCTS, "quantity": 1} for k in range(LINES_PER_ORDER)]
+        }
+        for n in range(ORDERS)
+    ]
+
+
+def main():
+    engine = make_engine()
+
+    Session = reset_schema(engine)
+    seed(Session)
+    client = admin_client(Session)
+    start = time.perf_counter()
+    for payload in payloads():
+        assert client.post("/orders/", json=payload).status_code == 201
+    single = time.perf_counter() - start
+
+    Session = reset_schema(engine)
+    seed(Session)
+    client = admin_client(Session)
+    start = time.perf_counter()
+    response = client.post(f"/orders/bulk?chunk_size={CHUNK_SIZE}", json=payloads())
+    bulk = time.perf_counter() - start
+    assert response.json()["created"] == ORDERS
+
+    print(f"{engine.dialect.name}: {ORDERS} pedidos x {LINES_PER_ORDER} itens")
+    print(f"  POST /orders      {single:8.3f}s  {ORDERS / single:10.0f} pedidos/s")
+    print(f"  POST /orders/bulk {bulk:8.3f}s  {ORDERS / bulk:10.0f} pedidos/s  (chunk_size={CHUNK_SIZE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/client_stats.py
+"""
+Agregados de pedidos por cliente (app/client_stats.py) com BENCH_CLIENTS
+clientes e BENCH_ORDERS pedidos (padrão: 20 mil e 1 milhão). Compara, para
+os 10 clientes de maior valor e para os agregados de um cliente, a consulta
+sobre orders com a leitura de client_order_stats, e mede a reconciliação
+completa (verificação + reconstrução).
+
+Uso:
+    python -m benchmarks.client_stats
+"""
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select
+
+from app.client_stats import find_drift, rebuild_client_stats
+from app.models import Client, Order
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "20000"))
+ORDERS = int(os.getenv("BENCH_ORDERS", "1000000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20"))
+
+
+def populate(Session):
+    rng = random.Random(9)
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    with Session() as db:
+        db.execute(insert(Client.__table__), [
+            {"nome": f"Cliente {i}", "email": f"c{i}@bench.com", "cpf": f"{i:011d}"} for i in range(CLIENTS)
+        ])
+        for offset in range(0, ORDERS, 100_000):
+            db.execute(insert(Order.__table__), [
+                {
+                    "client_id": rng.randint(1, CLIENTS), "status": rng.choice(["pending", "delivered", "delivered", "cancelled"]),
+                    "total_value": round(rng.uniform(20, 800), 2), "order_date": start + timedelta(minutes=rng.randint(0, 2_000_000)),
+                }
+                for _ in range(offset, min(offset + 100_000, ORDERS))
+            ])
+        db.commit()
+
+
+def p50(fn, rounds: int = ROUNDS) -> str:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return f"p50 {statistics.median(samples) * 1000:9.2f} ms"
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    populate(Session)
+    with Session() as db:
+        start = time.perf_counter()
+        rebuild_client_stats(db)
+        rebuild = time.perf_counter() - start
+        start = time.perf_counter()
+        assert find_drift(db) == []
+        check = time.perf_counter() - start
+    client = admin_client(Session)
+    rng = random.Random(1)
+
+    def top_from_orders():
+        with Session() as db:
+            db.execute(
+                select(Order.client_id, func.sum(Order.total_value).label("value"))
+                .where(Order.status != "cancelled").group_by(Order.client_id)
+                .order_by(func.sum(Order.total_value).desc()).limit(10)
+            ).all()
+
+    def one_from_orders():
+        with Session() as db:
+            db.execute(
+                select(func.count(), func.sum(Order.total_value), func.max(Order.order_date))
+                .where(Order.client_id == rng.randint(1, CLIENTS), Order.status != "cancelled")
+            ).one()
+
+    print(f"{CLIENTS} clientes, {ORDERS} pedidos:")
+    print(f"  top 10 por valor, agregando orders:         {p50(top_from_orders, 3)}")
+    print(f"  GET /clients/?sort_by=lifetime_value:        {p50(lambda: client.get('/clients/', params={'sort_by': 'lifetime_value'}))}")
+    print(f"  agregados de um cliente, sobre orders:      {p50(one_from_orders)}")
+    print(f"  GET /clients/{{id}} (com client_order_stats): {p50(lambda: client.get(f'/clients/{rng.randint(1, CLIENTS)}'))}")
+    print(f"  reconciliação: verificação {check * 1000:.0f} ms, reconstrução {rebuild * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/common.py
+"""
+Utilitários compartilhados pelos benchmarks: engine configurável e um
+TestClient autenticado como admin apontando para esse engine.
+"""
+import os
+import tempfile
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.auth import criar_token
+from app.database import Base, get_db, get_async_db, get_async_sessionmaker, to_async_url
+from app.models import User
+
+ADMIN_EMAIL = "bench@example.com"
+
+
+def make_engine(pool_size: int = 5):
+    """
+    BENCH_DATABASE_URL aponta para um Postgres (ex.: o do docker-compose);
+    sem ela, usa um arquivo SQLite temporário.
+    """
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url:
+        return create_engine(url, pool_size=pool_size, max_overflow=0)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return create_engine(f"sqlite:///{path}", pool_size=pool_size, connect_args={"check_same_thread": False, "timeout": 30})
+
+
+def reset_schema(engine):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+def async_sessions(Session):
+    """
+    Async sessionmaker for the same database as the sync `Session` factory.
+    NullPool: each asyncio.run() has its own event loop.
+    """
+    engine = Session.kw["bind"]
+    connect_args = {"timeout": 30} if engine.dialect.name == "sqlite" else {}
+    async_engine = create_async_engine(to_async_url(engine.url.render_as_string(hide_password=False)), poolclass=NullPool, connect_args=connect_args)
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def install_overrides(Session):
+    """
+    Points get_db, get_async_db and get_async_sessionmaker at the benchmark database and creates an
+    admin user. Returns the Authorization headers for that admin.
+    """
+    from app.main import app
+
+    with Session() as db:
+        db.add(User(email=ADMIN_EMAIL, hashed_password="-", is_admin=True, is_active=True))
+        db.commit()
+
+    AsyncSession = async_sessions(Session)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: AsyncSession
+    return {"Authorization": f"Bearer {criar_token(data={'sub': ADMIN_EMAIL, 'is_admin': True})}"}
+
+
+def admin_client(Session) -> TestClient:
+    """
+    Retorna um TestClient com get_db/get_async_db apontando para o engine do
+    benchmark e o header Authorization de um admin recém-criado.
+    """
+    from app.main import app
+
+    client = TestClient(app)
+    client.headers.update(install_overrides(Session))
+    return client
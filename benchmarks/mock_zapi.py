@@ -0,0 +1,78 @@
+# benchmarks/mock_zapi.py
+"""
+Z-API falsa para benchmarks e testes manuais: responde ao endpoint send-text
+depois de MOCK_ZAPI_LATENCY_MS milissegundos, com injeção de falhas:
+
+- MOCK_ZAPI_ERROR_RATE: fração das chamadas respondidas com 503;
+- MOCK_ZAPI_HANG_RATE: fração das chamadas que não respondem (estouram o timeout do cliente).
+
+As falhas podem ser trocadas em execução com PUT /_faults
+({"latency_ms": ..., "error_rate": ..., "hang_rate": ...}); GET /_stats devolve
+quantas chamadas chegaram e quantas falharam.
+
+Uso isolado (ZAPI_BASE_URL=http://127.0.0.1:8099 na API):
+    python -m benchmarks.mock_zapi
+"""
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Response
+
+faults = {
+    "latency_ms": float(os.getenv("MOCK_ZAPI_LATENCY_MS", "50")),
+    "error_rate": float(os.getenv("MOCK_ZAPI_ERROR_RATE", "0")),
+    "hang_rate": float(os.getenv("MOCK_ZAPI_HANG_RATE", "0")),
+}
+stats = {"requests": 0, "errors": 0, "hangs": 0}
+
+mock_app = FastAPI(title="Mock Z-API")
+
+
+@mock_app.post("/instances/{instance_id}/token/{token}/send-text")
+async def send_text(instance_id: str, token: str, payload: dict, response: Response):
+    stats["requests"] += 1
+    roll = random.random()
+    if roll < faults["hang_rate"]:
+        stats["hangs"] += 1
+        await asyncio.sleep(3600)
+    await asyncio.sleep(faults["latency_ms"] / 1000)
+    if roll < faults["hang_rate"] + faults["error_rate"]:
+        stats["errors"] += 1
+        response.status_code = 503
+        return {"error": "instance unavailable"}
+    return {"zaapId": uuid.uuid4().hex, "messageId": uuid.uuid4().hex, "id": uuid.uuid4().hex}
+
+
+@mock_app.put("/_faults")
+async def set_faults(new_faults: dict):
+    faults.update({k: float(v) for k, v in new_faults.items() if k in faults})
+    return faults
+
+
+@mock_app.get("/_stats")
+async def get_stats():
+    return stats
+
+
+def serve_in_thread(host: str = "127.0.0.1") -> str:
+    """
+    Starts the mock on a free port in a daemon thread and returns its base URL.
+    """
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(mock_app, host=host, port=port, log_level="warning", access_log=False, backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    uvicorn.run(mock_app, host="127.0.0.1", port=int(os.getenv("MOCK_ZAPI_PORT", "8099")), access_log=False)
@@ -0,0 +1,105 @@
+# benchmarks/order_cancel.py
+"""
+Cancelamento e exclusão de pedidos grandes (BENCH_LINES itens cada; padrão
+300) em um catálogo de BENCH_PRODUCTS produtos. Compara o padrão ORM item a
+item (carrega o pedido com os itens, devolve o estoque produto a produto e
+apaga cada item com session.delete) com as rotas atuais:
+PUT /orders/{id}/status {"status": "cancelled"}, que usa um UPDATE ... FROM
+order_products, e DELETE /orders/{id}, que apaga os itens com um DELETE.
+
+Uso:
+    python -m benchmarks.order_cancel
+"""
+import os
+import statistics
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+
+from app.models import Client, Order, OrderProduct, Product
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "20000"))
+LINES = int(os.getenv("BENCH_LINES", "300"))
+ORDERS = int(os.getenv("BENCH_ORDERS", "20"))
+
+
+def populate(Session):
+    with Session() as db:
+        db.execute(insert(Product.__table__), [
+            {"description": f"Produto {i}", "sale_value": 10.0, "barcode": f"K{i}", "section": "bench", "initial_stock": 10_000, "current_stock": 10_000}
+            for i in range(PRODUCTS)
+        ])
+        client = Client(nome="Bench", email="bench@bench.com", cpf="11144477735")
+        db.add(client)
+        db.commit()
+        return client.id
+
+
+def create_orders(Session, client_id, count):
+    ids = []
+    with Session() as db:
+        for n in range(count):
+            order = Order(client_id=client_id, status="pending", total_value=LINES * 10.0)
+            db.add(order)
+            db.flush()
+            start = (n * LINES) % (PRODUCTS - LINES)
+            db.execute(insert(OrderProduct.__table__), [
+                {"order_id": order.id, "product_id": pid, "quantity": 1, "price_at_order": 10.0}
+                for pid in range(start + 1, start + LINES + 1)
+            ])
+            ids.append(order.id)
+        db.commit()
+    return ids
+
+
+def orm_cancel_and_delete(Session, order_id):
+    # Padrão antigo: um SELECT/UPDATE por produto e um DELETE por item
+    with Session() as db:
+        order = db.query(Order).options(selectinload(Order.order_products)).filter(Order.id == order_id).one()
+        order.status = "cancelled"
+        for line in order.order_products:
+            product = db.get(Product, line.product_id)
+            product.current_stock += line.quantity
+        db.flush()
+        for line in order.order_products:
+            db.delete(line)
+        db.flush()
+        db.expire(order, ["order_products"])
+        db.delete(order)
+        db.commit()
+
+
+def p50(samples) -> str:
+    return f"p50 {statistics.median(samples) * 1000:8.1f} ms"
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    client_id = populate(Session)
+    client = admin_client(Session)
+
+    orm, cancel, delete = [], [], []
+    for order_id in create_orders(Session, client_id, ORDERS):
+        start = time.perf_counter()
+        orm_cancel_and_delete(Session, order_id)
+        orm.append(time.perf_counter() - start)
+    for order_id in create_orders(Session, client_id, ORDERS):
+        start = time.perf_counter()
+        assert client.put(f"/orders/{order_id}/status", json={"status": "cancelled"}).status_code == 200
+        cancel.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert client.delete(f"/orders/{order_id}").status_code == 204
+        delete.append(time.perf_counter() - start)
+
+    print(f"{ORDERS} pedidos com {LINES} itens:")
+    print(f"  ORM item a item (cancelar + excluir):  {p50(orm)}")
+    print(f"  PUT status=cancelled (HTTP):           {p50(cancel)}")
+    print(f"  DELETE /orders/{{id}} (HTTP):            {p50(delete)}")
+    print(f"  cancelar + excluir (HTTP):             {p50([c + d for c, d in zip(cancel, delete)])}")
+
+
+if __name__ == "__main__":
+    main()
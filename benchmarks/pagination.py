@@ -0,0 +1,53 @@
+# benchmarks/pagination.py
+"""
+Custo de GET /products na página 1 e na página 10.000 (limit=10), com
+skip/offset e com cursor. Com offset o custo cresce com a página; com
+cursor ele é constante.
+
+Uso:
+    python -m benchmarks.pagination
+"""
+import os
+import time
+
+from sqlalchemy import insert
+
+from app.models import Product
+from app.pagination import encode_cursor
+from benchmarks.common import make_engine, reset_schema, admin_client
+
+ROWS = int(os.getenv("BENCH_ROWS", "200000"))
+LIMIT = 10
+PAGE = 10_000
+REPEAT = 50
+
+
+def timed(client, url):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        assert client.get(url).status_code == 200
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    with Session() as db:
+        db.execute(insert(Product), [
+            {"description": f"Produto {i}", "sale_value": 1.0, "barcode": f"B{i}", "section": "bench",
+             "initial_stock": 1, "current_stock": 1}
+            for i in range(ROWS)
+        ])
+        db.commit()
+    client = admin_client(Session)
+
+    skip = (PAGE - 1) * LIMIT
+    cursor = encode_cursor([skip])  # último id da página anterior (ids começam em 1)
+    print(f"{engine.dialect.name}: {ROWS} produtos, limit={LIMIT}, média de {REPEAT} requisições")
+    print(f"  página 1            {timed(client, f'/products/?limit={LIMIT}'):7.2f} ms")
+    print(f"  página {PAGE} skip   {timed(client, f'/products/?limit={LIMIT}&skip={skip}'):7.2f} ms")
+    print(f"  página {PAGE} cursor {timed(client, f'/products/?limit={LIMIT}&cursor={cursor}'):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
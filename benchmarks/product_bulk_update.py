@@ -0,0 +1,58 @@
+# benchmarks/product_bulk_update.py
+"""
+Remarcação de preço de uma seção inteira (BENCH_SECTION_PRODUCTS produtos, em
+um catálogo de BENCH_PRODUCTS): um PUT /products/{id} por produto contra um
+único PATCH /products/bulk com percent_change.
+
+Uso:
+    python -m benchmarks.product_bulk_update
+"""
+import os
+import time
+
+from sqlalchemy import insert
+
+from app.models import Product
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "50000"))
+SECTION_PRODUCTS = int(os.getenv("BENCH_SECTION_PRODUCTS", "2000"))
+
+
+def populate(Session):
+    with Session() as db:
+        db.execute(insert(Product.__table__), [
+            {
+                "description": f"Produto {i}", "sale_value": 100.0, "barcode": f"U{i}",
+                "section": "Moda Praia" if i < SECTION_PRODUCTS else "Outros", "initial_stock": 10, "current_stock": 10,
+            }
+            for i in range(PRODUCTS)
+        ])
+        db.commit()
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    populate(Session)
+    client = admin_client(Session)
+    with Session() as db:
+        ids = [row.id for row in db.query(Product.id).filter(Product.section == "Moda Praia")]
+
+    start = time.perf_counter()
+    for product_id in ids:
+        assert client.put(f"/products/{product_id}", json={"sale_value": 90.0}).status_code == 200
+    per_row = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.patch("/products/bulk", json={"filter": {"section": "Moda Praia"}, "percent_change": -10})
+    bulk = time.perf_counter() - start
+    assert response.json()["updated"] == len(ids)
+
+    print(f"{len(ids)} produtos da seção, {PRODUCTS} no catálogo:")
+    print(f"  PUT por produto:          {per_row * 1000:9.1f} ms")
+    print(f"  PATCH /products/bulk:     {bulk * 1000:9.1f} ms  ({per_row / bulk:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
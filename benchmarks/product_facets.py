@@ -0,0 +1,76 @@
+# benchmarks/product_facets.py
+"""
+Montagem da barra de filtros da vitrine em um catálogo de BENCH_PRODUCTS
+produtos: o padrão antigo (uma requisição a GET /products/ por seção, por faixa
+de preço e por disponibilidade) contra uma única requisição com ?facets=true.
+Roda com o cache de produtos desligado (custo das consultas) e ligado.
+
+Uso:
+    python -m benchmarks.product_facets
+"""
+import os
+import random
+import time
+
+from sqlalchemy import insert
+
+from app.models import Product
+from app.product_cache import product_cache
+from app.routers.products import PRODUCT_PRICE_BUCKETS
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "50000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20"))
+SECTIONS = ["Masculino", "Feminino", "Infantil", "Calçados", "Acessórios", "Moda Praia", "Esporte", "Íntima"]
+
+
+def populate(Session):
+    rng = random.Random(3)
+    with Session() as db:
+        db.execute(insert(Product.__table__), [
+            {
+                "description": f"Produto {i}", "sale_value": round(rng.uniform(5, 800), 2), "barcode": f"F{i}",
+                "section": rng.choice(SECTIONS), "initial_stock": 10, "current_stock": rng.choice([0, 3, 10]),
+            }
+            for i in range(PRODUCTS)
+        ])
+        db.commit()
+
+
+def sidebar_requests():
+    # Padrão antigo: uma listagem por valor de filtro
+    requests = [{"category": section} for section in SECTIONS]
+    edges = PRODUCT_PRICE_BUCKETS + [None]
+    requests += [{"min_price": low, **({"max_price": high} if high is not None else {})} for low, high in zip(edges, edges[1:])]
+    requests += [{"available": True}, {"available": False}]
+    return [{**params, "limit": 100} for params in requests]
+
+
+def run(client, requests) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for params in requests:
+            assert client.get("/products/", params=params).status_code == 200
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    populate(Session)
+    client = admin_client(Session)
+    old = sidebar_requests()
+    new = [{"limit": 10, "facets": True}]
+
+    default_size = product_cache.maxsize
+    for label, size in (("sem cache", 0), ("com cache", default_size)):
+        product_cache.maxsize = size
+        product_cache.clear()
+        print(f"{PRODUCTS} produtos, {label}:")
+        print(f"  {len(old):2} requisições (uma por filtro): {run(client, old):8.1f} ms por barra")
+        print(f"   1 requisição ?facets=true:      {run(client, new):8.1f} ms por barra")
+    product_cache.maxsize = default_size
+
+
+if __name__ == "__main__":
+    main()
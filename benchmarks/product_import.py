@@ -0,0 +1,56 @@
+# benchmarks/product_import.py
+"""
+Vazão de POST /products/import (app/product_import.py): gera um CSV de
+BENCH_IMPORT_ROWS linhas (padrão: 1 milhão, ~1% inválidas e ~1% com código de
+barras repetido) em disco e envia pelo endpoint, medindo linhas/s para cada
+tamanho de lote em BENCH_IMPORT_BATCHES.
+
+Uso:
+    python -m benchmarks.product_import
+    BENCH_IMPORT_ROWS=100000 BENCH_IMPORT_BATCHES=500,2000,10000 python -m benchmarks.product_import
+"""
+import csv
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+ROWS = int(os.getenv("BENCH_IMPORT_ROWS", "1000000"))
+BATCHES = [int(n) for n in os.getenv("BENCH_IMPORT_BATCHES", "500").split(",")]
+
+
+def write_csv(path: str) -> None:
+    rng = random.Random(7)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["description", "sale_value", "barcode", "section", "initial_stock", "expiration_date", "main_image_url"])
+        for i in range(ROWS):
+            price = "abc" if i % 100 == 37 else f"{rng.uniform(10, 500):.2f}"
+            barcode = f"IMP{i - 1:010d}" if i % 100 == 71 else f"IMP{i:010d}"
+            writer.writerow([f"Produto Importado {i}", price, barcode, rng.choice(["Masculino", "Feminino"]), rng.randint(0, 100), "", ""])
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "produtos.csv")
+    write_csv(path)
+    print(f"CSV com {ROWS} linhas: {os.path.getsize(path) / 1e6:.0f} MB")
+    for batch_size in BATCHES:
+        engine = make_engine()
+        Session = reset_schema(engine)
+        client = admin_client(Session)
+        with open(path, "rb") as f:
+            start = time.perf_counter()
+            response = client.post("/products/import", params={"batch_size": batch_size}, files={"file": ("produtos.csv", f, "text/csv")})
+            elapsed = time.perf_counter() - start
+        report = response.json()
+        print(
+            f"lote {batch_size:>6}: {elapsed:6.1f}s  {ROWS / elapsed:9.0f} linhas/s  "
+            f"(criados {report['created']}, erros {report['failed']})"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/product_search.py
+"""
+Latência de GET /products/search (app/product_search.py) em um catálogo de
+BENCH_PRODUCTS produtos (padrão: 500 mil), comparada ao filtro antigo
+description ILIKE '%termo%' de list_products. Mede a busca direto no banco
+(sem HTTP) para isolar o custo do índice.
+
+Uso:
+    python -m benchmarks.product_search
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.product_search
+"""
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import insert
+
+from app.models import Product
+from app.product_search import search_products
+from benchmarks.common import make_engine, reset_schema
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "500000"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "300"))
+INSERT_CHUNK = 20_000
+
+KINDS = ["Calça", "Camiseta", "Camisa", "Vestido", "Saia", "Jaqueta", "Blusa", "Bermuda", "Moletom", "Tênis", "Sandália", "Biquíni"]
+ADJECTIVES = ["Básica", "Estampada", "Lisa", "Listrada", "Floral", "Jeans", "Slim", "Oversize", "Plissada", "Térmica"]
+COLORS = ["Azul", "Branca", "Preta", "Vermelha", "Verde", "Amarela", "Cinza", "Marrom", "Rosa", "Bege"]
+SEARCHES = ["calca", "camis", "vestido floral", "jaqueta preta", "bermuda jeans azul", "tenis", "saia pli", "moletom cinza"]
+
+
+def populate(Session):
+    rng = random.Random(42)
+    with Session() as db:
+        for start in range(0, PRODUCTS, INSERT_CHUNK):
+            db.execute(insert(Product), [
+                {
+                    "description": f"{rng.choice(KINDS)} {rng.choice(ADJECTIVES)} {rng.choice(COLORS)} {i}",
+                    "sale_value": round(rng.uniform(10, 500), 2),
+                    "barcode": f"B{i:012d}",
+                    "section": rng.choice(["Masculino", "Feminino", "Infantil"]),
+                    "initial_stock": 10,
+                    "current_stock": 10,
+                }
+                for i in range(start, min(start + INSERT_CHUNK, PRODUCTS))
+            ])
+            db.commit()
+
+
+def measure(Session, run, queries: int):
+    samples = []
+    with Session() as db:
+        for i in range(queries):
+            start = time.perf_counter()
+            run(db, SEARCHES[i % len(SEARCHES)])
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def ilike(db, q):
+    # Filtro antigo (_apply_product_filters): uma única substring, sem acentos nem ranking
+    return db.query(Product).filter(Product.description.ilike(f"%{q}%")).order_by(Product.id).limit(10).all()
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    start = time.perf_counter()
+    populate(Session)
+    print(f"{PRODUCTS} produtos inseridos (com índice de busca) em {time.perf_counter() - start:.1f}s")
+
+    p50, p95 = measure(Session, lambda db, q: search_products(db, q, limit=10), QUERIES)
+    print(f"/products/search:     p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+    p50, p95 = measure(Session, ilike, max(1, QUERIES // 10))
+    print(f"ILIKE '%termo%':      p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
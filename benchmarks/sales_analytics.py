@@ -0,0 +1,120 @@
+# benchmarks/sales_analytics.py
+"""
+Relatórios de vendas (GET /analytics/sales) sobre BENCH_ORDERS pedidos
+espalhados por BENCH_YEARS anos (padrão: 300 mil pedidos, 3 anos, ~3 itens
+cada). Compara, para o período inteiro e cada agrupamento, a agregação direta
+sobre orders e order_products com a leitura dos rollups, e mede a carga
+completa e uma rodada incremental depois de BENCH_NEW_ORDERS pedidos novos.
+
+Uso:
+    python -m benchmarks.sales_analytics
+"""
+import os
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import distinct, func, insert, select
+
+from app.models import Client, Order, OrderProduct, Product
+from app.sales_rollup import rebuild_sales_rollups, record_order_changes, refresh_sales_rollups
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+ORDERS = int(os.getenv("BENCH_ORDERS", "300000"))
+YEARS = int(os.getenv("BENCH_YEARS", "3"))
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "2000"))
+NEW_ORDERS = int(os.getenv("BENCH_NEW_ORDERS", "500"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20"))
+
+START = date(2023, 1, 1)
+
+
+def insert_orders(db, rng, count: int, first_day: date, days: int):
+    prices = {pid: round(rng.uniform(10, 300), 2) for pid in range(1, PRODUCTS + 1)}
+    order_ids = db.scalars(insert(Order).returning(Order.id, sort_by_parameter_order=True), [
+        {
+            "client_id": 1, "status": rng.choice(["delivered", "delivered", "delivered", "cancelled"]), "total_value": 0.0,
+            "order_date": datetime.combine(first_day, datetime.min.time()) + timedelta(minutes=rng.randint(0, days * 1440 - 1)),
+        }
+        for _ in range(count)
+    ]).all()
+    lines = []
+    for order_id in order_ids:
+        for pid in rng.sample(range(1, PRODUCTS + 1), rng.randint(1, 5)):
+            lines.append({"order_id": order_id, "product_id": pid, "quantity": rng.randint(1, 4), "price_at_order": prices[pid]})
+    db.execute(insert(OrderProduct.__table__), lines)
+    return order_ids
+
+
+def populate(Session):
+    rng = random.Random(24)
+    with Session() as db:
+        db.execute(insert(Client.__table__), [{"nome": "Cliente", "email": "c@bench.com", "cpf": "00000000000"}])
+        db.execute(insert(Product.__table__), [
+            {"description": f"Produto {i}", "sale_value": 10.0, "section": f"Seção {i % 20}", "initial_stock": 10, "current_stock": 10}
+            for i in range(PRODUCTS)
+        ])
+        for offset in range(0, ORDERS, 50_000):
+            insert_orders(db, rng, min(50_000, ORDERS - offset), START, YEARS * 365)
+        db.commit()
+
+
+def p50(fn, rounds: int = ROUNDS) -> str:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return f"p50 {statistics.median(samples) * 1000:9.2f} ms"
+
+
+def raw_query(group_by: str):
+    key = {
+        "day": func.date(Order.order_date),
+        "section": Product.section,
+        "product": OrderProduct.product_id,
+    }[group_by]
+    stmt = (
+        select(key, func.count(distinct(Order.id)), func.sum(OrderProduct.quantity), func.sum(OrderProduct.quantity * OrderProduct.price_at_order))
+        .join(OrderProduct, OrderProduct.order_id == Order.id)
+        .where(Order.status != "cancelled", Order.order_date >= datetime(START.year, 1, 1))
+        .group_by(key)
+    )
+    if group_by == "section":
+        stmt = stmt.join(Product, Product.id == OrderProduct.product_id)
+    return stmt
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    populate(Session)
+    with Session() as db:
+        start = time.perf_counter()
+        days = rebuild_sales_rollups(db)
+        rebuild = time.perf_counter() - start
+    client = admin_client(Session)
+    end = START + timedelta(days=YEARS * 365 - 1)
+
+    print(f"{ORDERS} pedidos em {YEARS} anos, {PRODUCTS} produtos (carga completa: {days} dias em {rebuild:.1f} s):")
+    for group_by in ("day", "section", "product"):
+        def raw():
+            with Session() as db:
+                db.execute(raw_query(group_by)).all()
+        params = {"group_by": group_by, "start_date": START.isoformat(), "end_date": end.isoformat()}
+        print(f"  {group_by:8} agregando orders:     {p50(raw, 3)}")
+        print(f"  {group_by:8} GET /analytics/sales: {p50(lambda: client.get('/analytics/sales', params=params))}")
+
+    with Session() as db:
+        order_ids = insert_orders(db, random.Random(1), NEW_ORDERS, end - timedelta(days=1), 2)
+        record_order_changes(db, order_ids)
+        db.commit()
+        start = time.perf_counter()
+        refreshed = refresh_sales_rollups(db)
+        incremental = time.perf_counter() - start
+    print(f"  rodada incremental após {NEW_ORDERS} pedidos novos: {refreshed} dia(s) em {incremental * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/stock_alerts.py
+"""
+GET /products/alerts em um catálogo de BENCH_PRODUCTS produtos (padrão: 500
+mil, ~0,5% com estoque baixo e ~1% vencendo no próximo mês) contra a consulta
+antiga, que filtra products por current_stock e expiration_date sem índice e
+lê a tabela inteira. Mede também o custo que o razão acrescenta a
+POST /orders.
+
+Uso:
+    python -m benchmarks.stock_alerts
+"""
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, or_
+
+from app.models import Client, Product
+from app.stock_ledger import LOW_STOCK_THRESHOLD, rebuild_low_stock
+from benchmarks.common import admin_client, make_engine, reset_schema
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "500000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "50"))
+
+
+def populate(Session):
+    rng = random.Random(5)
+    today = date.today()
+    with Session() as db:
+        for start in range(0, PRODUCTS, 50_000):
+            db.execute(insert(Product.__table__), [
+                {
+                    "description": f"Produto {i}", "sale_value": 10.0, "barcode": f"A{i}", "section": "bench", "initial_stock": 100,
+                    "current_stock": rng.randint(0, LOW_STOCK_THRESHOLD) if rng.random() < 0.005 else rng.randint(LOW_STOCK_THRESHOLD + 1, 100),
+                    "expiration_date": today + timedelta(days=rng.randint(0, 30) if rng.random() < 0.01 else rng.randint(31, 900)),
+                }
+                for i in range(start, min(start + 50_000, PRODUCTS))
+            ])
+        db.add(Client(nome="Bench", email="bench@bench.com", cpf="11144477735"))
+        db.commit()
+        rebuild_low_stock(db)
+
+
+def timed(fn, rounds: int = ROUNDS) -> str:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return f"p50 {statistics.median(samples) * 1000:8.2f} ms"
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    populate(Session)
+    horizon = date.today() + timedelta(days=30)
+
+    def full_scan():
+        with Session() as db:
+            db.query(Product).filter(or_(
+                Product.current_stock + 0 <= LOW_STOCK_THRESHOLD, # "+ 0" e coalesce: sem índice, como antes do razão
+                func.coalesce(Product.expiration_date, Product.expiration_date) <= horizon,
+            )).all()
+
+    print(f"{PRODUCTS} produtos:")
+    print(f"  varredura de products:        {timed(full_scan, 3)}")
+    client = admin_client(Session)
+    print(f"  GET /products/alerts:         {timed(lambda: client.get('/products/alerts', params={'limit': 100}))}")
+
+    with Session() as db:
+        ids = [row.id for row in db.query(Product.id).filter(Product.current_stock > 50).limit(ROUNDS * 5)]
+        client_id = db.query(Client.id).scalar()
+    orders = iter(ids)
+    print(f"  POST /orders (5 itens, com razão): {timed(lambda: client.post('/orders/', json={'client_id': client_id, 'products': [{'product_id': next(orders), 'quantity': 1} for _ in range(5)]}))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/whatsapp_outbox.py
+"""
+Vazão sustentada da fila de WhatsApp (app/whatsapp_outbox.py): enfileira
+BENCH_MESSAGES mensagens e mede o tempo até o pool de workers enviá-las todas
+para uma Z-API falsa local (benchmarks/mock_zapi.py), para diferentes números
+de workers.
+
+Uso:
+    MOCK_ZAPI_LATENCY_MS=50 python -m benchmarks.whatsapp_outbox
+"""
+import asyncio
+import os
+import time
+
+from sqlalchemy import func, insert, select
+
+from app.models import WhatsAppLog
+from app.whatsapp_outbox import STATUS_QUEUED, STATUS_SENT, WhatsAppOutbox, utcnow
+from app.zapi import ZAPIClient
+from benchmarks.common import async_sessions, make_engine, reset_schema
+from benchmarks.mock_zapi import serve_in_thread
+
+MESSAGES = int(os.getenv("BENCH_MESSAGES", "2000"))
+WORKERS = [int(n) for n in os.getenv("BENCH_WORKERS", "1,2,4,8").split(",")]
+BATCH = int(os.getenv("BENCH_BATCH", "10"))
+
+
+async def drain(AsyncSession, base_url: str, workers: int):
+    zapi = ZAPIClient(base_url=base_url, instance_id="i", token="t", max_connections=workers * BATCH, max_concurrency=workers * BATCH)
+    outbox = WhatsAppOutbox(workers=workers, batch_size=BATCH, poll_interval=0.05)
+    start = time.perf_counter()
+    outbox.start(AsyncSession, zapi)
+    try:
+        while True:
+            async with AsyncSession() as db:
+                sent = await db.scalar(select(func.count()).where(WhatsAppLog.status == STATUS_SENT))
+            if sent >= MESSAGES:
+                return time.perf_counter() - start, outbox.stats()
+            await asyncio.sleep(0.05)
+    finally:
+        await outbox.stop()
+        await zapi.aclose()
+
+
+def main():
+    base_url = serve_in_thread()
+    engine = make_engine()
+    print(f"{engine.dialect.name}: {MESSAGES} mensagens, lote de {BATCH}, Z-API falsa em {base_url}")
+    for workers in WORKERS:
+        Session = reset_schema(engine)
+        now = utcnow()
+        with Session() as db:
+            db.execute(insert(WhatsAppLog), [
+                {"phone_number": f"55119{i:08d}", "message": f"Mensagem {i}", "status": STATUS_QUEUED, "next_attempt_at": now}
+                for i in range(MESSAGES)
+            ])
+            db.commit()
+        elapsed, stats = asyncio.run(drain(async_sessions(Session), base_url, workers))
+        print(f"  {workers:2} workers: {MESSAGES / elapsed:8.0f} msg/s ({elapsed:.1f} s, erros de banco: {stats['errors']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/whatsapp_retention.py
+"""
+Log de WhatsApp com BENCH_ROWS linhas (padrão: 10 milhões): latência da busca
+por telefone (exata e por prefixo, via índice) contra o antigo LIKE '%...%',
+e tempo por lote da compactação e do expurgo (app/whatsapp_retention.py).
+
+Uso:
+    python -m benchmarks.whatsapp_retention
+    BENCH_ROWS=500000 python -m benchmarks.whatsapp_retention   # execução rápida
+"""
+import json
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from sqlalchemy import insert, select
+
+from app.models import WhatsAppLog
+from app.phone import phone_prefix_range
+from app.whatsapp_outbox import utcnow
+from app.whatsapp_retention import compact_responses, purge_logs
+from benchmarks.common import make_engine, reset_schema
+
+ROWS = int(os.getenv("BENCH_ROWS", "10000000"))
+INSERT_CHUNK = 50_000
+LOOKUPS = int(os.getenv("BENCH_LOOKUPS", "200"))
+BATCH = int(os.getenv("BENCH_BATCH", "5000"))
+DDDS = ["11", "19", "21", "31", "41", "51", "61", "71", "81", "91"]
+
+
+def phone(i: int) -> str:
+    return f"55{DDDS[i % len(DDDS)]}9{i:08d}"
+
+
+def populate(Session):
+    now = utcnow()
+    response = json.dumps({"zaapId": "0" * 32, "messageId": "0" * 32, "id": "0" * 32})
+    with Session() as db:
+        for start in range(0, ROWS, INSERT_CHUNK):
+            db.execute(insert(WhatsAppLog), [
+                {
+                    "phone_number": phone(i),
+                    "message": "Seu pedido foi enviado!",
+                    "status": "sent",
+                    # Espalhados pelos últimos 180 dias
+                    "sent_at": now - timedelta(seconds=int(180 * 86400 * i / ROWS)),
+                    "response_data": response,
+                }
+                for i in range(start, min(start + INSERT_CHUNK, ROWS))
+            ])
+            db.commit()
+
+
+def timed(Session, build) -> float:
+    samples = []
+    with Session() as db:
+        for _ in range(LOOKUPS):
+            stmt = build(random.randrange(ROWS))
+            start = time.perf_counter()
+            db.execute(stmt.order_by(WhatsAppLog.id).limit(10)).all()
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def prefix_stmt(i: int):
+    lower, upper = phone_prefix_range(phone(i)[:6])
+    return select(WhatsAppLog).where(WhatsAppLog.phone_number >= lower, WhatsAppLog.phone_number < upper)
+
+
+def main():
+    engine = make_engine()
+    Session = reset_schema(engine)
+    start = time.perf_counter()
+    populate(Session)
+    print(f"{ROWS} linhas inseridas em {time.perf_counter() - start:.1f}s")
+
+    print(f"busca exata (índice):       {timed(Session, lambda i: select(WhatsAppLog).where(WhatsAppLog.phone_number == phone(i))):.3f} ms")
+    print(f"busca por prefixo (índice): {timed(Session, prefix_stmt):.3f} ms")
+    global LOOKUPS
+    LOOKUPS = max(1, LOOKUPS // 20) # O LIKE varre a tabela: poucas amostras bastam
+    print(f"LIKE '%...%' (antigo):      {timed(Session, lambda i: select(WhatsAppLog).where(WhatsAppLog.phone_number.contains(phone(i)[4:]))):.3f} ms")
+
+    now = utcnow()
+    with Session() as db:
+        start = time.perf_counter()
+        compacted = compact_responses(db, now - timedelta(days=30), batch_size=BATCH, pause=0)
+        elapsed = time.perf_counter() - start
+        print(f"compactação: {compacted} linhas em {elapsed:.1f}s ({elapsed / max(1, compacted / BATCH) * 1000:.1f} ms/lote de {BATCH})")
+        start = time.perf_counter()
+        purged = purge_logs(db, now - timedelta(days=90), batch_size=BATCH, pause=0)
+        elapsed = time.perf_counter() - start
+        print(f"expurgo:     {purged} linhas em {elapsed:.1f}s ({elapsed / max(1, purged / BATCH) * 1000:.1f} ms/lote de {BATCH})")
+
+
+if __name__ == "__main__":
+    main()
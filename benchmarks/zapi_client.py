@@ -0,0 +1,69 @@
+# benchmarks/zapi_client.py
+"""
+Vazão (mensagens/s) e latência (p50/p99) do envio para uma Z-API falsa local
+(benchmarks/mock_zapi.py) com latência fixa, isolando o cliente HTTP (sem a
+gravação do log, que no SQLite domina o tempo):
+
+- antes: requests.post sem sessão (conexão nova por mensagem) em uma thread do
+  threadpool, como a rota def antiga era executada pelo FastAPI;
+- depois: ZAPIClient.send_text, o cliente httpx compartilhado (app/zapi.py).
+
+Uso:
+    MOCK_ZAPI_LATENCY_MS=50 python -m benchmarks.zapi_client
+"""
+import asyncio
+import os
+import statistics
+import time
+
+import requests
+from starlette.concurrency import run_in_threadpool
+
+from app.zapi import ZAPIClient, ZAPI_MAX_CONCURRENCY
+from benchmarks.mock_zapi import serve_in_thread
+
+MESSAGES = int(os.getenv("BENCH_MESSAGES", "2000"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", str(ZAPI_MAX_CONCURRENCY)))
+
+
+def legacy_send(base_url: str, phone: str, message: str) -> dict:
+    response = requests.post(f"{base_url}/instances/i/token/t/send-text", json={"phone": phone, "message": message})
+    response.raise_for_status()
+    return response.json()
+
+
+async def run(send):
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await send(f"55119{i:08d}", f"Mensagem {i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(MESSAGES)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return MESSAGES / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def main():
+    base_url = serve_in_thread()
+    print(f"{MESSAGES} mensagens, {CONCURRENCY} simultâneas, Z-API falsa em {base_url}")
+
+    async def before(phone, message):
+        return await run_in_threadpool(legacy_send, base_url, phone, message)
+
+    zapi = ZAPIClient(base_url=base_url, instance_id="i", token="t", max_connections=CONCURRENCY, max_concurrency=CONCURRENCY)
+    try:
+        for label, send in (("antes (requests)", before), ("depois (httpx pool)", zapi.send_text)):
+            rate, p50, p99 = await run(send)
+            print(f"  {label:20} {rate:8.0f} msg/s  p50={p50:8.1f} ms  p99={p99:8.1f} ms")
+    finally:
+        await zapi.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+# benchmarks/zapi_outage.py
+"""
+Comportamento da fila de WhatsApp durante uma queda da Z-API, com e sem
+circuit breaker: BENCH_MESSAGES mensagens são enfileiradas e, depois de
+BENCH_OUTAGE_START segundos, a Z-API falsa (benchmarks/mock_zapi.py) passa a
+responder 503 (ou a não responder, com BENCH_OUTAGE_MODE=hang) por
+BENCH_OUTAGE_SECONDS segundos.
+
+Mede quantas chamadas chegaram à Z-API durante a queda, quantos eventos iriam
+para o Sentry (e quantos foram suprimidos) e o tempo total até tudo ser enviado.
+
+Uso:
+    python -m benchmarks.zapi_outage
+"""
+import asyncio
+import os
+import time
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from app.error_reporting import ErrorReporter
+from app.models import WhatsAppLog
+from app import whatsapp_outbox
+from app.whatsapp_outbox import STATUS_QUEUED, STATUS_SENT, WhatsAppOutbox, utcnow
+from app.zapi import CircuitBreaker, ZAPIClient
+from benchmarks.common import async_sessions, make_engine, reset_schema
+from benchmarks.mock_zapi import serve_in_thread
+
+MESSAGES = int(os.getenv("BENCH_MESSAGES", "1000"))
+WORKERS = int(os.getenv("BENCH_WORKERS", "4"))
+OUTAGE_START = float(os.getenv("BENCH_OUTAGE_START", "1"))
+OUTAGE_SECONDS = float(os.getenv("BENCH_OUTAGE_SECONDS", "5"))
+OUTAGE_MODE = os.getenv("BENCH_OUTAGE_MODE", "error")
+
+
+async def scenario(AsyncSession, base_url: str, breaker: CircuitBreaker):
+    control = httpx.AsyncClient(base_url=base_url)
+    await control.put("/_faults", json={"error_rate": 0, "hang_rate": 0})
+    zapi = ZAPIClient(base_url=base_url, instance_id="i", token="t", read_timeout=1, breaker=breaker)
+    # Retries curtos para o benchmark caber em segundos; tentativas suficientes para atravessar a queda
+    outbox = WhatsAppOutbox(workers=WORKERS, max_attempts=50, poll_interval=0.05, backoff_base=0.2, backoff_max=2)
+    reporter = ErrorReporter(window_seconds=60, repeat_sample_rate=0.01)
+    whatsapp_outbox.error_reporter = reporter
+
+    start = time.perf_counter()
+    outbox.start(AsyncSession, zapi)
+    try:
+        await asyncio.sleep(OUTAGE_START)
+        before = (await control.get("/_stats")).json()["requests"]
+        fault = {"hang_rate": 1} if OUTAGE_MODE == "hang" else {"error_rate": 1}
+        await control.put("/_faults", json=fault)
+        await asyncio.sleep(OUTAGE_SECONDS)
+        await control.put("/_faults", json={"error_rate": 0, "hang_rate": 0})
+        during = (await control.get("/_stats")).json()["requests"] - before
+        while True:
+            async with AsyncSession() as db:
+                sent = await db.scalar(select(func.count()).where(WhatsAppLog.status == STATUS_SENT))
+            if sent >= MESSAGES:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+    finally:
+        await outbox.stop()
+        await zapi.aclose()
+        await control.aclose()
+    return during, reporter.stats(), zapi.stats(), elapsed
+
+
+def main():
+    base_url = serve_in_thread()
+    engine = make_engine()
+    print(f"{engine.dialect.name}: {MESSAGES} mensagens, {WORKERS} workers, queda ({OUTAGE_MODE}) de {OUTAGE_SECONDS:.0f}s")
+    for label, breaker in (
+        ("sem breaker", CircuitBreaker(failure_rate=0)),
+        ("com breaker", CircuitBreaker(failure_rate=0.5, window=20, min_calls=10, open_seconds=1, half_open_probes=3)),
+    ):
+        Session = reset_schema(engine)
+        now = utcnow()
+        with Session() as db:
+            db.execute(insert(WhatsAppLog), [
+                {"phone_number": f"55119{i:08d}", "message": f"Mensagem {i}", "status": STATUS_QUEUED, "next_attempt_at": now}
+                for i in range(MESSAGES)
+            ])
+            db.commit()
+        during, reports, zapi_stats, elapsed = asyncio.run(scenario(async_sessions(Session), base_url, breaker))
+        print(
+            f"  {label}: {during:5} chamadas durante a queda, sentry {reports['reported']} enviados / "
+            f"{reports['suppressed']} suprimidos, breaker aberto {zapi_stats['breaker_opened']}x, "
+            f"limite final {zapi_stats['concurrency_limit']}, tudo enviado em {elapsed:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,48 @@
 # tests/conftest.py
+import os
+import tempfile
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from fastapi.testclient import TestClient
 
+# Os workers da fila de WhatsApp usariam o banco real da aplicação (não o de teste);
+# os testes acionam a fila explicitamente via WhatsAppOutbox.process_batch.
+os.environ.setdefault("WHATSAPP_WORKERS", "0")
+# Idem para o job dos rollups de vendas: os testes chamam refresh_sales_rollups diretamente.
+os.environ.setdefault("SALES_ROLLUP_INTERVAL_SECONDS", "0")
+# E para a retomada de campanhas no startup: os testes chamam resume_campaigns diretamente.
+os.environ.setdefault("BROADCAST_RESUME_ON_STARTUP", "0")
+
 # Importe Base e get_db do seu app.database
-from app.database import Base, get_db
+from app.database import Base, get_db, get_async_db, get_async_sessionmaker
 # Seu aplicativo FastAPI
 from app.main import app
 # IMPORTANTE: Importe todos os seus modelos para que Base.metadata os encontre
 from app import models
 # Importe o get_password_hash de onde ele está (assumindo app.auth)
 from app.auth import get_password_hash
-
-# Use um banco de dados SQLite em memória para testes (mais rápido e isolado)
-# Usar ":memory:" é o mais isolado para testes, pois cada teste tem seu próprio DB.
-# Se você usar um arquivo .db, ele precisa ser limpo entre os testes.
-TEST_SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:" # Mude para ":memory:" para maior isolamento entre execuções
+from app.users import principal_cache
+from app.product_cache import product_cache
+from app.barcode_index import barcode_index
+
+# Banco SQLite em arquivo temporário, compartilhado pelo engine síncrono (rotas def)
+# e pelo engine assíncrono (rotas async def, via aiosqlite). Um banco ":memory:" não
+# pode ser visto pelos dois drivers, então o isolamento entre testes é feito
+# apagando todas as tabelas ao final de cada teste.
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+TEST_SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
+TEST_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DB_PATH}"
 
 # Setup do engine de teste para o banco de dados
 engine_test = create_engine(
     TEST_SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+# NullPool: cada TestClient roda em um event loop próprio, então conexões assíncronas não são reaproveitadas
+async_engine_test = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+AsyncTestSession = async_sessionmaker(async_engine_test, autoflush=False, expire_on_commit=False)
 
 # Fixture para configurar e limpar o banco de dados antes e depois da sessão de testes
 @pytest.fixture(scope="session", autouse=True)
@@ -32,29 +53,40 @@ def setup_all_tables():
     """
     # Garante que todos os modelos são carregados para que Base.metadata os conheça
     _ = models.User, models.Client, models.Product, models.Order, models.OrderProduct, models.WhatsAppLog
-    print("\n--- Criando tabelas do banco de dados em memória ---")
+    print("\n--- Criando tabelas do banco de dados de teste ---")
     Base.metadata.create_all(bind=engine_test)
     yield
-    print("--- Descartando tabelas do banco de dados em memória ---")
+    print("--- Descartando tabelas do banco de dados de teste ---")
     Base.metadata.drop_all(bind=engine_test)
+    engine_test.dispose()
 
 # Fixture que fornece uma sessão de banco de dados para cada teste
 # Renomeado de 'test_db_session' para 'db_session' para corresponder aos testes
 @pytest.fixture(scope="function", name="db_session")
 def db_session_fixture():
     """
-    Fornece uma sessão de banco de dados para cada teste,
-    garantindo um estado limpo e transacional.
+    Fornece uma sessão de banco de dados para cada teste e,
+    ao final, apaga os dados de todas as tabelas para o próximo teste.
     """
-    connection = engine_test.connect()
-    transaction = connection.begin()
-    db = sessionmaker(autocommit=False, autoflush=False, bind=connection)()
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)()
     try:
         yield db
     finally:
+        db.rollback()
         db.close()
-        transaction.rollback() # Desfaz as alterações do teste
-        connection.close()
+        with engine_test.begin() as connection: # Desfaz as alterações do teste
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
+
+# Engine assíncrono de teste (para testes que inspecionam as consultas das rotas async def)
+@pytest.fixture(scope="session", name="async_db_engine")
+def async_db_engine_fixture():
+    return async_engine_test
+
+# Fábrica de sessões assíncronas de teste (para código fora das rotas, como os workers da fila de WhatsApp)
+@pytest.fixture(scope="session", name="async_session_factory")
+def async_session_factory_fixture():
+    return AsyncTestSession
 
 # Fixture para o TestClient FastAPI genérico
 # Renomeado de 'client_fixture' para 'client' para corresponder aos testes
@@ -66,7 +98,16 @@ def client_fixture(db_session: Session): # Use db_session aqui
     def override_get_db():
         yield db_session
 
+    async def override_get_async_db():
+        async with AsyncTestSession() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: AsyncTestSession
+    principal_cache.clear() # Tokens idênticos entre testes não devem reaproveitar usuários de outro teste
+    product_cache.clear() # Os ids são reaproveitados depois que as tabelas são esvaziadas
+    barcode_index.clear()
     with TestClient(app) as test_client_instance:
         yield test_client_instance
     app.dependency_overrides.clear() # Limpar overrides após o teste
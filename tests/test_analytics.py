@@ -0,0 +1,109 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+from starlette.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models import Client, Order, OrderProduct, Product, SalesDaily, SalesDailyProduct, SalesDailySection, SalesMonthlyProduct
+from app.sales_rollup import record_order_changes, refresh_sales_rollups
+
+
+def _raw_sales(db: Session, start: date, end: date):
+    """
+    Reference aggregates computed in Python straight from orders and order_products.
+    """
+    totals = {"day": defaultdict(lambda: [set(), 0, 0.0]), "section": defaultdict(lambda: [set(), 0, 0.0]), "product": defaultdict(lambda: [set(), 0, 0.0])}
+    for order in db.query(Order).filter(Order.status != "cancelled").all():
+        day = order.order_date.date()
+        if not start <= day <= end:
+            continue
+        for line in order.order_products:
+            for group, key in (("day", day), ("section", line.product.section), ("product", line.product_id)):
+                entry = totals[group][key]
+                entry[0].add(order.id)
+                entry[1] += line.quantity
+                entry[2] += line.quantity * line.price_at_order
+    return {group: {key: (len(ids), items, pytest.approx(revenue)) for key, (ids, items, revenue) in rows.items()} for group, rows in totals.items()}
+
+
+def _report(client: TestClient, group_by: str, start: date, end: date):
+    response = client.get("/analytics/sales", params={"group_by": group_by, "start_date": start.isoformat(), "end_date": end.isoformat()})
+    assert response.status_code == 200, response.text
+    key = {"day": "day", "section": "section", "product": "product_id"}[group_by]
+    return {
+        (date.fromisoformat(row[key]) if group_by == "day" else row[key]): (row["order_count"], row["items_sold"], row["revenue"])
+        for row in response.json()["rows"]
+    }
+
+
+def test_sales_rollups_match_raw_aggregates(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    client = Client(nome="Cliente Vendas", email="vendas@example.com", cpf="12345678904", created_by_user_id=1)
+    camisa = Product(description="Camisa", sale_value=50.0, barcode="V1", section="Roupas", initial_stock=100, current_stock=100)
+    calca = Product(description="Calça", sale_value=90.0, barcode="V2", section="Roupas", initial_stock=100, current_stock=100)
+    bone = Product(description="Boné", sale_value=25.5, barcode="V3", section="Acessórios", initial_stock=100, current_stock=100)
+    db_session.add_all([client, camisa, calca, bone])
+    db_session.commit()
+
+    # Histórico em vários meses (bordas de mês incluídas), gravado direto no banco
+    history = []
+    for when, lines in [
+        (datetime(2023, 1, 15, 10), {camisa.id: 2, bone.id: 1}),
+        (datetime(2023, 1, 31, 23), {calca.id: 1}),
+        (datetime(2023, 2, 10, 9), {camisa.id: 1, calca.id: 2}),
+        (datetime(2023, 2, 10, 18), {bone.id: 4}),
+        (datetime(2023, 3, 1, 0, 30), {camisa.id: 3}),
+        (datetime(2023, 3, 20, 12), {calca.id: 1, bone.id: 2}),
+    ]:
+        prices = {camisa.id: 48.0, calca.id: 85.0, bone.id: 20.0}
+        order = Order(client_id=client.id, status="delivered", order_date=when, total_value=sum(q * prices[p] for p, q in lines.items()))
+        order.order_products = [OrderProduct(product_id=p, quantity=q, price_at_order=prices[p]) for p, q in lines.items()]
+        history.append(order)
+    db_session.add_all(history)
+    db_session.flush()
+    record_order_changes(db_session, [order.id for order in history])
+    db_session.commit()
+
+    # Pedidos de hoje pela API: criação, lote, cancelamento e exclusão de um pedido ativo
+    def create_order(lines):
+        response = auth_admin_client.post("/orders/", json={"client_id": client.id, "products": [{"product_id": p, "quantity": q} for p, q in lines]})
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    create_order([(camisa.id, 1), (bone.id, 2)])
+    cancelled = create_order([(calca.id, 3)])
+    deleted = create_order([(camisa.id, 5)])
+    assert auth_admin_client.post("/orders/bulk", json=[
+        {"client_id": client.id, "products": [{"product_id": calca.id, "quantity": 1}]},
+        {"client_id": client.id, "products": [{"product_id": bone.id, "quantity": 1}, {"product_id": camisa.id, "quantity": 2}]},
+    ]).json()["created"] == 2
+    assert auth_admin_client.put(f"/orders/{cancelled}/status", json={"status": "cancelled"}).status_code == 200
+    assert auth_admin_client.delete(f"/orders/{deleted}").status_code == 204
+
+    assert refresh_sales_rollups(db_session) == 6 # 5 dias do histórico + hoje
+
+    start, end = date(2023, 1, 1), date.today() + timedelta(days=1)
+    raw = _raw_sales(db_session, start, end)
+    assert {row.day: (row.order_count, row.items_sold, row.revenue) for row in db_session.query(SalesDaily)} == raw["day"]
+    assert sum(row.revenue for row in db_session.query(SalesDailySection)) == pytest.approx(sum(row.revenue for row in db_session.query(SalesDaily)))
+    assert sum(row.items_sold for row in db_session.query(SalesMonthlyProduct)) == sum(row.items_sold for row in db_session.query(SalesDailyProduct))
+    for group_by in ("day", "section", "product"):
+        assert _report(auth_admin_client, group_by, start, end) == raw[group_by]
+
+    # Período com meses inteiros (fevereiro, lido da soma mensal) e bordas parciais (dias)
+    for start, end in [(date(2023, 1, 20), date(2023, 3, 10)), (date(2023, 2, 1), date(2023, 2, 28)), (date(2023, 1, 31), date(2023, 2, 1))]:
+        raw = _raw_sales(db_session, start, end)
+        for group_by in ("day", "section", "product"):
+            assert _report(auth_admin_client, group_by, start, end) == raw[group_by]
+
+    # Cancelar um pedido antigo: só o dia dele é recalculado, e nada muda sem novas mudanças
+    assert auth_admin_client.put(f"/orders/{history[2].id}/status", json={"status": "cancelled"}).status_code == 200
+    assert refresh_sales_rollups(db_session) == 1
+    assert refresh_sales_rollups(db_session) == 0
+    start, end = date(2023, 1, 1), date.today() + timedelta(days=1)
+    raw = _raw_sales(db_session, start, end)
+    for group_by in ("day", "section", "product"):
+        assert _report(auth_admin_client, group_by, start, end) == raw[group_by]
+
+    report = auth_admin_client.get("/analytics/sales", params={"start_date": "2023-02-01", "end_date": "2023-01-01"})
+    assert report.status_code == 400
@@ -1,6 +1,10 @@
 # tests/test_auth.py
+import asyncio
+import threading
+
 import pytest
 from starlette.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from app.models import User # Importa o modelo User para validação no DB
 
@@ -74,4 +78,105 @@ def test_protected_route_invalid_token(client: TestClient):
     headers = {"Authorization": "Bearer invalid_token_xyz"}
     response = client.get("/clients", headers=headers)
     assert response.status_code == 401
-    assert response.json() == {"detail": "Could not validate credentials"} 
\ No newline at end of file
+    assert response.json() == {"detail": "Could not validate credentials"} 
+
+def test_principal_cache_hit_and_invalidation(auth_admin_client: TestClient, db_session: Session):
+    from app.users import principal_cache
+
+    auth_admin_client.get("/clients/")
+    hits_before = principal_cache.stats()["hits"]
+    response = auth_admin_client.get("/clients/")
+    assert response.status_code == 200
+    assert principal_cache.stats()["hits"] == hits_before + 1
+
+    metrics = auth_admin_client.get("/metrics/")
+    assert metrics.status_code == 200
+    assert metrics.json()["principal_cache"]["hits"] >= hits_before + 1
+
+    # Desativar o usuário invalida o cache: a próxima requisição volta ao banco e é recusada
+    admin = db_session.query(User).filter(User.email == "admin_test@example.com").first()
+    admin.is_active = False
+    db_session.commit()
+    response = auth_admin_client.get("/clients/")
+    assert response.status_code == 401
+
+
+
+def test_principal_lookup_releases_async_connection_before_sync_route(auth_admin_client: TestClient, db_session: Session, async_db_engine):
+    from app.users import principal_cache
+
+    events = []
+    listeners = [
+        (async_db_engine.sync_engine.pool, "checkout", lambda *args: events.append("async checkout")),
+        (async_db_engine.sync_engine.pool, "checkin", lambda *args: events.append("async checkin")),
+        (db_session.get_bind(), "before_cursor_execute", lambda *args: events.append("sync execute")),
+    ]
+    for target, name, fn in listeners:
+        event.listen(target, name, fn)
+    try:
+        # Falta no cache: a conexão assíncrona volta ao pool antes da primeira consulta da rota síncrona
+        principal_cache.clear()
+        assert auth_admin_client.get("/products/").status_code == 200
+        assert events[:3] == ["async checkout", "async checkin", "sync execute"]
+        assert events.count("async checkout") == 1
+
+        # Acerto no cache: nenhuma conexão do pool assíncrono
+        events.clear()
+        assert auth_admin_client.get("/products/").status_code == 200
+        assert "async checkout" not in events
+    finally:
+        for target, name, fn in listeners:
+            event.remove(target, name, fn)
+
+
+def test_login_rejected_when_hashing_queue_full(client: TestClient, clean_users_db, monkeypatch):
+    from app.auth import password_hasher
+
+    client.post("/auth/register", json={"email": "busy@example.com", "password": "busypassword"})
+    monkeypatch.setattr(password_hasher, "_pending", password_hasher.workers + password_hasher.max_queue)
+    rejected_before = password_hasher.rejected
+
+    response = client.post("/auth/login", json={"email": "busy@example.com", "password": "busypassword"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert password_hasher.rejected == rejected_before + 1
+
+
+def test_password_hashing_p99_with_few_samples():
+    from app.auth import PasswordHasherPool
+
+    pool = PasswordHasherPool(workers=1, max_queue=1)
+    pool._latencies_ms.extend(float(ms) for ms in range(1, 11))
+    assert pool.stats()["latency_ms_p99"] == 10.0 # Com menos de 100 amostras, o p99 é o maior valor
+    pool._latencies_ms.extend(float(ms) for ms in range(11, 201))
+    assert pool.stats()["latency_ms_p99"] == 198.0
+
+
+def test_password_hashing_counts_jobs_of_cancelled_requests():
+    from app.auth import PasswordHasherPool, PasswordHashingBusy
+
+    pool = PasswordHasherPool(workers=1, max_queue=1)
+    release = threading.Event()
+
+    def slow_hash():
+        release.wait(5)
+        return "hash"
+
+    async def run():
+        running = asyncio.create_task(pool.run(slow_hash))
+        queued = asyncio.create_task(pool.run(slow_hash))
+        await asyncio.sleep(0.05)
+        running.cancel() # Cliente desconectou: o bcrypt em execução não é interrompido
+        await asyncio.gather(running, return_exceptions=True)
+        stats = pool.stats()
+        assert stats["in_flight"] == 1 and stats["queue_depth"] == 1
+        with pytest.raises(PasswordHashingBusy):
+            await pool.run(slow_hash)
+        release.set()
+        assert await queued == "hash"
+
+    asyncio.run(run())
+    pool._executor.shutdown(wait=True)
+    stats = pool.stats()
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    assert stats["completed"] == 2 and stats["failed"] == 0
@@ -3,6 +3,7 @@ import pytest
 from starlette.testclient import TestClient
 from sqlalchemy.orm import Session
 from app.models import Client # Importe o modelo Client para manipulação do DB
+from app.pagination import encode_cursor
 
 # Os 'clean_clients_db' e 'db_session' já são injetados automaticamente pelo pytest
 # se estiverem no conftest.py e tiverem o escopo apropriado.
@@ -75,6 +76,53 @@ def test_list_clients_basic_pagination(auth_admin_client: TestClient, db_session
     assert response.status_code == 200
     assert len(response.json()) == 14 # Total de clientes
 
+def test_list_clients_cursor_pagination(auth_admin_client: TestClient, db_session: Session, clean_clients_db):
+    db_session.add_all(
+        Client(nome=f"Client {i}", email=f"cursor{i}@example.com", cpf=f"{20000000000 + i}", created_by_user_id=1)
+        for i in range(1, 8)
+    )
+    db_session.commit()
+
+    response = auth_admin_client.get("/clients/?limit=3")
+    assert [c["nome"] for c in response.json()] == ["Client 1", "Client 2", "Client 3"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    # Um cliente inserido no meio da navegação não desloca as páginas seguintes
+    db_session.add(Client(nome="Client 0", email="cursor0@example.com", cpf="20000000000", created_by_user_id=1))
+    db_session.commit()
+
+    response = auth_admin_client.get(f"/clients/?limit=3&cursor={cursor}")
+    assert [c["nome"] for c in response.json()] == ["Client 4", "Client 5", "Client 6"]
+
+    response = auth_admin_client.get(f"/clients/?limit=3&cursor={response.headers['X-Next-Cursor']}")
+    assert [c["nome"] for c in response.json()] == ["Client 7", "Client 0"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = auth_admin_client.get("/clients/?cursor=invalido")
+    assert response.status_code == 400
+
+    # Cursor forjado com tipos errados para a coluna: 400, não erro do banco
+    for forged in (["abc"], [True], [None], [1.5], [{"id": 1}], [2**70]):
+        response = auth_admin_client.get(f"/clients/?cursor={encode_cursor(forged)}")
+        assert response.status_code == 400, forged
+    response = auth_admin_client.get("/clients/?sort_by=lifetime_value&cursor=" + encode_cursor(["x", 1]))
+    assert response.status_code == 400
+
+def test_export_clients_csv(auth_admin_client: TestClient, db_session: Session, clean_clients_db):
+    db_session.add_all([
+        Client(nome="Alice", email="alice@example.com", cpf="11111111111", created_by_user_id=1),
+        Client(nome="Bob", email="bob@example.com", cpf="22222222222", created_by_user_id=1),
+    ])
+    db_session.commit()
+
+    response = auth_admin_client.get("/clients/export?format=csv&nome=ali")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("nome,email,cpf")
+    assert len(lines) == 2
+    assert "alice@example.com" in lines[1]
+
 def test_list_clients_filter_by_name(auth_admin_client: TestClient, db_session: Session, clean_clients_db):
     clients_to_add = [
         Client(nome="Alice", email="alice@example.com", cpf="11111111111", created_by_user_id=1),
@@ -196,4 +244,59 @@ def test_delete_client(auth_admin_client: TestClient, db_session: Session, clean
 def test_delete_non_existent_client(auth_admin_client: TestClient, clean_clients_db):
     response = auth_admin_client.delete("/clients/999")
     assert response.status_code == 404
-    assert response.json() == {"detail": "Cliente não encontrado"}  # Corrigido para português
\ No newline at end of file
+    assert response.json() == {"detail": "Cliente não encontrado"}  # Corrigido para português
+
+def test_client_order_stats(auth_admin_client: TestClient, db_session: Session, clean_clients_db):
+    from app.client_stats import find_drift, reconcile
+    from app.models import ClientOrderStats, Product
+
+    ana = auth_admin_client.post("/clients/", json={"nome": "Ana", "email": "ana@example.com", "cpf": "12345678901"}).json()["id"]
+    bia = auth_admin_client.post("/clients/", json={"nome": "Bia", "email": "bia@example.com", "cpf": "12345678902"}).json()["id"]
+    produto = Product(description="Blusa", sale_value=40.0, barcode="S1", section="A", initial_stock=100, current_stock=100)
+    db_session.add(produto)
+    db_session.commit()
+
+    assert auth_admin_client.get(f"/clients/{ana}").json()["order_stats"] == {"order_count": 0, "lifetime_value": 0.0, "last_order_date": None}
+
+    def order(client_id, quantity):
+        response = auth_admin_client.post("/orders/", json={"client_id": client_id, "products": [{"product_id": produto.id, "quantity": quantity}]})
+        assert response.status_code == 201
+        return response.json()
+
+    first = order(ana, 1)
+    second = order(ana, 2)
+    auth_admin_client.post("/orders/bulk", json=[
+        {"client_id": bia, "products": [{"product_id": produto.id, "quantity": 1}]},
+        {"client_id": bia, "products": [{"product_id": produto.id, "quantity": 1}]},
+        {"client_id": bia, "products": [{"product_id": produto.id, "quantity": 1}]},
+    ])
+    stats = auth_admin_client.get(f"/clients/{ana}").json()["order_stats"]
+    assert (stats["order_count"], stats["lifetime_value"]) == (2, 120.0)
+    assert stats["last_order_date"] is not None
+
+    by_value = auth_admin_client.get("/clients/", params={"sort_by": "lifetime_value"}).json()
+    assert [c["id"] for c in by_value] == [bia, ana] # 120 contra 120: desempate pelo id, decrescente
+    by_count = auth_admin_client.get("/clients/", params={"sort_by": "order_count", "limit": 1})
+    assert [c["id"] for c in by_count.json()] == [bia]
+    page = auth_admin_client.get("/clients/", params={"sort_by": "order_count", "cursor": by_count.headers["X-Next-Cursor"]}).json()
+    assert [c["id"] for c in page] == [ana]
+
+    # Cancelamento e exclusão saem dos agregados; mudar para outro status não mexe
+    auth_admin_client.put(f"/orders/{second['id']}/status", json={"status": "processing"})
+    auth_admin_client.put(f"/orders/{second['id']}/status", json={"status": "cancelled"})
+    auth_admin_client.delete(f"/orders/{second['id']}")
+    stats = auth_admin_client.get(f"/clients/{ana}").json()["order_stats"]
+    assert (stats["order_count"], stats["lifetime_value"]) == (1, 40.0)
+    auth_admin_client.delete(f"/orders/{first['id']}")
+    assert auth_admin_client.get(f"/clients/{ana}").json()["order_stats"] == {"order_count": 0, "lifetime_value": 0.0, "last_order_date": None}
+    assert [c["id"] for c in auth_admin_client.get("/clients/", params={"sort_by": "last_order_date"}).json()] == [bia]
+    assert find_drift(db_session) == []
+
+    # Divergência (escrita fora da API): a reconciliação relata e reconstrói
+    db_session.query(ClientOrderStats).filter(ClientOrderStats.client_id == bia).update({"order_count": 7})
+    db_session.query(ClientOrderStats).filter(ClientOrderStats.client_id == ana).delete()
+    db_session.commit()
+    drift = reconcile(db_session)
+    assert [(row["client_id"], row["stored_order_count"]) for row in drift] == [(ana, None), (bia, 7)]
+    assert find_drift(db_session) == []
+    assert auth_admin_client.get(f"/clients/{bia}").json()["order_stats"]["order_count"] == 3
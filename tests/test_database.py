@@ -0,0 +1,38 @@
+# tests/test_database.py
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from starlette.testclient import TestClient
+
+from app.db_pool import PoolStats, _timed_pool_class
+
+
+def test_pool_stats_track_checkouts_and_wait_time(tmp_path):
+    stats = PoolStats()
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=_timed_pool_class(QueuePool, stats),
+        pool_size=2,
+        max_overflow=0,
+    )
+    stats.attach(engine)
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("SELECT 1"))
+        second.execute(text("SELECT 1"))
+        assert stats.snapshot()["checked_out"] == 2
+
+    snapshot = stats.snapshot()
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checked_out"] == 0
+    assert snapshot["peak_checked_out"] == 2
+    assert snapshot["pool_size"] == 2
+    assert snapshot["idle"] == 2
+    assert stats.wait_count == 2
+    engine.dispose()
+
+
+def test_metrics_expose_pool_stats(auth_admin_client: TestClient):
+    response = auth_admin_client.get("/metrics/")
+    assert response.status_code == 200
+    assert "checked_out" in response.json()["db_pool"]
+    assert "checked_out" in response.json()["db_pool_async"]
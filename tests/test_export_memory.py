@@ -0,0 +1,58 @@
+# tests/test_export_memory.py
+import asyncio
+import os
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.export import ExportFormat
+from app.models import Client, Order, OrderProduct, Product
+from app.routers.orders import export_orders
+
+# Teste de memória da exportação em streaming. É lento (gera milhões de linhas),
+# então só roda quando EXPORT_RSS_ROWS é definido, por exemplo:
+#   EXPORT_RSS_ROWS=1000000 pytest tests/test_export_memory.py
+EXPORT_RSS_ROWS = int(os.getenv("EXPORT_RSS_ROWS", "0"))
+EXPORT_RSS_BUDGET_MB = int(os.getenv("EXPORT_RSS_BUDGET_MB", "64"))
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+@pytest.mark.skipif(not EXPORT_RSS_ROWS, reason="defina EXPORT_RSS_ROWS para rodar o teste de memória da exportação")
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="requer /proc (Linux)")
+def test_export_orders_memory_stays_flat(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    batch = 50_000
+    with Session() as db:
+        db.execute(insert(Client), [{"nome": "Cliente", "email": "c@example.com", "cpf": "0"}])
+        db.execute(insert(Product), [{"description": "Produto", "sale_value": 1.0, "section": "A", "initial_stock": 1, "current_stock": 1}])
+        for start in range(1, EXPORT_RSS_ROWS + 1, batch):
+            ids = range(start, min(start + batch, EXPORT_RSS_ROWS + 1))
+            db.execute(insert(Order), [{"id": i, "client_id": 1, "status": "pending", "total_value": 1.0} for i in ids])
+            db.execute(insert(OrderProduct), [{"order_id": i, "product_id": 1, "quantity": 1, "price_at_order": 1.0} for i in ids])
+        db.commit()
+
+    response = export_orders(
+        db=Session(), fmt=ExportFormat.ndjson, status_filter=None, client_id=None, start_date=None,
+        end_date=None, min_total_value=None, max_total_value=None, current_user={"is_admin": True},
+    )
+
+    async def consume():
+        baseline = current_rss_mb()
+        peak, lines = baseline, 0
+        async for chunk in response.body_iterator:
+            lines += 1
+            if lines % 10_000 == 0:
+                peak = max(peak, current_rss_mb())
+        return baseline, peak, lines
+
+    baseline, peak, lines = asyncio.run(consume())
+    assert lines == EXPORT_RSS_ROWS
+    assert peak - baseline < EXPORT_RSS_BUDGET_MB, f"RSS cresceu {peak - baseline:.1f} MB durante a exportação"
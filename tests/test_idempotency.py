@@ -0,0 +1,146 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from starlette.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import idempotency
+from app.idempotency import claim_key, request_hash, store_response, sweep_expired
+from app.auth import criar_token
+from app.models import Client, IdempotencyKey, Order, Product, StockMovement, User, WhatsAppLog
+from app.schemas import WhatsAppMessage
+from app.whatsapp_outbox import utcnow
+
+MESSAGE = {"phone_number": "5511999999999", "message": "Pedido enviado"}
+ADMIN_EMAIL = "admin_test@example.com" # Criado pela fixture admin_auth_headers
+
+
+def test_order_idempotency_key_replays_response(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    client = Client(nome="Cliente Retry", email="retry@example.com", cpf="12345678905", created_by_user_id=1)
+    camisa = Product(description="Camisa", sale_value=50.0, barcode="I1", section="A", initial_stock=10, current_stock=10)
+    db_session.add_all([client, camisa])
+    db_session.commit()
+    payload = {"client_id": client.id, "products": [{"product_id": camisa.id, "quantity": 3}]}
+    headers = {"Idempotency-Key": "pedido-1"}
+
+    first = auth_admin_client.post("/orders/", json=payload, headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    retry = auth_admin_client.post("/orders/", json=payload, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+    db_session.expire_all()
+    assert db_session.query(Order).count() == 1
+    assert db_session.get(Product, camisa.id).current_stock == 7 # Baixado uma vez só
+    assert db_session.query(StockMovement).filter(StockMovement.reason == "order").count() == 1
+
+    # Mesma chave, outro corpo: recusado
+    other = auth_admin_client.post("/orders/", json={**payload, "notes": "outro"}, headers=headers)
+    assert other.status_code == 422
+
+    # Requisição que falha libera a chave: o retry executa de novo
+    too_many = {"client_id": client.id, "products": [{"product_id": camisa.id, "quantity": 50}]}
+    assert auth_admin_client.post("/orders/", json=too_many, headers={"Idempotency-Key": "pedido-2"}).status_code == 400
+    assert db_session.query(IdempotencyKey).filter(IdempotencyKey.key == "pedido-2").count() == 0
+    # Sem a chave, cada requisição cria um pedido
+    assert auth_admin_client.post("/orders/", json=payload).status_code == 201
+    assert db_session.query(Order).count() == 2
+
+
+def _send_scope(db: Session, email: str = ADMIN_EMAIL) -> str:
+    return f"POST /whatsapp/send:{db.query(User.id).filter(User.email == email).scalar()}"
+
+
+def _processing_key(db: Session, key: str, locked_for: timedelta) -> IdempotencyKey:
+    row = IdempotencyKey(
+        scope=_send_scope(db), key=key, request_hash=request_hash(WhatsAppMessage(**MESSAGE)), token="outro-processo",
+        status="processing", locked_until=utcnow() + locked_for, expires_at=utcnow() + timedelta(days=1),
+    )
+    db.add(row)
+    db.commit()
+    return row
+
+
+def test_whatsapp_idempotency_key_waits_for_in_flight_request(auth_admin_client: TestClient, db_session: Session, monkeypatch):
+    client = auth_admin_client
+    first = client.post("/whatsapp/send", json=MESSAGE, headers={"Idempotency-Key": "msg-1"})
+    assert first.status_code == 202
+    retry = client.post("/whatsapp/send", json={**MESSAGE, "phone_number": "(55) 11 99999-9999"}, headers={"Idempotency-Key": "msg-1"})
+    assert retry.status_code == 202 and retry.json() == first.json() # Mesmo número após a normalização
+    assert db_session.query(WhatsAppLog).count() == 1
+
+    # Duplicata concorrente: espera a primeira requisição terminar e devolve a resposta dela
+    _processing_key(db_session, "msg-2", timedelta(minutes=1))
+
+    def finish_first_request():
+        with Session(db_session.get_bind()) as other:
+            other.execute(
+                update(IdempotencyKey).where(IdempotencyKey.key == "msg-2")
+                .values(status="completed", response_status=202, response_body='{"id": 999, "status": "queued"}')
+            )
+            other.commit()
+
+    timer = threading.Timer(0.3, finish_first_request)
+    timer.start()
+    waited = client.post("/whatsapp/send", json=MESSAGE, headers={"Idempotency-Key": "msg-2"})
+    timer.join()
+    assert waited.status_code == 202
+    assert waited.json() == {"id": 999, "status": "queued"}
+    assert db_session.query(WhatsAppLog).count() == 1
+
+    # Ainda em processamento depois da espera: 409
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    _processing_key(db_session, "msg-3", timedelta(minutes=1))
+    assert client.post("/whatsapp/send", json=MESSAGE, headers={"Idempotency-Key": "msg-3"}).status_code == 409
+
+    # Lease vencido (processo morreu no meio): a requisição assume a chave e enfileira
+    _processing_key(db_session, "msg-4", timedelta(seconds=-1))
+    assert client.post("/whatsapp/send", json=MESSAGE, headers={"Idempotency-Key": "msg-4"}).status_code == 202
+    assert db_session.query(WhatsAppLog).count() == 2
+
+
+def test_whatsapp_idempotency_keys_are_scoped_per_user(auth_admin_client: TestClient, db_session: Session):
+    db_session.add(User(email="outro@example.com", hashed_password="-", is_admin=False, is_active=True))
+    db_session.commit()
+    other_user = {"Authorization": f"Bearer {criar_token(data={'sub': 'outro@example.com'})}"}
+    headers = {"Idempotency-Key": "msg-1"}
+
+    first = auth_admin_client.post("/whatsapp/send", json=MESSAGE, headers=headers)
+    assert first.status_code == 202
+    # Outro usuário com a mesma chave e o mesmo corpo: enfileira a própria mensagem
+    second = auth_admin_client.post("/whatsapp/send", json=MESSAGE, headers={**headers, **other_user})
+    assert second.status_code == 202
+    assert "Idempotent-Replayed" not in second.headers and second.json()["id"] != first.json()["id"]
+    # ... e com outro corpo também não recebe 422 por causa da chave alheia
+    assert auth_admin_client.post("/whatsapp/send", json={**MESSAGE, "message": "Outra"}, headers={"Idempotency-Key": "msg-2", **other_user}).status_code == 202
+    assert auth_admin_client.post("/whatsapp/send", json=MESSAGE, headers={"Idempotency-Key": "msg-2"}).status_code == 202
+    assert db_session.query(WhatsAppLog).count() == 4
+
+    # Sem token não há a quem atribuir a chave
+    auth_admin_client.headers.pop("Authorization")
+    assert auth_admin_client.post("/whatsapp/send", json=MESSAGE, headers=headers).status_code == 401
+
+
+def test_store_response_requires_current_claim(db_session: Session):
+    claim = claim_key(db_session, "POST /whatsapp/send:1", "msg-5", request_hash(WhatsAppMessage(**MESSAGE)))
+    db_session.execute(update(IdempotencyKey).where(IdempotencyKey.key == "msg-5").values(token="assumida"))
+    db_session.commit()
+    with pytest.raises(HTTPException) as exc:
+        store_response(db_session, claim, 202, {"id": 1})
+    assert exc.value.status_code == 409
+
+
+def test_sweep_expired_keys_in_batches(db_session: Session):
+    now = utcnow()
+    db_session.add_all([
+        IdempotencyKey(scope="s", key=f"k{i}", request_hash="h", token="t", status="completed", expires_at=now + timedelta(hours=-1 if i < 5 else 1))
+        for i in range(7)
+    ])
+    db_session.commit()
+    assert sweep_expired(db_session, batch_size=2) == 5
+    assert sorted(row.key for row in db_session.query(IdempotencyKey)) == ["k5", "k6"]
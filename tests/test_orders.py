@@ -1,7 +1,7 @@
 import pytest
 from starlette.testclient import TestClient
 from sqlalchemy.orm import Session
-from app.models import Client, Product
+from app.models import Client, Product, Order
 
 
 
@@ -40,6 +40,130 @@ def test_create_order(auth_admin_client: TestClient, db_session: Session, clean_
     assert response.json()["order_products"][0]["product_id"] == product.id
     assert response.json()["order_products"][0]["quantity"] == 2
 
+# Teste de reserva de estoque: o estoque é decrementado e itens repetidos são somados
+def test_create_order_decrements_stock(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    client = Client(nome="Cliente Estoque", email="estoque@example.com", cpf="12345678910", created_by_user_id=1)
+    product = Product(description="Produto Estoque", sale_value=5.0, barcode="126", section="A", initial_stock=10, current_stock=10)
+    db_session.add_all([client, product])
+    db_session.commit()
+
+    order_data = {
+        "client_id": client.id,
+        "products": [
+            {"product_id": product.id, "quantity": 3},
+            {"product_id": product.id, "quantity": 2}
+        ]
+    }
+    response = auth_admin_client.post("/orders/", json=order_data)
+    assert response.status_code == 201
+    assert response.json()["order_products"][0]["quantity"] == 5
+    assert response.json()["total_value"] == 25.0
+
+    db_session.refresh(product)
+    assert product.current_stock == 5
+
+# Teste de estoque insuficiente: todas as faltas são reportadas de uma vez e nada é decrementado
+def test_create_order_reports_all_shortages(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    client = Client(nome="Cliente Falta", email="falta@example.com", cpf="12345678911", created_by_user_id=1)
+    product_a = Product(description="Produto A", sale_value=5.0, barcode="127", section="A", initial_stock=1, current_stock=1)
+    product_b = Product(description="Produto B", sale_value=5.0, barcode="128", section="A", initial_stock=2, current_stock=2)
+    product_c = Product(description="Produto C", sale_value=5.0, barcode="129", section="A", initial_stock=9, current_stock=9)
+    db_session.add_all([client, product_a, product_b, product_c])
+    db_session.commit()
+
+    order_data = {
+        "client_id": client.id,
+        "products": [
+            {"product_id": product_a.id, "quantity": 2},
+            {"product_id": product_b.id, "quantity": 3},
+            {"product_id": product_c.id, "quantity": 1}
+        ]
+    }
+    response = auth_admin_client.post("/orders/", json=order_data)
+    assert response.status_code == 400
+    assert "Produto A" in response.json()["detail"]
+    assert "Produto B" in response.json()["detail"]
+    assert "Produto C" not in response.json()["detail"]
+
+    db_session.refresh(product_c)
+    assert product_c.current_stock == 9
+
+# Teste de ingestão em lote (POST /orders/bulk): resultado individual por pedido
+def test_create_orders_bulk(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    client = Client(nome="Cliente Lote", email="lote@example.com", cpf="12345678912", created_by_user_id=1)
+    product = Product(description="Produto Lote", sale_value=2.0, barcode="130", section="A", initial_stock=5, current_stock=5)
+    db_session.add_all([client, product])
+    db_session.commit()
+
+    orders = [
+        {"client_id": client.id, "products": [{"product_id": product.id, "quantity": 2}]},
+        {"client_id": 999999, "products": [{"product_id": product.id, "quantity": 1}]},
+        {"client_id": client.id, "products": [{"product_id": product.id, "quantity": 2}]},
+        {"client_id": client.id, "products": [{"product_id": product.id, "quantity": 2}]},
+        {"client_id": client.id, "products": [{"product_id": 999999, "quantity": 1}]}
+    ]
+    response = auth_admin_client.post("/orders/bulk?chunk_size=2", json=orders)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2
+    assert body["failed"] == 3
+    assert [r["success"] for r in body["results"]] == [True, False, True, False, False]
+    assert "Estoque insuficiente" in body["results"][3]["error"]
+    assert body["results"][0]["total_value"] == 4.0
+
+    created = auth_admin_client.get(f"/orders/{body['results'][2]['order_id']}")
+    assert created.status_code == 200
+    assert created.json()["order_products"][0]["quantity"] == 2
+
+    db_session.refresh(product)
+    assert product.current_stock == 1
+
+# Teste de paginação por cursor: todas as linhas aparecem uma única vez
+def test_list_orders_cursor_pagination(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    client = Client(nome="Cliente Cursor", email="cursor@example.com", cpf="12345678913", created_by_user_id=1)
+    db_session.add(client)
+    db_session.commit()
+    db_session.add_all(Order(client_id=client.id, status="pending", total_value=float(i)) for i in range(5))
+    db_session.commit()
+
+    seen = []
+    response = auth_admin_client.get("/orders/?limit=2")
+    while True:
+        assert response.status_code == 200
+        seen.extend(order["id"] for order in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        response = auth_admin_client.get(f"/orders/?limit=2&cursor={response.headers['X-Next-Cursor']}")
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+# Teste de exportação em streaming (GET /orders/export) com filtros, em NDJSON e CSV
+def test_export_orders(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    import csv
+    import io
+    import json
+
+    client = Client(nome="Cliente Export", email="export@example.com", cpf="12345678914", created_by_user_id=1)
+    product = Product(description="Produto Export", sale_value=3.0, barcode="131", section="A", initial_stock=50, current_stock=50)
+    db_session.add_all([client, product])
+    db_session.commit()
+    for quantity in (1, 2, 3):
+        auth_admin_client.post("/orders/", json={"client_id": client.id, "products": [{"product_id": product.id, "quantity": quantity}]})
+
+    response = auth_admin_client.get("/orders/export?min_total_value=6&max_total_value=100")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert [o["total_value"] for o in orders] == [6.0, 9.0]
+    assert orders[0]["order_products"][0]["quantity"] == 2
+
+    response = auth_admin_client.get("/orders/export?format=csv")
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 3
+    assert rows[2]["quantity"] == "3"
+    assert rows[2]["product_id"] == str(product.id)
+
 # Teste para obter um pedido por ID (GET /orders/{id})
 def test_get_order_by_id(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
     # Crie cliente, produto e pedido como acima
@@ -189,4 +313,50 @@ def test_list_products(auth_admin_client: TestClient):
     response = auth_admin_client.get("/products/")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
-    assert len(response.json()) >= 3
\ No newline at end of file
+    assert len(response.json()) >= 3
+# Cancelamento e exclusão devolvem o estoque uma única vez e apagam os itens do pedido
+def test_cancel_and_delete_order_restore_stock(auth_admin_client: TestClient, db_session: Session, clean_orders_db, clean_clients_db, clean_products_db):
+    from app.models import OrderProduct, StockMovement, WhatsAppLog
+
+    client = Client(nome="Cliente Cancelamento", email="cancela@example.com", cpf="12345678903", created_by_user_id=1)
+    camisa = Product(description="Camisa", sale_value=50.0, barcode="C1", section="A", initial_stock=10, current_stock=10)
+    calca = Product(description="Calça", sale_value=90.0, barcode="C2", section="A", initial_stock=4, current_stock=4)
+    db_session.add_all([client, camisa, calca])
+    db_session.commit()
+
+    def create_order():
+        response = auth_admin_client.post("/orders/", json={"client_id": client.id, "products": [
+            {"product_id": camisa.id, "quantity": 3}, {"product_id": calca.id, "quantity": 4},
+        ]})
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    def stock():
+        db_session.expire_all()
+        return db_session.get(Product, camisa.id).current_stock, db_session.get(Product, calca.id).current_stock
+
+    first = create_order()
+    assert stock() == (7, 0)
+    assert auth_admin_client.put(f"/orders/{first}/status", json={"status": "cancelled"}).json()["status"] == "cancelled"
+    assert stock() == (10, 4)
+    assert auth_admin_client.put(f"/orders/{first}/status", json={"status": "cancelled"}).status_code == 200
+    assert stock() == (10, 4) # Cancelar de novo não devolve o estoque outra vez
+    assert auth_admin_client.put(f"/orders/{first}/status", json={"status": "pending"}).status_code == 400
+    movements = db_session.query(StockMovement).filter(StockMovement.reason == "order_cancel").all()
+    assert sorted((m.product_id, m.delta, m.stock_after, m.order_id) for m in movements) == sorted([
+        (camisa.id, 3, 10, first), (calca.id, 4, 4, first),
+    ])
+
+    # Pedido cancelado: a exclusão não mexe no estoque
+    assert auth_admin_client.delete(f"/orders/{first}").status_code == 204
+    assert stock() == (10, 4)
+
+    # Pedido ativo: a exclusão devolve o estoque e solta os logs de WhatsApp
+    second = create_order()
+    db_session.add(WhatsAppLog(phone_number="+5511999999999", message="Pedido recebido", status="sent", order_id=second))
+    db_session.commit()
+    assert auth_admin_client.delete(f"/orders/{second}").status_code == 204
+    assert stock() == (10, 4)
+    assert db_session.query(OrderProduct).count() == 0
+    assert db_session.query(Order).count() == 0
+    assert db_session.query(WhatsAppLog).one().order_id is None
@@ -1,5 +1,8 @@
 # tests/test_products.py
 
+import json
+import time
+
 import pytest
 from starlette.testclient import TestClient
 
@@ -69,4 +72,294 @@ def test_delete_non_existent_order(auth_admin_client: TestClient):
     non_existent_id = 999
     response = auth_admin_client.delete(f"/orders/{non_existent_id}")
     assert response.status_code == 404
-    # Ajuste a mensagem conforme seu backend, por exemplo:
\ No newline at end of file
+    # Ajuste a mensagem conforme seu backend, por exemplo:
+
+def _create_product(client: TestClient, description: str, barcode: str, section: str = "Moda") -> int:
+    response = client.post("/products/", json={
+        "description": description, "sale_value": 10.0, "barcode": barcode, "section": section, "initial_stock": 1,
+    })
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_search_products_folds_accents_matches_prefixes_and_ranks(auth_admin_client: TestClient):
+    jeans = _create_product(auth_admin_client, "Calça Jeans Azul", "S1")
+    _create_product(auth_admin_client, "Camiseta Básica Branca", "S2")
+    long_one = _create_product(auth_admin_client, "Conjunto de moletom com calça, blusa, touca e meias", "S3")
+
+    results = auth_admin_client.get("/products/search", params={"q": "calca"}).json()
+    assert [p["id"] for p in results] == [jeans, long_one] # descrição mais curta é mais relevante
+    assert [p["description"] for p in auth_admin_client.get("/products/search", params={"q": "CAMI bás"}).json()] == ["Camiseta Básica Branca"]
+    assert auth_admin_client.get("/products/search", params={"q": "calça azul"}).json()[0]["id"] == jeans
+    assert auth_admin_client.get("/products/search", params={"q": "\"*"}).json() == []
+
+
+def test_search_index_follows_updates_and_deletes(auth_admin_client: TestClient):
+    product_id = _create_product(auth_admin_client, "Vestido Floral", "S4")
+    auth_admin_client.put(f"/products/{product_id}", json={"description": "Saia Plissada"})
+    assert auth_admin_client.get("/products/search", params={"q": "vestido"}).json() == []
+    assert [p["id"] for p in auth_admin_client.get("/products/search", params={"q": "plissada"}).json()] == [product_id]
+
+    auth_admin_client.delete(f"/products/{product_id}")
+    assert auth_admin_client.get("/products/search", params={"q": "saia"}).json() == []
+
+
+def test_product_cache_hits_and_write_through_invalidation(auth_admin_client: TestClient, db_session):
+    from app.models import Client
+    from app.product_cache import product_cache
+
+    product_id = _create_product(auth_admin_client, "Boné Aba Reta", "C1")
+    auth_admin_client.get(f"/products/{product_id}")
+    auth_admin_client.get("/products/", params={"description": " BONÉ "})
+    hits = product_cache.stats()["hits"]
+    assert auth_admin_client.get(f"/products/{product_id}").json()["description"] == "Boné Aba Reta"
+    assert len(auth_admin_client.get("/products/", params={"description": "boné"}).json()) == 1 # mesma chave normalizada
+    assert product_cache.stats()["hits"] == hits + 2
+
+    auth_admin_client.put(f"/products/{product_id}", json={"description": "Boné Trucker"})
+    assert auth_admin_client.get(f"/products/{product_id}").json()["description"] == "Boné Trucker"
+
+    client = Client(nome="Cliente", email="cliente@example.com", cpf="1")
+    db_session.add(client)
+    db_session.commit()
+    auth_admin_client.post("/orders/", json={"client_id": client.id, "products": [{"product_id": product_id, "quantity": 1}]})
+    assert auth_admin_client.get(f"/products/{product_id}").json()["current_stock"] == 0
+
+    other_id = _create_product(auth_admin_client, "Boné Bucket", "C2")
+    auth_admin_client.get(f"/products/{other_id}")
+    auth_admin_client.delete(f"/products/{other_id}")
+    assert auth_admin_client.get(f"/products/{other_id}").status_code == 404
+    assert auth_admin_client.get("/metrics/").json()["product_cache"]["hit_ratio"] > 0
+
+
+def test_product_cache_detects_writes_from_other_workers(db_session):
+    from app.models import Product as DBProduct
+    from app.product_cache import ProductCache
+
+    worker_a = ProductCache(maxsize=10, ttl_seconds=60, check_interval=0)
+    worker_b = ProductCache(maxsize=10, ttl_seconds=60, check_interval=0)
+    version = worker_b.sync(db_session)
+    worker_b.put(("id", 1), "produto antigo", version)
+    assert worker_b.get(("id", 1)) == "produto antigo"
+
+    db_session.add(DBProduct(description="x", sale_value=1, barcode="W1", section="s", initial_stock=1, current_stock=1))
+    db_session.commit()
+    worker_a.invalidate(db_session) # Escrita feita pelo outro worker
+
+    worker_b.sync(db_session)
+    assert worker_b.get(("id", 1)) is None
+    worker_b.put(("id", 1), "valor lido antes da escrita", version)
+    assert worker_b.get(("id", 1)) is None # put com versão antiga é ignorado
+
+
+
+def test_product_cache_coalesces_shared_bumps_from_orders(db_session):
+    from app.models import CacheVersion
+    from app.product_cache import ProductCache
+
+    def shared_version():
+        db_session.rollback()
+        return db_session.query(CacheVersion.version).filter(CacheVersion.name == "products").scalar()
+
+    worker = ProductCache(maxsize=10, ttl_seconds=60, check_interval=60)
+    worker.invalidate_coalesced(db_session) # Primeiro incremento: sai na hora, fora da requisição
+    deadline = time.monotonic() + 5
+    while shared_version() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert shared_version() == 1
+
+    for _ in range(3):
+        version = worker.version
+        worker.invalidate_coalesced(db_session)
+        assert worker.version > version # O próprio worker descarta o cache na hora
+    assert worker.stats()["stamp_pending"]
+    assert shared_version() == 1 # Os demais esperam até o fim do intervalo, com um único incremento
+    worker.flush()
+    assert shared_version() == 2 and not worker.stats()["stamp_pending"]
+
+
+def test_product_write_succeeds_when_cache_stamp_fails(auth_admin_client: TestClient, monkeypatch):
+    from app.product_cache import product_cache
+
+    product_id = _create_product(auth_admin_client, "Boné Falha", "F1")
+    auth_admin_client.get(f"/products/{product_id}")
+    reported = []
+    monkeypatch.setattr("app.product_cache.error_reporter.capture", reported.append)
+    monkeypatch.setattr(product_cache, "_bump_shared", lambda db: 1 / 0)
+
+    response = auth_admin_client.put(f"/products/{product_id}", json={"description": "Boné Gravado"})
+    assert response.status_code == 200 # A escrita foi commitada antes da invalidação
+    assert [type(e) for e in reported] == [ZeroDivisionError]
+    assert auth_admin_client.get(f"/products/{product_id}").json()["description"] == "Boné Gravado"
+
+def test_import_products_csv_reports_row_errors(auth_admin_client: TestClient):
+    existing_id = _create_product(auth_admin_client, "Produto Existente", "IMP-1")
+    csv_data = (
+        "description,sale_value,barcode,section,initial_stock,expiration_date\n"
+        "Camiseta Importada,49.9,IMP-2,Moda,10,\n"
+        "Preço inválido,abc,IMP-3,Moda,5,\n"
+        "Já cadastrado,10,IMP-1,Moda,1,\n"
+        "\"Bermuda, com vírgula\",79.9,IMP-4,Moda,3,2030-01-31\n"
+        "Repetida,79.9,IMP-4,Moda,3,\n"
+    )
+    response = auth_admin_client.post(
+        "/products/import", params={"batch_size": 2}, files={"file": ("produtos.csv", csv_data, "text/csv")}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["created"], report["updated"], report["failed"]) == (5, 2, 0, 3)
+    assert [(e["line"], e["barcode"]) for e in report["errors"]] == [(3, "IMP-3"), (4, "IMP-1"), (6, "IMP-4")]
+    assert "sale_value" in report["errors"][0]["error"]
+
+    bermuda = auth_admin_client.get("/products/search", params={"q": "bermuda"}).json()[0]
+    assert (bermuda["description"], bermuda["current_stock"], bermuda["expiration_date"]) == ("Bermuda, com vírgula", 3, "2030-01-31")
+
+    upsert = auth_admin_client.post(
+        "/products/import", params={"mode": "upsert"},
+        files={"file": ("p.csv", "description,sale_value,barcode,section,initial_stock\nNovo Nome,12.5,IMP-1,Moda,1\n", "text/csv")},
+    ).json()
+    assert (upsert["created"], upsert["updated"]) == (0, 1)
+    assert auth_admin_client.get(f"/products/{existing_id}").json()["description"] == "Novo Nome"
+
+
+def test_import_products_csv_rejects_missing_columns(auth_admin_client: TestClient):
+    response = auth_admin_client.post("/products/import", files={"file": ("p.csv", "description,barcode\nX,1\n", "text/csv")})
+    assert response.status_code == 400
+    assert "sale_value" in response.json()["detail"]
+
+
+def test_get_product_by_barcode_and_batch_lookup(auth_admin_client: TestClient, db_session):
+    from app.barcode_index import barcode_index
+    from app.models import Product as DBProduct
+
+    first = _create_product(auth_admin_client, "Meia Cano Alto", "789100")
+    second = _create_product(auth_admin_client, "Cinto Couro", "789200")
+    assert barcode_index.get("789100") == first # indexado pelo evento de insert
+
+    response = auth_admin_client.get("/products/barcode/789100")
+    assert response.status_code == 200 and response.json()["id"] == first
+    assert auth_admin_client.get("/products/barcode/000").status_code == 404
+
+    # Código alterado fora deste processo: a dica velha é corrigida pela consulta ao índice
+    db_session.query(DBProduct).filter(DBProduct.id == second).update({"barcode": "789999"})
+    db_session.commit()
+    barcode_index.set("789200", second)
+    from app.product_cache import product_cache
+    product_cache.clear()
+
+    lookup = auth_admin_client.post("/products/barcode/lookup", json={"barcodes": ["789999", "789100", "789200", "789100"]}).json()
+    assert [p["id"] for p in lookup["found"]] == [second, first]
+    assert lookup["missing"] == ["789200"]
+    assert barcode_index.get("789200") is None
+    assert barcode_index.get("789999") == second
+
+
+def test_list_products_with_facets(auth_admin_client: TestClient, db_session):
+    from app.models import Product as DBProduct
+
+    db_session.add_all([
+        DBProduct(description="Camisa A", sale_value=30, barcode="F1", section="Masculino", initial_stock=5, current_stock=5),
+        DBProduct(description="Camisa B", sale_value=120, barcode="F2", section="Masculino", initial_stock=5, current_stock=0),
+        DBProduct(description="Vestido", sale_value=250, barcode="F3", section="Feminino", initial_stock=5, current_stock=2),
+        DBProduct(description="Casaco", sale_value=900, barcode="F4", section="Feminino", initial_stock=5, current_stock=1),
+    ])
+    db_session.commit()
+
+    plain = auth_admin_client.get("/products/", params={"limit": 2})
+    assert isinstance(plain.json(), list)
+
+    body = auth_admin_client.get("/products/", params={"limit": 2, "facets": True}).json()
+    assert len(body["items"]) == 2
+    facets = body["facets"]
+    assert facets["total"] == 4
+    assert facets["sections"] == [{"value": "Feminino", "count": 2}, {"value": "Masculino", "count": 2}]
+    assert (facets["in_stock"], facets["out_of_stock"]) == (3, 1)
+    assert [(b["min"], b["max"], b["count"]) for b in facets["price_histogram"]] == [
+        (0, 50, 1), (50, 100, 0), (100, 200, 1), (200, 500, 1), (500, None, 1),
+    ]
+
+    filtered = auth_admin_client.get("/products/", params={"category": "Masculino", "facets": True}).json()["facets"]
+    assert (filtered["total"], filtered["in_stock"]) == (2, 1)
+
+
+def test_bulk_update_products(auth_admin_client: TestClient, db_session):
+    from app.models import Product as DBProduct
+
+    db_session.add_all([
+        DBProduct(description="Biquíni", sale_value=100, barcode="B1", section="Moda Praia", initial_stock=5, current_stock=5),
+        DBProduct(description="Sunga", sale_value=59.9, barcode="B2", section="Moda Praia", initial_stock=5, current_stock=1),
+        DBProduct(description="Casaco", sale_value=300, barcode="B3", section="Inverno", initial_stock=5, current_stock=5),
+    ])
+    db_session.commit()
+    casaco = db_session.query(DBProduct).filter(DBProduct.barcode == "B3").one().id
+    assert auth_admin_client.get(f"/products/{casaco}").json()["sale_value"] == 300 # Fica no cache
+
+    response = auth_admin_client.patch("/products/bulk", json={"filter": {"section": "Moda Praia"}, "percent_change": -10, "stock_delta": -3})
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2}
+    prices = {p["barcode"]: (p["sale_value"], p["current_stock"]) for p in auth_admin_client.get("/products/").json()}
+    assert prices == {"B1": (90, 2), "B2": (53.91, 0), "B3": (300, 5)}
+
+    streamed = auth_admin_client.patch(
+        "/products/bulk", params={"returning": "ndjson"}, json={"filter": {"ids": [casaco], "min_price": 200}, "sale_value": 249.9}
+    )
+    assert streamed.headers["X-Updated-Count"] == "1"
+    rows = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [(row["id"], row["sale_value"]) for row in rows] == [(casaco, 249.9)]
+    assert auth_admin_client.get(f"/products/{casaco}").json()["sale_value"] == 249.9
+
+    assert auth_admin_client.patch("/products/bulk", json={"filter": {}, "stock_delta": 1}).status_code == 400
+    assert auth_admin_client.patch("/products/bulk", json={"filter": {"section": "Inverno"}}).status_code == 400
+    assert auth_admin_client.patch(
+        "/products/bulk", json={"filter": {"section": "Inverno"}, "percent_change": 5, "sale_value": 10}
+    ).status_code == 400
+
+
+def test_stock_movements_and_alerts(auth_admin_client: TestClient, db_session):
+    from datetime import date, timedelta
+    from app.models import Client
+
+    client = Client(nome="Cliente Estoque", email="estoque@teste.com", cpf="11144477735")
+    db_session.add(client)
+    db_session.commit()
+    soon = (date.today() + timedelta(days=3)).isoformat()
+    later = (date.today() + timedelta(days=300)).isoformat()
+    iogurte = auth_admin_client.post("/products/", json={
+        "description": "Iogurte", "sale_value": 5, "barcode": "S1", "section": "Mercado", "initial_stock": 8, "expiration_date": soon,
+    }).json()["id"]
+    queijo = auth_admin_client.post("/products/", json={
+        "description": "Queijo", "sale_value": 30, "barcode": "S2", "section": "Mercado", "initial_stock": 3, "expiration_date": later,
+    }).json()["id"]
+
+    alerts = auth_admin_client.get("/products/alerts").json()
+    assert [p["id"] for p in alerts["low_stock"]] == [queijo]
+    assert [p["id"] for p in alerts["expiring"]] == [iogurte]
+
+    order = auth_admin_client.post("/orders/", json={"client_id": client.id, "products": [{"product_id": iogurte, "quantity": 4}]})
+    assert order.status_code == 201
+    bulk = auth_admin_client.post("/orders/bulk", json=[
+        {"client_id": client.id, "products": [{"product_id": iogurte, "quantity": 1}]},
+        {"client_id": client.id, "products": [{"product_id": iogurte, "quantity": 2}, {"product_id": queijo, "quantity": 1}]},
+    ])
+    assert bulk.json()["created"] == 2
+    assert auth_admin_client.put(f"/products/{queijo}", json={"current_stock": 20}).status_code == 200
+
+    movements = auth_admin_client.get(f"/products/{iogurte}/movements").json()
+    assert [(m["reason"], m["delta"], m["stock_after"]) for m in movements] == [
+        ("order", -2, 1), ("order", -1, 3), ("order", -4, 4), ("initial", 8, 8),
+    ]
+    assert movements[2]["order_id"] == order.json()["id"]
+    assert [(m["reason"], m["delta"], m["stock_after"]) for m in auth_admin_client.get(f"/products/{queijo}/movements").json()][:2] == [
+        ("adjustment", 18, 20), ("order", -1, 2),
+    ]
+
+    alerts = auth_admin_client.get("/products/alerts", params={"expiring_within_days": 365}).json()
+    assert [p["id"] for p in alerts["low_stock"]] == [iogurte]
+    assert [p["id"] for p in alerts["expiring"]] == [iogurte, queijo]
+
+    # Ajuste em lote que para em zero registra o ajuste real
+    auth_admin_client.patch("/products/bulk", json={"filter": {"section": "Mercado"}, "stock_delta": -5})
+    assert auth_admin_client.get(f"/products/{iogurte}/movements").json()[0]["delta"] == -1
+    alerts = auth_admin_client.get("/products/alerts", params={"expiring_within_days": 365}).json()
+    assert [p["id"] for p in alerts["low_stock"]] == [iogurte]
+    assert [p["id"] for p in alerts["expiring"]] == [queijo] # Sem estoque não entra no alerta de vencimento
@@ -0,0 +1,75 @@
+# tests/test_query_plans.py
+import re
+import pytest
+from sqlalchemy import event
+from starlette.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.pagination import encode_cursor
+
+# Regressão de planos de consulta: executa as rotas com os filtros mais usados,
+# captura os SELECTs emitidos e roda EXPLAIN QUERY PLAN de cada um no SQLite.
+# Uma linha "SCAN <tabela>" sem "USING ... INDEX" indica leitura da tabela inteira.
+
+HOT_QUERIES = [
+    "/orders/?client_id=1",
+    "/orders/?status_filter=pending",
+    "/orders/?start_date=2025-01-01T00:00:00&end_date=2025-02-01T00:00:00",
+    "/orders/?min_total_value=100&max_total_value=500",
+    f"/orders/?cursor={encode_cursor([10])}",
+    "/orders/1",
+    "/products/?category=Masculino",
+    "/products/?category=Masculino&min_price=10&max_price=50",
+    "/products/?min_price=10&max_price=50",
+    "/products/?available=true",
+    "/products/?category=Masculino&facets=true",
+    f"/products/?cursor={encode_cursor([10])}",
+    "/products/1",
+    "/products/search?q=camisa azul",
+    "/products/barcode/7891234567890",
+    "/products/alerts",
+    "/products/1/movements",
+    f"/clients/?cursor={encode_cursor([10])}",
+    "/clients/1",
+    "/clients/?sort_by=lifetime_value",
+    "/clients/?sort_by=last_order_date&cursor=" + encode_cursor(["2025-01-01T00:00:00", 10]),
+    "/analytics/sales?group_by=day&start_date=2022-01-01&end_date=2025-06-30",
+    "/analytics/sales?group_by=section&start_date=2022-01-01&end_date=2025-06-30",
+    "/analytics/sales?group_by=product&start_date=2022-01-15&end_date=2025-06-20",
+    "/whatsapp/logs?status_filter=failed",
+    "/whatsapp/logs?phone_number=(11) 99999-9999",
+    "/whatsapp/logs?phone_prefix=5511",
+]
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def capture_selects(engines, client: TestClient, url: str):
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code in (200, 404), response.text
+    return captured
+
+
+@pytest.mark.parametrize("url", HOT_QUERIES)
+def test_hot_queries_use_indexes(auth_admin_client: TestClient, db_session: Session, async_db_engine, url: str):
+    # Rotas def usam o engine síncrono; rotas async def (e a autenticação) usam o assíncrono
+    engines = [db_session.get_bind(), async_db_engine.sync_engine]
+    captured = capture_selects(engines, auth_admin_client, url)
+    assert captured
+    for statement, parameters in captured:
+        plan = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        details = [row[-1] for row in plan]
+        full_scans = [d for d in details if FULL_SCAN.match(d) and not d.startswith("SCAN anon")]
+        assert not full_scans, f"{url} faz leitura completa de tabela:\n{statement}\n{details}"
@@ -0,0 +1,426 @@
+# tests/test_whatsapp.py
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+import httpx
+import pytest
+from starlette.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import whatsapp_campaigns
+from app.error_reporting import ErrorReporter
+from app.models import Client, Order, OrderProduct, Product, WhatsAppCampaign, WhatsAppLog, WhatsAppLogArchive
+from app.whatsapp_outbox import WhatsAppOutbox, backoff_delay, claim_batch, utcnow
+from app.whatsapp_retention import compact_responses, purge_logs, read_archive
+from app.zapi import AdaptiveConcurrencyLimiter, CircuitBreaker, TokenBucket, ZAPIClient, ZAPIUnavailable
+
+# A Z-API é substituída por um httpx.MockTransport: nenhum teste acessa a rede.
+
+
+def _mock_zapi(handler) -> ZAPIClient:
+    return ZAPIClient(base_url="http://zapi.test", instance_id="inst", token="tok", transport=httpx.MockTransport(handler))
+
+
+def _drain(outbox: WhatsAppOutbox, session_factory, handler) -> int:
+    async def run():
+        zapi = _mock_zapi(handler)
+        try:
+            return await outbox.process_batch(session_factory, zapi)
+        finally:
+            await zapi.aclose()
+    return asyncio.run(run())
+
+
+def test_send_whatsapp_message_enqueues(client: TestClient, db_session: Session):
+    response = client.post("/whatsapp/send", json={"phone_number": "5511999999999", "message": "Olá"})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+
+    log = db_session.query(WhatsAppLog).one()
+    assert log.status == "queued"
+    assert log.attempts == 0
+    assert log.next_attempt_at is not None
+
+
+def test_outbox_delivers_queued_message(client: TestClient, db_session: Session, async_session_factory):
+    client.post("/whatsapp/send", json={"phone_number": "5511999999999", "message": "Olá"})
+    requests_seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        return httpx.Response(200, json={"zaapId": "abc", "messageId": "m1"})
+
+    assert _drain(WhatsAppOutbox(), async_session_factory, handler) == 1
+    assert requests_seen[0].url.path == "/instances/inst/token/tok/send-text"
+    assert json.loads(requests_seen[0].content) == {"phone": "5511999999999", "message": "Olá"}
+
+    log = db_session.query(WhatsAppLog).one()
+    assert log.status == "sent"
+    assert log.attempts == 1
+    assert log.next_attempt_at is None
+    assert json.loads(log.response_data)["messageId"] == "m1"
+
+    # Nada mais a enviar
+    assert _drain(WhatsAppOutbox(), async_session_factory, handler) == 0
+
+
+def test_outbox_retries_with_backoff_then_fails(client: TestClient, db_session: Session, async_session_factory):
+    client.post("/whatsapp/send", json={"phone_number": "5511999999999", "message": "Olá"})
+    outbox = WhatsAppOutbox(max_attempts=2)
+    unavailable = lambda request: httpx.Response(503, text="instância desconectada")
+
+    assert _drain(outbox, async_session_factory, unavailable) == 1
+    log = db_session.query(WhatsAppLog).one()
+    assert log.status == "queued"
+    assert log.attempts == 1
+    assert "instância desconectada" in log.response_data
+
+    # Ainda dentro do backoff: não é reivindicada de novo
+    log.next_attempt_at = utcnow() + timedelta(minutes=5)
+    db_session.commit()
+    assert _drain(outbox, async_session_factory, unavailable) == 0
+
+    log.next_attempt_at = utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    assert _drain(outbox, async_session_factory, unavailable) == 1
+    db_session.refresh(log)
+    assert log.status == "failed"
+    assert log.attempts == 2
+    assert outbox.stats()["retried"] == 1
+    assert outbox.stats()["failed"] == 1
+
+
+def test_outbox_does_not_retry_client_errors(client: TestClient, db_session: Session, async_session_factory):
+    client.post("/whatsapp/send", json={"phone_number": "5511999999999", "message": "Olá"})
+    assert _drain(WhatsAppOutbox(), async_session_factory, lambda request: httpx.Response(400, text="phone inválido")) == 1
+    assert db_session.query(WhatsAppLog).one().status == "failed"
+
+
+def test_outbox_keeps_batch_outcomes_on_unexpected_error(client: TestClient, db_session: Session, async_session_factory):
+    for phone in ("5511999999991", "5511999999992"):
+        client.post("/whatsapp/send", json={"phone_number": phone, "message": "Olá"})
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if json.loads(request.content)["phone"] == "5511999999992":
+            return httpx.Response(200, text="<html>ok</html>") # 200 sem JSON: response.json() falha
+        return httpx.Response(200, json={"messageId": "m1"})
+
+    outbox = WhatsAppOutbox()
+    assert _drain(outbox, async_session_factory, handler) == 2
+    logs = {log.phone_number: log for log in db_session.query(WhatsAppLog).all()}
+    assert logs["5511999999991"].status == "sent"
+    assert logs["5511999999992"].status == "failed" # Não volta para a fila: não há reenvio duplicado
+    assert logs["5511999999992"].next_attempt_at is None
+    assert "JSONDecodeError" in logs["5511999999992"].response_data
+    assert outbox.stats()["sent"] == 1 and outbox.stats()["failed"] == 1
+
+
+def test_claim_batch_claims_each_message_once(db_session: Session, async_session_factory):
+    now = utcnow()
+    db_session.add_all([
+        WhatsAppLog(phone_number=f"55119{i:08d}", message="x", status="queued", next_attempt_at=now - timedelta(seconds=1))
+        for i in range(5)
+    ])
+    db_session.commit()
+
+    async def run():
+        async with async_session_factory() as db:
+            first = await claim_batch(db, 3)
+            second = await claim_batch(db, 3)
+            third = await claim_batch(db, 3)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert len(first) == 3 and len(second) == 2 and third == []
+    assert not {log.id for log in first} & {log.id for log in second}
+    assert {log.status for log in db_session.query(WhatsAppLog)} == {"sending"}
+
+
+def test_backoff_delay_is_bounded():
+    for attempts in range(1, 12):
+        delay = backoff_delay(attempts, base=2, cap=60)
+        assert 0 <= delay <= min(60, 2 * 2 ** (attempts - 1))
+
+
+def test_zapi_client_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={})
+
+    async def run():
+        zapi = ZAPIClient(base_url="http://zapi.test", max_concurrency=3, transport=httpx.MockTransport(handler))
+        try:
+            await asyncio.gather(*(zapi.send_text("5511999999999", f"msg {i}") for i in range(20)))
+        finally:
+            await zapi.aclose()
+
+    asyncio.run(run())
+    assert peak == 3
+
+
+def _broadcast_audience(db_session: Session):
+    buyer = Client(nome="Ana Praia", email="ana@example.com", cpf="1", phone_number="5511911111111", is_active=True)
+    other = Client(nome="Bruno", email="bruno@example.com", cpf="2", phone_number="5511922222222", is_active=True)
+    inactive = Client(nome="Carla", email="carla@example.com", cpf="3", phone_number="5511933333333", is_active=False)
+    no_phone = Client(nome="Davi", email="davi@example.com", cpf="4", phone_number=None, is_active=True)
+    product = Product(description="Biquíni", sale_value=80.0, barcode="B1", section="Praia", initial_stock=10, current_stock=10)
+    db_session.add_all([buyer, other, inactive, no_phone, product])
+    db_session.commit()
+    order = Order(client_id=buyer.id, total_value=80.0)
+    db_session.add(order)
+    db_session.commit()
+    db_session.add(OrderProduct(order_id=order.id, product_id=product.id, quantity=1, price_at_order=80.0))
+    db_session.commit()
+    return buyer, other
+
+
+def test_broadcast_enqueues_section_buyers(auth_admin_client: TestClient, db_session: Session):
+    buyer, _ = _broadcast_audience(db_session)
+    response = auth_admin_client.post("/whatsapp/broadcast", json={"message": "Olá {nome}!", "section": "Praia"})
+    assert response.status_code == 202
+
+    logs = db_session.query(WhatsAppLog).all()
+    assert [(log.phone_number, log.message, log.status) for log in logs] == [(buyer.phone_number, "Olá Ana Praia!", "queued")]
+    assert logs[0].campaign_id == response.json()["id"]
+
+
+def test_broadcast_streams_in_chunks_and_reports_progress(auth_admin_client: TestClient, db_session: Session, async_session_factory, monkeypatch):
+    _broadcast_audience(db_session)
+    db_session.add_all([
+        Client(nome=f"Cliente {i}", email=f"c{i}@example.com", cpf=f"c{i}", phone_number=f"55119{i:08d}", is_active=True)
+        for i in range(5)
+    ])
+    db_session.commit()
+    monkeypatch.setattr(whatsapp_campaigns, "BROADCAST_CHUNK_SIZE", 2)
+
+    campaign_id = auth_admin_client.post("/whatsapp/broadcast", json={"message": "Promoção para {nome}"}).json()["id"]
+    status_response = auth_admin_client.get(f"/whatsapp/broadcast/{campaign_id}")
+    assert status_response.status_code == 200
+    progress = status_response.json()
+    assert progress["status"] == "enqueued"
+    assert progress["enqueued"] == 7
+    assert progress["queued"] == 7
+    assert progress["completed"] is False
+
+    outbox = WhatsAppOutbox(batch_size=100)
+    assert _drain(outbox, async_session_factory, lambda request: httpx.Response(200, json={})) == 7
+    progress = auth_admin_client.get(f"/whatsapp/broadcast/{campaign_id}").json()
+    assert progress["sent"] == 7
+    assert progress["queued"] == 0
+    assert progress["completed"] is True
+
+
+
+class _ProcessDied(BaseException):
+    pass
+
+
+def test_broadcast_resumes_interrupted_campaign_without_duplicates(db_session: Session, async_session_factory, monkeypatch):
+    _broadcast_audience(db_session)
+    db_session.add_all([
+        Client(nome=f"Cliente {i}", email=f"c{i}@example.com", cpf=f"c{i}", phone_number=f"55119{i:08d}", is_active=True)
+        for i in range(5)
+    ])
+    campaign = WhatsAppCampaign(message_template="Promoção para {nome}", filters="{}")
+    db_session.add(campaign)
+    db_session.commit()
+
+    # O processo morre logo depois do commit do primeiro bloco
+    def die():
+        raise _ProcessDied()
+
+    monkeypatch.setattr(whatsapp_campaigns.outbox, "notify", die)
+    with pytest.raises(_ProcessDied):
+        asyncio.run(whatsapp_campaigns.fan_out_campaign(async_session_factory, campaign.id, chunk_size=2))
+    db_session.refresh(campaign)
+    assert (campaign.status, campaign.enqueued) == ("enqueuing", 2)
+    assert campaign.last_client_id == max(client.id for client in db_session.query(Client).order_by(Client.id).limit(2))
+
+    monkeypatch.setattr(whatsapp_campaigns.outbox, "notify", lambda: None)
+    assert asyncio.run(whatsapp_campaigns.resume_campaigns(async_session_factory)) == 1
+    db_session.refresh(campaign)
+    assert (campaign.status, campaign.enqueued) == ("enqueued", 7)
+    phones = [log.phone_number for log in db_session.query(WhatsAppLog).filter(WhatsAppLog.campaign_id == campaign.id)]
+    assert len(phones) == len(set(phones)) == 7
+
+    # Campanha já concluída: nada a retomar, nada reenviado
+    assert asyncio.run(whatsapp_campaigns.resume_campaigns(async_session_factory)) == 0
+    asyncio.run(whatsapp_campaigns.fan_out_campaign(async_session_factory, campaign.id))
+    assert db_session.query(WhatsAppLog).count() == 7
+
+def test_broadcast_rejects_unknown_template_fields(auth_admin_client: TestClient, db_session: Session):
+    response = auth_admin_client.post("/whatsapp/broadcast", json={"message": "Olá {nome.__class__}"})
+    assert response.status_code == 400
+    for template in ("Olá {nome!r}", "Olá {nome:>99999999}"):
+        assert auth_admin_client.post("/whatsapp/broadcast", json={"message": template}).status_code == 400
+    assert auth_admin_client.get("/whatsapp/broadcast/999").status_code == 404
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # 1 token disponível de imediato + 10 a 50/s
+    assert asyncio.run(run()) >= 0.19
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    calls = 0
+    healthy = False
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(200, json={}) if healthy else httpx.Response(503)
+
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=4, open_seconds=0.05, half_open_probes=2)
+
+    async def run():
+        nonlocal healthy
+        zapi = ZAPIClient(base_url="http://zapi.test", breaker=breaker, transport=httpx.MockTransport(handler))
+        try:
+            for _ in range(4):
+                try:
+                    await zapi.send_text("5511999999999", "x")
+                except httpx.HTTPStatusError:
+                    pass
+            assert breaker.state == "open"
+
+            # Aberto: falha rápido, sem chamar a Z-API
+            try:
+                await zapi.send_text("5511999999999", "x")
+                assert False, "deveria ter sido rejeitada"
+            except ZAPIUnavailable as e:
+                assert e.retry_after > 0
+            assert calls == 4
+
+            await asyncio.sleep(0.06)
+            healthy = True
+            await zapi.send_text("5511999999999", "x")
+            assert breaker.state == "half_open"
+            await zapi.send_text("5511999999999", "x")
+            assert breaker.state == "closed"
+            return zapi.stats()
+        finally:
+            await zapi.aclose()
+
+    stats = asyncio.run(run())
+    assert stats["breaker_opened"] == 1
+    assert stats["breaker_rejected"] == 1
+    assert stats["failures"] == 4
+
+
+def test_adaptive_concurrency_halves_once_per_round_and_recovers():
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter(max_limit=8, min_limit=1)
+        starts = [await limiter.acquire() for _ in range(8)]
+        for started_at in starts: # 8 timeouts da mesma rodada: uma única redução
+            await limiter.release(started_at, False)
+        after_failures = limiter.limit
+        for _ in range(20):
+            await limiter.release(await limiter.acquire(), True)
+        return after_failures, limiter.limit
+
+    after_failures, recovered = asyncio.run(run())
+    assert after_failures == 4
+    assert 4 < recovered <= 8
+
+
+def test_outbox_defers_without_spending_attempts_when_breaker_open(client: TestClient, db_session: Session, async_session_factory):
+    client.post("/whatsapp/send", json={"phone_number": "5511999999999", "message": "Olá"})
+    breaker = CircuitBreaker(failure_rate=0.5, window=1, min_calls=1, open_seconds=60)
+    breaker.record(False) # Z-API já considerada fora
+
+    async def run():
+        zapi = ZAPIClient(base_url="http://zapi.test", breaker=breaker, transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+        try:
+            outbox = WhatsAppOutbox()
+            return await outbox.process_batch(async_session_factory, zapi), outbox.stats()
+        finally:
+            await zapi.aclose()
+
+    processed, stats = asyncio.run(run())
+    assert processed == 1 and stats["deferred"] == 1
+    log = db_session.query(WhatsAppLog).one()
+    assert log.status == "queued"
+    assert log.attempts == 0
+    assert log.next_attempt_at.replace(tzinfo=None) > utcnow().replace(tzinfo=None) + timedelta(seconds=30)
+
+
+def test_error_reporter_deduplicates_repeated_errors(monkeypatch):
+    sent = []
+    monkeypatch.setattr("app.error_reporting.sentry_sdk.capture_exception", lambda exc: sent.append(exc))
+    reporter = ErrorReporter(window_seconds=60, repeat_sample_rate=0)
+    request = httpx.Request("POST", "http://zapi.test/send-text")
+
+    for _ in range(10):
+        reporter.capture(httpx.HTTPStatusError("503", request=request, response=httpx.Response(503, request=request)))
+    reporter.capture(httpx.ConnectTimeout("timeout", request=request))
+
+    assert len(sent) == 2 # um evento por tipo de erro na janela
+    assert reporter.stats() == {"reported": 2, "suppressed": 9, "keys": 2}
+
+
+def test_zapi_metrics_exposed(auth_admin_client: TestClient):
+    metrics = auth_admin_client.get("/metrics/").json()
+    assert metrics["zapi"]["breaker_state"] == "closed"
+    assert "concurrency_limit" in metrics["zapi"]
+    assert "suppressed" in metrics["error_reporting"]
+
+
+def test_send_normalizes_phone_to_e164(client: TestClient, db_session: Session):
+    response = client.post("/whatsapp/send", json={"phone_number": "(11) 99999-9999", "message": "Olá"})
+    assert response.status_code == 202
+    assert response.json()["phone_number"] == "5511999999999"
+    assert client.post("/whatsapp/send", json={"phone_number": "123", "message": "Olá"}).status_code == 422
+
+
+def test_logs_filter_by_exact_phone_and_prefix(auth_admin_client: TestClient, db_session: Session):
+    db_session.add_all([
+        WhatsAppLog(phone_number=phone, message="x", status="sent")
+        for phone in ("5511999999999", "5511988887777", "5519977776666", "551199999999")
+    ])
+    db_session.commit()
+
+    exact = auth_admin_client.get("/whatsapp/logs", params={"phone_number": "+55 (11) 99999-9999"}).json()
+    assert [log["phone_number"] for log in exact] == ["5511999999999"]
+    prefix = auth_admin_client.get("/whatsapp/logs", params={"phone_prefix": "5511"}).json()
+    assert sorted(log["phone_number"] for log in prefix) == ["5511988887777", "551199999999", "5511999999999"]
+    assert auth_admin_client.get("/whatsapp/logs", params={"phone_number": "abc"}).status_code == 400
+
+
+def test_retention_compacts_responses_and_purges_old_logs(db_session: Session):
+    now = utcnow()
+    old, recent = now - timedelta(days=120), now - timedelta(days=1)
+    db_session.add_all(
+        [WhatsAppLog(phone_number="5511999999999", message="x", status="sent", sent_at=old, response_data=json.dumps({"n": i})) for i in range(5)]
+        + [WhatsAppLog(phone_number="5511999999999", message="x", status="queued", sent_at=old, response_data=None)]
+        + [WhatsAppLog(phone_number="5511999999999", message="x", status="sent", sent_at=recent, response_data="{}")]
+    )
+    db_session.commit()
+    old_ids = [log.id for log in db_session.query(WhatsAppLog).filter(WhatsAppLog.status == "sent", WhatsAppLog.sent_at < now - timedelta(days=30))]
+
+    assert compact_responses(db_session, now - timedelta(days=30), batch_size=2) == 5
+    archives = db_session.query(WhatsAppLogArchive).all()
+    assert [a.row_count for a in archives] == [2, 2, 1]
+    archived = {}
+    for archive in archives:
+        archived.update(read_archive(archive))
+    assert archived == {log_id: json.dumps({"n": i}) for i, log_id in enumerate(old_ids)}
+    assert db_session.query(WhatsAppLog).filter(WhatsAppLog.response_data.is_not(None)).count() == 1
+
+    assert purge_logs(db_session, now - timedelta(days=90), batch_size=2) == 5
+    assert sorted(log.status for log in db_session.query(WhatsAppLog)) == ["queued", "sent"] # fila intacta